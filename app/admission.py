@@ -0,0 +1,100 @@
+from app.channels import SENSOR_FIELDS
+from app.config import Settings
+from app.schemas import SensorData
+from typing import List, Optional
+import time
+
+ADMISSION_OUTCOMES = ("stored", "sampled", "rejected")
+
+class AdmissionController:
+    """
+    Decides which sensor readings are stored, from the measured load of the write path.
+
+    Pressure is the larger of the write buffer fill over ADMISSION_QUEUE_HIGH
+    and the write latency over ADMISSION_TARGET_LATENCY_MS, so 1.0 means the
+    write path is at its limit. Up to that every reading is stored. Past it,
+    routine readings are sampled down to about 1/pressure of them; a sampled
+    reading still updates the live state and the incident state machine, it
+    just isn't persisted or broadcast. These are always stored:
+
+    - readings with fire risk,
+    - readings that moved more than ADMISSION_CHANGE_THRESHOLD from the last
+      stored one,
+    - one reading per ADMISSION_MIN_KEEP_SECONDS.
+
+    At ADMISSION_REJECT_PRESSURE single routine readings are turned away
+    (503) while no incident is open; during an incident nothing is rejected.
+    """
+
+    def __init__(self, settings: Settings, buffer):
+        self.buffer = buffer
+        self.queue_high = settings.ADMISSION_QUEUE_HIGH
+        self.target_latency_ms = settings.ADMISSION_TARGET_LATENCY_MS
+        self.reject_pressure = settings.ADMISSION_REJECT_PRESSURE
+        self.change_threshold = settings.ADMISSION_CHANGE_THRESHOLD
+        self.min_keep_seconds = settings.ADMISSION_MIN_KEEP_SECONDS
+        self.counts = {outcome: 0 for outcome in ADMISSION_OUTCOMES}
+        self.max_pressure = 0.0
+        self._credit = 0.0
+        self._last_stored: Optional[SensorData] = None
+        self._last_stored_at = float("-inf")
+
+    def pressure(self) -> float:
+        queue = self.buffer.queue_fill / self.queue_high if self.queue_high > 0 else 0.0
+        latency = self.buffer.write_latency_ms / self.target_latency_ms if self.target_latency_ms > 0 else 0.0
+        pressure = max(queue, latency)
+        self.max_pressure = max(self.max_pressure, pressure)
+        return pressure
+
+    def admit(self, data: SensorData, risk: bool, incident_active: bool) -> str:
+        """Outcome for one reading: "stored", "sampled" or "rejected"."""
+        pressure = self.pressure()
+        if pressure >= self.reject_pressure and not (risk or incident_active):
+            outcome = "rejected"
+        else:
+            outcome = "stored" if self._keep(data, risk, pressure) else "sampled"
+        self.counts[outcome] += 1
+        return outcome
+
+    def admit_batch(self, readings: List[SensorData], risks: List[bool]) -> List[bool]:
+        """Which readings of a batch to store (batches are sampled, never rejected)."""
+        pressure = self.pressure()
+        keep = [self._keep(data, risk, pressure) for data, risk in zip(readings, risks)]
+        stored = sum(keep)
+        self.counts["stored"] += stored
+        self.counts["sampled"] += len(keep) - stored
+        return keep
+
+    def _keep(self, data: SensorData, risk: bool, pressure: float) -> bool:
+        now = time.monotonic()
+        if pressure <= 1.0 or risk or self._changed(data) or now - self._last_stored_at >= self.min_keep_seconds:
+            keep = True
+        else:
+            # Credit-based sampling keeps an even 1/pressure share instead of bursts
+            self._credit += 1.0 / pressure
+            keep = self._credit >= 1.0
+            if keep:
+                self._credit -= 1.0
+        if keep:
+            self._last_stored = data
+            self._last_stored_at = now
+        return keep
+
+    def _changed(self, data: SensorData) -> bool:
+        last = self._last_stored
+        if last is None:
+            return True
+        for field in SENSOR_FIELDS:
+            before, after = getattr(last, field), getattr(data, field)
+            if abs(after - before) > self.change_threshold * max(abs(before), 1.0):
+                return True
+        return False
+
+    def stats(self) -> dict:
+        return {
+            "pressure": round(self.pressure(), 3),
+            "max_pressure": round(self.max_pressure, 3),
+            "queue_fill": round(self.buffer.queue_fill, 4),
+            "write_latency_ms": round(self.buffer.write_latency_ms, 3),
+            **self.counts,
+        }
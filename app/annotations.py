@@ -0,0 +1,138 @@
+from PIL import Image, ImageDraw
+from app.config import Settings
+from app.ingest import Frame, decode_frame
+from app.schemas import Box
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+import logging
+import os
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+RESULTS_DIR = "static/results"
+FRAMES_DIR = "static/frames"
+RESULTS_URL_PREFIX = "/results/"
+
+FORMATS = {
+    "jpeg": ("jpg", "JPEG"),
+    "webp": ("webp", "WEBP"),
+}
+
+def draw_boxes(frame: Frame, detections: List[Box]) -> Image.Image:
+    """Draw labelled bounding boxes (in original coordinates) on a copy of the decoded frame."""
+    annotated = frame.image.copy()
+    draw = ImageDraw.Draw(annotated)
+    scale = 1 / frame.scale
+    width = max(2, round(max(annotated.size) / 300))
+    for d in detections:
+        x1, y1, x2, y2 = d.x1 * scale, d.y1 * scale, d.x2 * scale, d.y2 * scale
+        color = (255, 56, 56) if d.class_name == 'fire' else (255, 157, 151)
+        draw.rectangle([x1, y1, x2, y2], outline=color, width=width)
+        label = f"{d.class_name} {d.confidence:.2f}"
+        left, top, right, bottom = draw.textbbox((x1, y1), label)
+        text_height = bottom - top
+        draw.rectangle([x1, y1 - text_height - 4, x1 + (right - left) + 4, y1], fill=color)
+        draw.text((x1 + 2, y1 - text_height - 2), label, fill=(255, 255, 255))
+    return annotated
+
+class AnnotationRenderer:
+    """
+    Renders annotated images outside the /predict critical path.
+
+    ANNOTATION_MODE selects when the image is drawn:
+    - sync: before returning, as /predict always did.
+    - background: in a thread pool right after the response.
+    - lazy: only the raw upload is written (in the pool); the image is drawn on
+      the first GET of its annotated_image_url, then kept on disk.
+    """
+
+    def __init__(self, settings: Settings):
+        self.mode = settings.ANNOTATION_MODE
+        self.extension, self.format = FORMATS[settings.ANNOTATION_FORMAT]
+        self.quality = settings.ANNOTATION_QUALITY
+        self.annotate_empty = settings.ANNOTATE_EMPTY
+        self.target_size = settings.INGEST_TARGET_SIZE
+        self._executor = ThreadPoolExecutor(max_workers=settings.ANNOTATION_WORKERS, thread_name_prefix="annotate")
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, filename: str, frame: Frame, detections: List[Box], source: Optional[bytes] = None) -> Optional[str]:
+        """
+        Reserve the annotated image URL for a result and schedule its rendering.
+
+        Returns None when nothing was detected and ANNOTATE_EMPTY is off.
+        """
+        if not detections and not self.annotate_empty:
+            return None
+
+        name, _ = os.path.splitext(os.path.basename(filename))
+        base = f"{name}_{uuid.uuid4().hex}"
+        output = f"{base}.{self.extension}"
+
+        if self.mode == "sync":
+            self._render(output, frame, detections)
+        elif self.mode == "lazy" and source is not None:
+            self._track(output, self._executor.submit(self._save_source, base, source))
+        else:
+            self._track(output, self._executor.submit(self._render, output, frame, detections))
+
+        return f"{RESULTS_URL_PREFIX}{output}"
+
+    def ensure(self, name: str, load_boxes: Callable[[], Optional[List[Box]]]) -> Optional[str]:
+        """
+        Return the path of an annotated image, rendering it now if needed.
+
+        Args:
+            name: File name from the annotated_image_url.
+            load_boxes: Fetches the stored boxes of the event (only called for lazy renders).
+        """
+        with self._lock:
+            pending = self._pending.get(name)
+        if pending is not None:
+            pending.exception()  # Wait for the scheduled job; failures were already logged
+
+        path = os.path.join(RESULTS_DIR, name)
+        if os.path.exists(path):
+            return path
+
+        source = os.path.join(FRAMES_DIR, os.path.splitext(name)[0])
+        if not os.path.exists(source):
+            return None
+        boxes = load_boxes()
+        if boxes is None:
+            return None
+
+        with open(source, "rb") as f:
+            frame = decode_frame(f.read(), self.target_size)
+        self._render(name, frame, boxes)
+        return path
+
+    def shutdown(self):
+        """Finish queued renders (called on app shutdown)."""
+        self._executor.shutdown(wait=True)
+
+    def _track(self, name: str, future: Future):
+        with self._lock:
+            self._pending[name] = future
+
+        def done(f: Future):
+            with self._lock:
+                self._pending.pop(name, None)
+            if f.exception() is not None:
+                logger.error(f"Annotation job for {name} failed: {f.exception()}")
+
+        future.add_done_callback(done)
+
+    def _render(self, name: str, frame: Frame, detections: List[Box]):
+        path = os.path.join(RESULTS_DIR, name)
+        tmp_path = f"{path}.tmp"
+        draw_boxes(frame, detections).save(tmp_path, format=self.format, quality=self.quality)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _save_source(base: str, source: bytes):
+        os.makedirs(FRAMES_DIR, exist_ok=True)
+        with open(os.path.join(FRAMES_DIR, base), "wb") as f:
+            f.write(source)
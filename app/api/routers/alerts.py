@@ -0,0 +1,9 @@
+from fastapi import APIRouter
+from app.dependencies import get_alert_outbox
+
+router = APIRouter()
+
+@router.get("/alerts/outbox")
+def get_alert_outbox_stats():
+    """Alert email queue: pending/sent/failed messages and SMTP connection state."""
+    return get_alert_outbox().stats()
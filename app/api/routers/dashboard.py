@@ -1,84 +1,56 @@
-from fastapi import APIRouter, Depends
-from sqlmodel import Session, select
-from app.database import get_session
-from app.models import DetectionEvent, SensorReading, ThresholdsModel
-from app.schemas import DashboardResponse, Thresholds, SystemStatus, SensorData, ThresholdsUpdate
+from fastapi import APIRouter, Depends, Request, Response
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.database import get_async_session
+from app.live_state import bump_version_async, live_state
+from app.models import ThresholdsModel
+from app.schemas import DashboardResponse, Thresholds, ThresholdsUpdate
+from app.thresholds import THRESHOLDS_KEY, thresholds_cache
 
 router = APIRouter()
 
-def get_latest_sensor_data(session: Session) -> SensorData:
-    """Helper to fetch latest sensor data."""
-    sensor_reading = session.exec(select(SensorReading).order_by(SensorReading.timestamp.desc())).first()
-    if not sensor_reading:
-        return SensorData(temperature=0, humidity=0, smoke_level=0)
-    return SensorData(
-        temperature=sensor_reading.temperature,
-        humidity=sensor_reading.humidity,
-        smoke_level=sensor_reading.smoke_level,
-        timestamp=str(sensor_reading.timestamp)
-    )
-
-def get_current_thresholds(session: Session) -> Thresholds:
-    """Helper to fetch current thresholds."""
-    current = session.exec(select(ThresholdsModel).order_by(ThresholdsModel.updated_at.desc())).first()
-    if not current:
-        return Thresholds() # Default
-    return Thresholds(temperature_max=current.temperature_max, gas_max=current.gas_max)
-
-def get_current_status(session: Session) -> SystemStatus:
-    """Determine overall system status based on sensors and detections."""
-    sensor_data = get_latest_sensor_data(session)
-    last_detection = session.exec(select(DetectionEvent).order_by(DetectionEvent.timestamp.desc())).first()
-    thresholds = get_current_thresholds(session)
-    
-    status = SystemStatus.NORMAL
-    if sensor_data.temperature > thresholds.temperature_max or sensor_data.smoke_level > thresholds.gas_max:
-        status = SystemStatus.RIESGO
-    
-    if last_detection and last_detection.has_fire:
-         status = SystemStatus.CONFIRMADO
-    
-    return status
-
 @router.get("/dashboard", response_model=DashboardResponse)
-def get_dashboard(session: Session = Depends(get_session)):
-    """Aggregate data for the main dashboard view."""
-    sensor_data = get_latest_sensor_data(session)
-    status = get_current_status(session)
-    thresholds = get_current_thresholds(session)
-    
-    last_detection = session.exec(select(DetectionEvent).order_by(DetectionEvent.timestamp.desc())).first()
-    last_photo_url = last_detection.annotated_image_url if last_detection else None
-
-    return DashboardResponse(
-        status=status,
-        sensors=sensor_data,
-        thresholds=thresholds,
-        last_photo_url=last_photo_url,
-        last_audio_url=None 
-    )
+def get_dashboard(request: Request, response: Response):
+    """
+    Aggregate data for the main dashboard view (served from the live state, no queries).
+
+    Carries an ETag that moves with the live state; a poll sending it back in
+    If-None-Match gets an empty 304 until something changes.
+    """
+    # Taken before the body, so a write in between only makes the next poll a 200
+    etag = live_state.etag()
+    if etag in (tag.strip() for tag in request.headers.get("if-none-match", "").split(",")):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return live_state.dashboard()
 
 @router.get("/status")
-def get_status(session: Session = Depends(get_session)):
+def get_status():
     """Get concise system status."""
-    return {"status": get_current_status(session)}
+    return {"status": live_state.status()}
+
+@router.get("/state/version")
+def get_state_version():
+    """Version of the live state held by this worker, to spot stale workers."""
+    return live_state.stats()
 
 @router.get("/thresholds", response_model=Thresholds)
-async def fetch_thresholds(session: Session = Depends(get_session)):
+async def fetch_thresholds():
     """Fetch current system thresholds."""
-    return get_current_thresholds(session)
+    return thresholds_cache.current
 
 @router.post("/thresholds", response_model=Thresholds)
-async def update_threshold(data: ThresholdsUpdate, session: Session = Depends(get_session)):
-    """Update system thresholds."""
-    current = session.exec(select(ThresholdsModel).order_by(ThresholdsModel.updated_at.desc())).first()
+async def update_threshold(data: ThresholdsUpdate, session: AsyncSession = Depends(get_async_session)):
+    """Update system thresholds (write-through to the thresholds cache)."""
+    current = thresholds_cache.current
     
-    new_temp = data.temperature_max if data.temperature_max is not None else (current.temperature_max if current else 50.0)
-    new_gas = data.gas_max if data.gas_max is not None else (current.gas_max if current else 300.0)
+    new_temp = data.temperature_max if data.temperature_max is not None else current.temperature_max
+    new_gas = data.gas_max if data.gas_max is not None else current.gas_max
     
     new_thresholds = ThresholdsModel(temperature_max=new_temp, gas_max=new_gas)
     session.add(new_thresholds)
-    session.commit()
-    session.refresh(new_thresholds)
-    
-    return Thresholds(temperature_max=new_thresholds.temperature_max, gas_max=new_thresholds.gas_max)
+    version = await bump_version_async(session, THRESHOLDS_KEY)
+    await session.commit()
+
+    thresholds = Thresholds(temperature_max=new_temp, gas_max=new_gas)
+    thresholds_cache.set(thresholds, version)
+    return thresholds
@@ -0,0 +1,23 @@
+from fastapi import APIRouter
+from typing import Optional
+from app.dependencies import get_admission_controller, get_incident_manager
+from app.schemas import IncidentAction
+
+router = APIRouter()
+
+@router.get("/incident")
+def get_incident():
+    """The current fire incident and the load seen by sensor admission control."""
+    return {"incident": get_incident_manager().current, "admission": get_admission_controller().stats()}
+
+@router.post("/incident/acknowledge")
+async def acknowledge_incident(action: Optional[IncidentAction] = None):
+    """Acknowledge the open incident; it then closes once readings stay below the clear level."""
+    action = action or IncidentAction()
+    return await get_incident_manager().acknowledge(action.by, action.note)
+
+@router.post("/incident/clear")
+async def clear_incident(action: Optional[IncidentAction] = None):
+    """Close the open incident right away."""
+    action = action or IncidentAction()
+    return await get_incident_manager().clear(action.by, action.note)
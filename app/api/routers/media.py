@@ -1,7 +1,12 @@
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
+from fastapi.responses import FileResponse
 from sqlmodel import Session, select
+from app.annotations import AnnotationRenderer, RESULTS_URL_PREFIX
 from app.database import get_session
+from app.dependencies import get_annotation_renderer
+from app.live_state import live_state
 from app.models import DetectionEvent
+from app.schemas import Box
 import shutil
 import uuid
 import os
@@ -30,12 +35,37 @@ async def upload_audio(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/media/latest")
-def get_latest_media(session: Session = Depends(get_session)):
+def get_latest_media():
     """Get links to the latest captured media (photo/audio)."""
-    last_detection = session.exec(select(DetectionEvent).order_by(DetectionEvent.timestamp.desc())).first()
-    last_photo_url = last_detection.annotated_image_url if last_detection else None
-    
     return {
-        "latest_photo": last_photo_url,
+        "latest_photo": live_state.last_photo_url,
         "latest_audio": None
     }
+
+@router.get("/results/{name}")
+def get_annotated_image(
+    name: str,
+    session: Session = Depends(get_session),
+    renderer: AnnotationRenderer = Depends(get_annotation_renderer)
+):
+    """
+    Serve an annotated detection image.
+
+    Waits for a pending background render, or draws the image from the stored
+    boxes on first access when ANNOTATION_MODE is lazy.
+    """
+    if os.path.basename(name) != name:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    def load_boxes():
+        event = session.exec(
+            select(DetectionEvent).where(DetectionEvent.annotated_image_url == f"{RESULTS_URL_PREFIX}{name}")
+        ).first()
+        if not event or event.boxes is None:
+            return None
+        return [Box(**box) for box in event.boxes]
+
+    path = renderer.ensure(name, load_boxes)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return FileResponse(path)
@@ -1,66 +1,238 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
-from sqlmodel import Session, select
-from ultralytics import YOLO
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session
 from datetime import datetime
-from app.database import get_session
-from app.dependencies import get_model
+from typing import List, Optional, Set
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.database import get_async_session, get_session, async_engine
+from app.annotations import AnnotationRenderer
+from app.dependencies import get_alert_outbox, get_incident_manager, get_inference_engine, get_annotation_renderer, get_history_buffers
+from app.inference import InferenceEngine
 from app.config import get_settings, Settings
+from app.ingest import read_upload
 from app.services import FireDetectionService
-from app.schemas import DetectionResult
+from app.schemas import DetectionResult, VideoAnalysisResult
+from app.history import encode_cursor, export_response, keyset_page
 from app.models import DetectionEvent
-from app.api.routers.websockets import manager
-from app.state import state
+from app.websockets import manager
+from app.video import analyze_video, spool_upload
+import asyncio
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+DETECTION_EXPORT_COLUMNS = ("id", "timestamp", "filename", "annotated_image_url", "object_count", "has_fire", "boxes")
+
+# Batches still being recorded; referenced here so they finish after a client disconnects
+_batch_tasks: Set[asyncio.Task] = set()
+
+async def notify_fire_confirmed(result: DetectionResult):
+    """Broadcast a confirmed fire to dashboards, mark the incident confirmed and queue the email alert."""
+    incidents = get_incident_manager()
+    await incidents.confirm(result.annotated_image_url)
+    # Notify dashboards of confirmed fire
+    dashboard_message = {
+        "type": "fire_confirmed",
+        "image_url": result.annotated_image_url,
+        "confidence": max([d.confidence for d in result.detections if d.class_name=='fire'], default=0),
+        "message": "Fire confirmed by visual analysis",
+        "timestamp": datetime.now().isoformat()
+    }
+    await manager.notify_dashboards(dashboard_message)
+
+    # Queue Email Alert (delivered by the outbox worker)
+    await get_alert_outbox().enqueue(
+        subject=f"🔥 FIRE CONFIRMED (Visual): {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+        body=f"Visual analysis confirmed fire!\n\nImage: {result.annotated_image_url}\nConfidence: {dashboard_message['confidence']:.2f}\n\nPlease check the system immediately.",
+        incident_key=f"fire_confirmed:{incidents.current.get('id')}"
+    )
+
 @router.post("/predict", response_model=DetectionResult)
 async def predict(
     file: UploadFile = File(...),
-    model: YOLO = Depends(get_model),
+    tiled: Optional[bool] = None,
+    engine: InferenceEngine = Depends(get_inference_engine),
     settings: Settings = Depends(get_settings),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     """
     Perform fire detection on an uploaded image.
-    
+
+    Decoding runs in a worker thread and inference goes through the shared
+    micro-batching engine, so the event loop stays free while the model runs.
+    With `tiled` (default TILED_INFERENCE) large images are analysed as
+    overlapping full-resolution tiles to catch small, distant flames.
+
     If fire is detected with sufficient confidence, a confirmed fire alert is broadcast.
     """
     if not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="File must be an image")
-    
+
+    contents = await read_upload(file, settings.INGEST_MAX_UPLOAD_BYTES)
     try:
-        contents = await file.read()
-        service = FireDetectionService(model, settings, session)
-        result = service.predict(contents, file.filename)
-        
+        if settings.TILED_INFERENCE if tiled is None else tiled:
+            frame, _ = await asyncio.to_thread(engine.prepare, contents, True)
+            result = await engine.submit_tiled(frame, file.filename, source=contents)
+        else:
+            frame, fingerprint = await asyncio.to_thread(engine.prepare, contents)
+            result = await engine.submit(frame, file.filename, fingerprint, source=contents)
+        await FireDetectionService(engine.model, settings, session).record_event_async(result)
+
         # Check if fire was detected in the image
         has_fire = any(d.class_name == 'fire' for d in result.detections)
-        
+
         if has_fire:
-            state.is_fire_detected = True
-            # Notify dashboards of confirmed fire
-            dashboard_message = {
-                "type": "fire_confirmed",
-                "image_url": result.annotated_image_url,
-                "confidence": max([d.confidence for d in result.detections if d.class_name=='fire'], default=0),
-                "message": "Fire confirmed by visual analysis",
-                "timestamp": datetime.now().isoformat()
-            }
-            await manager.notify_dashboards(dashboard_message)
-            
-            # Send Email Alert
-            from app.notifications import send_email_alert
-            send_email_alert(
-                subject=f"🔥 FIRE CONFIRMED (Visual): {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-                body=f"Visual analysis confirmed fire!\n\nImage: {result.annotated_image_url}\nConfidence: {dashboard_message['confidence']:.2f}\n\nPlease check the system immediately."
-            )
-            
+            await notify_fire_confirmed(result)
+
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/predict/batch")
+async def predict_batch(
+    files: List[UploadFile] = File(...),
+    engine: InferenceEngine = Depends(get_inference_engine),
+    settings: Settings = Depends(get_settings)
+):
+    """
+    Perform fire detection on a burst of images in one request.
+
+    Images are decoded in parallel and submitted together so the engine runs
+    them as one batch. Results are streamed back as NDJSON (one line per
+    image, tagged with its index in the upload) in completion order. Once
+    every image is analysed their DetectionEvents are written in a single
+    transaction, and fires alerted, by a task that carries on if the client
+    disconnects.
+    """
+    for file in files:
+        if not file.content_type.startswith("image/"):
+            raise HTTPException(status_code=400, detail=f"File must be an image: {file.filename}")
+
+    uploads = [(file.filename, await read_upload(file, settings.INGEST_MAX_UPLOAD_BYTES)) for file in files]
+
+    async def run_one(index: int, filename: str, contents: bytes):
+        try:
+            frame, fingerprint = await asyncio.to_thread(engine.prepare, contents)
+            return index, await engine.submit(frame, filename, fingerprint, source=contents), None
+        except Exception as e:
+            return index, None, e
+
+    tasks = [asyncio.create_task(run_one(i, name, data)) for i, (name, data) in enumerate(uploads)]
+    recording = asyncio.create_task(record_batch(tasks, engine, settings))
+    _batch_tasks.add(recording)
+    recording.add_done_callback(_batch_tasks.discard)
+
+    async def stream():
+        for next_done in asyncio.as_completed(tasks):
+            index, result, error = await next_done
+            if error is not None:
+                line = {"index": index, "filename": uploads[index][0], "error": str(error)}
+            else:
+                line = {"index": index, **result.model_dump()}
+            yield json.dumps(line) + "\n"
+        # A client reading to the end sees its events stored; shielded so hanging up doesn't cancel the write
+        await asyncio.shield(recording)
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+async def record_batch(tasks: List[asyncio.Task], engine: InferenceEngine, settings: Settings):
+    """Write the DetectionEvents of a batch's successful images in one transaction, then alert its fires."""
+    results = [result for _, result, error in await asyncio.gather(*tasks) if error is None]
+    try:
+        async with AsyncSession(async_engine) as session:
+            await FireDetectionService(engine.model, settings, session).record_events_async(results)
+        for result in results:
+            if any(d.class_name == 'fire' for d in result.detections):
+                await notify_fire_confirmed(result)
+    except Exception as e:
+        logger.error(f"Failed to record a batch of {len(results)} detections: {e}")
+
+@router.post("/predict/video", response_model=VideoAnalysisResult)
+async def predict_video(
+    file: UploadFile = File(...),
+    engine: InferenceEngine = Depends(get_inference_engine),
+    renderer: AnnotationRenderer = Depends(get_annotation_renderer),
+    settings: Settings = Depends(get_settings),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Perform fire detection on a short video clip.
+
+    The clip is decoded as a stream and sampled at VIDEO_SAMPLE_FPS; sampled
+    frames are batched through the model and analysis stops as soon as fire is
+    confirmed in VIDEO_CONFIRM_K of the last VIDEO_CONFIRM_N sampled frames. A
+    single DetectionEvent is recorded with the best frame annotated.
+    """
+    if not file.content_type.startswith("video/"):
+        raise HTTPException(status_code=400, detail="File must be a video")
+
+    path = await spool_upload(file, settings.VIDEO_MAX_UPLOAD_BYTES)
+    try:
+        analysis, best_frame, best_result = await analyze_video(path, file.filename, engine, settings)
+    finally:
+        os.remove(path)
+
+    if best_result is None:
+        return analysis
+
+    analysis.annotated_image_url = await asyncio.to_thread(
+        renderer.submit, file.filename, best_frame, best_result.detections
+    )
+    result = DetectionResult(
+        filename=file.filename,
+        detections=best_result.detections,
+        message=analysis.message,
+        annotated_image_url=analysis.annotated_image_url
+    )
+    await FireDetectionService(engine.model, settings, session).record_event_async(result, has_fire=analysis.fire_confirmed)
+
+    if analysis.fire_confirmed:
+        await notify_fire_confirmed(result)
+
+    return analysis
+
+@router.get("/predict/cache")
+def get_cache_stats(engine: InferenceEngine = Depends(get_inference_engine)):
+    """Hit/miss counters of the duplicate-frame detection cache."""
+    if engine.cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **engine.cache.stats()}
+
 @router.get("/history/detections")
-def get_detection_history(session: Session = Depends(get_session), limit: int = 10):
-    """Retrieve history of detection events."""
-    events = session.exec(select(DetectionEvent).order_by(DetectionEvent.timestamp.desc()).limit(limit)).all()
+def get_detection_history(
+    response: Response,
+    session: Session = Depends(get_session),
+    limit: int = 10,
+    cursor: Optional[str] = None
+):
+    """
+    Retrieve history of detection events, newest first.
+
+    Keyset-paginated on (timestamp, id) via the `X-Next-Cursor` header; the
+    first page of recent events comes from memory.
+    """
+    rows = get_history_buffers().detections.latest(limit) if cursor is None else None
+    if rows is not None:
+        if rows and len(rows) == limit:
+            response.headers["X-Next-Cursor"] = encode_cursor(rows[-1]["timestamp"], rows[-1]["id"])
+        return rows
+
+    events, next_cursor = keyset_page(session, DetectionEvent, limit, cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return events
+
+@router.get("/export/detections")
+def export_detections(
+    format: str = "ndjson",
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to")
+):
+    """Stream all detection events in a range, oldest first (ndjson, csv, arrow or parquet)."""
+    return export_response(
+        "detections", DetectionEvent, DETECTION_EXPORT_COLUMNS, format, start, end, get_settings().EXPORT_BATCH_SIZE
+    )
@@ -0,0 +1,14 @@
+from fastapi import APIRouter
+from app.dependencies import get_retention_manager
+
+router = APIRouter()
+
+@router.get("/retention")
+def get_retention_report():
+    """Report of the last retention run (reclaimed bytes, duration, archives)."""
+    return get_retention_manager().last_report or {"message": "Retention has not run yet"}
+
+@router.post("/retention/run")
+async def run_retention():
+    """Run retention now instead of waiting for the schedule."""
+    return await get_retention_manager().run_once()
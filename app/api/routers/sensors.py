@@ -1,95 +1,343 @@
-from fastapi import APIRouter, Depends
-from sqlmodel import Session, select
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from pydantic import ValidationError
+from sqlmodel import Session
 from datetime import datetime
+from typing import List, Optional
+from app.config import get_settings
 from app.database import get_session
+from app.dependencies import (
+    get_admission_controller, get_alert_outbox, get_history_buffers, get_incident_manager, get_sensor_buffer
+)
+from app.live_state import live_state
+from app.history import encode_cursor, export_response, keyset_page, local_time
 from app.models import SensorReading
+from app.rollups import BUCKETS, METRICS, query_rollups
 from app.schemas import SensorData
 from app.services import FireDetectionService
-from app.api.routers.websockets import manager
-from app.state import state
+from app.websockets import manager
 
 router = APIRouter()
 
-@router.post("/sensors")
-async def update_sensors(data: SensorData, session: Session = Depends(get_session)):
+# Validation messages returned by /sensors/stream; further invalid lines are only counted
+MAX_STREAM_ERRORS = 10
+
+SENSOR_EXPORT_COLUMNS = ("id", "timestamp", "temperature", "humidity", "smoke_level")
+
+async def raise_sensor_alert(data: SensorData, incident_id: str) -> dict:
     """
-    Receive new sensor data, persist it, and check for fire risks.
-    
-    If risk is detected, triggers alerts to monitoring dashboards and cameras.
-    """
-    # Check if fire mode is already active
-    if state.is_fire_detected:
-        return {"message": "Fire already detected. Sensor updates paused to prevent overload."}
-
-    # Persist reading
-    reading = SensorReading(
-        temperature=data.temperature,
-        humidity=data.humidity,
-        smoke_level=data.smoke_level,
-        timestamp=datetime.now()
+    Alert on a newly opened incident: queue an email to the admin and ask cameras for an image.
+
+    Returns:
+        The outbox entry of the email alert (id and "queued" or "deduplicated").
+    """
+    # Queue Email Alert (delivered by the outbox worker, never on the request path)
+    email_alert = await get_alert_outbox().enqueue(
+        subject=f"🔥 FIRE RISK DETECTED: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+        body=f"High risk detected!\n\nTemperature: {data.temperature}°C\nSmoke Level: {data.smoke_level}\n\nPlease check the system immediately.",
+        incident_key=f"sensor_risk:{incident_id}"
     )
-    session.add(reading)
-    session.commit()
-    session.refresh(reading)
 
-    # Risk evaluation
-    fire_alert = FireDetectionService.check_sensor_risk(data, session)
-    
-    # Broadcast to dashboards
-    dashboard_message = {
-        "type": "sensor_reading",
+    camera_message = {
+        "type": "search_image_alert",
         "data": data.dict(),
-        "fire_risk": fire_alert,
+        "message": "Possible fire detected, capture image",
         "timestamp": datetime.now().isoformat()
     }
-    await manager.notify_dashboards(dashboard_message)
-    
-    # Broadcast to cameras if risk is high
-    email_sent = False
-    email_error = None
-    camera_alert = False
+    await manager.notify_cameras(camera_message)
+    return email_alert
+
+@router.post("/sensors")
+async def update_sensors(data: SensorData):
+    """
+    Receive new sensor data, persist it, and check for fire risks.
     
-    if fire_alert:
-        state.is_fire_detected = True
-        # Send Email Alert
-        from app.notifications import send_email_alert
-        email_sent, email_error = send_email_alert(
-            subject=f"🔥 FIRE RISK DETECTED: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-            body=f"High risk detected!\n\nTemperature: {data.temperature}°C\nSmoke Level: {data.smoke_level}\n\nPlease check the system immediately."
-        )
-
-        camera_message = {
-            "type": "search_image_alert",
+    Every admitted reading updates the live state and the fire incident (see
+    app.incidents); opening an incident alerts the admin and the cameras.
+    Under load, routine readings may be sampled instead of stored, or
+    refused with 503 outside an incident (see app.admission).
+    """
+    received_at = datetime.now()
+
+    # Risk evaluation on the in-memory value; persisting goes through the write buffer
+    fire_alert = FireDetectionService.check_sensor_risk(data)
+    incidents = get_incident_manager()
+    admission = get_admission_controller().admit(data, fire_alert, incidents.active)
+    if admission == "rejected":
+        raise HTTPException(status_code=503, detail="Sensor ingest is overloaded, retry later", headers={"Retry-After": "1"})
+
+    # A rejected reading is for the sensor to resend; it must not show up as the current value
+    live_state.update_reading(data, received_at)
+
+    transition = await incidents.observe(data, fire_alert)
+
+    if admission == "stored":
+        # Broadcast to dashboards
+        dashboard_message = {
+            "type": "sensor_reading",
             "data": data.dict(),
-            "message": "Possible fire detected, capture image",
+            "fire_risk": fire_alert,
             "timestamp": datetime.now().isoformat()
         }
-        await manager.notify_cameras(camera_message)
+        await manager.notify_dashboards(dashboard_message)
+
+        # Persist reading (returns after queueing or committing depending on SENSOR_DURABILITY)
+        await get_sensor_buffer().write([{
+            "temperature": data.temperature,
+            "humidity": data.humidity,
+            "smoke_level": data.smoke_level,
+            "timestamp": received_at
+        }])
+    
+    # Broadcast to cameras when the reading opened an incident
+    email_alert = None
+    camera_alert = False
+    
+    if transition == "opened":
+        email_alert = await raise_sensor_alert(data, incidents.current["id"])
         camera_alert = True
 
     return {
         "message": "Sensors updated",
         "fire_alert": fire_alert,
-        "email_sent": email_sent,
-        "email_error": email_error,
-        "camera_alert": camera_alert
+        "email_alert": email_alert,
+        "camera_alert": camera_alert,
+        "admission": admission,
+        "incident": incidents.current["state"]
+    }
+
+def reading_time(data: SensorData, now: Optional[datetime] = None) -> datetime:
+    """Use the timestamp a gateway attached to a reading, or `now` (default: the current time) if it has none."""
+    if data.timestamp:
+        try:
+            parsed = datetime.fromisoformat(data.timestamp)
+        except ValueError:
+            pass
+        else:
+            return local_time(parsed)
+    return now or datetime.now()
+
+async def ingest_batch(readings: List[SensorData]) -> dict:
+    """
+    Evaluate and persist a batch of readings.
+
+    Risk is evaluated for the whole batch against the cached thresholds and
+    every reading goes through the incident state machine, in time order.
+    Dashboards get one coalesced `sensor_batch` message and the rows kept by
+    admission control go to the write buffer as one unit, so they land in a
+    single INSERT and commit.
+    """
+    # Resolved once per reading; readings without a timestamp all get the batch's arrival time
+    received_at = datetime.now()
+    times = [reading_time(data, received_at) for data in readings]
+    order = sorted(range(len(readings)), key=times.__getitem__)
+    risks = FireDetectionService.check_sensor_risk_batch(readings)
+    latest = readings[order[-1]]
+    live_state.update_reading(latest, times[order[-1]])
+    fire_alert = any(risks)
+
+    incidents = get_incident_manager()
+    transitions = [await incidents.observe(readings[i], risks[i]) for i in order]
+    keep = get_admission_controller().admit_batch(readings, risks)
+
+    await manager.notify_dashboards({
+        "type": "sensor_batch",
+        "count": len(readings),
+        "data": latest.dict(),
+        "summary": {
+            field: {
+                "min": min(getattr(r, field) for r in readings),
+                "max": max(getattr(r, field) for r in readings),
+                "avg": sum(getattr(r, field) for r in readings) / len(readings)
+            }
+            for field in ("temperature", "humidity", "smoke_level")
+        },
+        "fire_risk": fire_alert,
+        "risk_count": sum(risks),
+        "timestamp": datetime.now().isoformat()
+    })
+
+    await get_sensor_buffer().write([
+        {
+            "temperature": data.temperature,
+            "humidity": data.humidity,
+            "smoke_level": data.smoke_level,
+            "timestamp": timestamp
+        }
+        for data, timestamp, kept in zip(readings, times, keep) if kept
+    ])
+
+    email_alert = None
+    if "opened" in transitions:
+        # Alert on the riskiest reading of the batch
+        worst = max((r for r, risk in zip(readings, risks) if risk), key=lambda r: (r.temperature, r.smoke_level))
+        email_alert = await raise_sensor_alert(worst, incidents.current.get("id"))
+
+    stored = sum(keep)
+    return {
+        "accepted": len(readings),
+        "stored": stored,
+        "sampled": len(readings) - stored,
+        "fire_alert": fire_alert,
+        "email_alert": email_alert,
+        "incident": incidents.current["state"]
+    }
+
+@router.post("/sensors/batch")
+async def update_sensors_batch(readings: List[SensorData]):
+    """
+    Receive an array of sensor readings in one request.
+
+    Meant for gateways that aggregate many sensors. Each reading keeps its own
+    `timestamp` when given.
+    """
+    if not readings:
+        return {"message": "No readings", "accepted": 0, "fire_alert": False}
+    result = await ingest_batch(readings)
+    return {"message": "Sensors updated", **result}
+
+@router.post("/sensors/stream")
+async def stream_sensors(request: Request):
+    """
+    Long-lived NDJSON ingest for gateways (one SensorData JSON object per line).
+
+    The chunked request body is parsed as it arrives and readings are ingested
+    in batches of SENSOR_STREAM_BATCH_SIZE. Invalid lines are counted and skipped;
+    readings sampled out by admission control are counted as `sampled`.
+    """
+    settings = get_settings()
+    batch: List[SensorData] = []
+    accepted = rejected = sampled = batches = 0
+    fire_alert = False
+    errors = []
+    pending = b""
+
+    async def flush():
+        nonlocal accepted, sampled, batches, fire_alert
+        result = await ingest_batch(batch)
+        accepted += result["accepted"]
+        sampled += result["sampled"]
+        fire_alert = fire_alert or result["fire_alert"]
+        batches += 1
+        batch.clear()
+
+    def parse(line: bytes):
+        nonlocal rejected
+        try:
+            batch.append(SensorData.model_validate_json(line))
+        except ValidationError as e:
+            rejected += 1
+            if len(errors) < MAX_STREAM_ERRORS:
+                errors.append(str(e.errors()[0]["msg"]))
+
+    async for chunk in request.stream():
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            if not line.strip():
+                continue
+            parse(line)
+            if len(batch) >= settings.SENSOR_STREAM_BATCH_SIZE:
+                await flush()
+
+    # The last line needn't end with a newline
+    if pending.strip():
+        parse(pending)
+    if batch:
+        await flush()
+
+    return {
+        "message": "Stream ingested",
+        "accepted": accepted,
+        "rejected": rejected,
+        "sampled": sampled,
+        "batches": batches,
+        "fire_alert": fire_alert,
+        "errors": errors
     }
 
+@router.get("/sensors/buffer")
+def sensor_buffer_stats():
+    """Queue depth and flush latency of the sensor write buffer."""
+    return get_sensor_buffer().stats()
+
 @router.get("/sensors", response_model=SensorData)
-def get_sensors(session: Session = Depends(get_session)):
+def get_sensors():
     """Retrieve the latest sensor reading."""
-    sensor_reading = session.exec(select(SensorReading).order_by(SensorReading.timestamp.desc())).first()
-    if not sensor_reading:
-        return SensorData(temperature=0, humidity=0, smoke_level=0)
-    return SensorData(
-        temperature=sensor_reading.temperature,
-        humidity=sensor_reading.humidity,
-        smoke_level=sensor_reading.smoke_level,
-        timestamp=str(sensor_reading.timestamp)
-    )
+    return live_state.sensors
+
+@router.get("/history/sensors/aggregate")
+def get_sensor_aggregate(
+    bucket: str = "1m",
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    points: Optional[int] = Query(None, ge=3),
+    metric: str = "temperature",
+    session: Session = Depends(get_session)
+):
+    """
+    min/max/avg/count of every sensor per time bucket (1m, 1h or 1d), oldest first.
+
+    Served from rollup tables maintained on ingest. `from` defaults to 1000
+    buckets before `to` (default now). With `points`, the buckets are
+    downsampled with LTTB on the average of `metric` for chart rendering.
+    """
+    if bucket not in BUCKETS:
+        raise HTTPException(status_code=400, detail=f"bucket must be one of {', '.join(BUCKETS)}")
+    if metric not in METRICS:
+        raise HTTPException(status_code=400, detail=f"metric must be one of {', '.join(METRICS)}")
+    end = local_time(end) or datetime.now()
+    start = local_time(start) or end - 1000 * BUCKETS[bucket]
+    return query_rollups(session, bucket, start, end, get_settings().AGGREGATE_MAX_BUCKETS, points, metric)
 
 @router.get("/history/sensors")
-def get_sensor_history(session: Session = Depends(get_session), limit: int = 10):
-    """Retrieve historical sensor readings."""
-    readings = session.exec(select(SensorReading).order_by(SensorReading.timestamp.desc()).limit(limit)).all()
+def get_sensor_history(
+    response: Response,
+    session: Session = Depends(get_session),
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to")
+):
+    """
+    Retrieve historical sensor readings, newest first.
+
+    Pages are keyset-paginated on (timestamp, id): pass the `X-Next-Cursor`
+    header of a response as `cursor` to get the following page. The first
+    page comes from the in-memory ring of recent readings when it covers the
+    request (optionally limited to the `from`/`to` window); everything else
+    is queried from the DB.
+    """
+    start, end = local_time(start), local_time(end)
+    rows = None
+    if cursor is None:
+        ring = get_history_buffers().sensors
+        if start is not None:
+            rows = ring.window(start, end, limit)
+        elif end is None:
+            rows = ring.latest(limit)
+
+    if rows is not None:
+        if rows and len(rows) == limit:
+            response.headers["X-Next-Cursor"] = encode_cursor(datetime.fromisoformat(rows[-1]["timestamp"]), rows[-1]["id"])
+        return rows
+
+    readings, next_cursor = keyset_page(session, SensorReading, limit, cursor, start, end)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return readings
+
+@router.get("/export/sensors")
+def export_sensors(
+    format: str = "ndjson",
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to")
+):
+    """
+    Stream all sensor readings in a range, oldest first.
+
+    `format` is ndjson, csv, arrow (IPC stream) or parquet; the last two need
+    pyarrow. Rows are read and written EXPORT_BATCH_SIZE at a time.
+    """
+    return export_response(
+        "sensors", SensorReading, SENSOR_EXPORT_COLUMNS, format, start, end, get_settings().EXPORT_BATCH_SIZE
+    )
@@ -1,70 +1,55 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from typing import Literal, List
+from typing import Literal, Optional
 from datetime import datetime
+from app.config import get_settings
+from app.websockets import CLIENT_TYPES, manager
 
 router = APIRouter()
 
-class ConnectionManager:
-    def __init__(self):
-        self.dashboard_connections: List[WebSocket] = []
-        self.camera_connections: List[WebSocket] = []
-    
-    async def connect(self, websocket: WebSocket, client_type: str):
-        await websocket.accept()
-        if client_type == "dashboard":
-            self.dashboard_connections.append(websocket)
-        elif client_type == "camera":
-            self.camera_connections.append(websocket)
-    
-    def disconnect(self, websocket: WebSocket, client_type: str):
-        if client_type == "dashboard" and websocket in self.dashboard_connections:
-            self.dashboard_connections.remove(websocket)
-        elif client_type == "camera" and websocket in self.camera_connections:
-            self.camera_connections.remove(websocket)
-    
-    async def notify_cameras(self, message: dict):
-        """Notify only camera clients"""
-        dead_connections = []
-        for connection in self.camera_connections:
-            try:
-                await connection.send_json(message)
-            except:
-                dead_connections.append(connection)
-        
-        for conn in dead_connections:
-            self.camera_connections.remove(conn)
-    
-    async def notify_dashboards(self, message: dict):
-        """Notify only dashboard clients"""
-        dead_connections = []
-        for connection in self.dashboard_connections:
-            try:
-                await connection.send_json(message)
-            except:
-                dead_connections.append(connection)
-        
-        for conn in dead_connections:
-            self.dashboard_connections.remove(conn)
-
-# Singleton instance
-manager = ConnectionManager()
+@router.get("/ws/stats")
+def get_websocket_stats():
+    """Connections, queue depths, drops/evictions and broadcast delivery latency of this worker, plus its bus."""
+    from app.dependencies import get_bus
+    return {**manager.stats(), "bus": get_bus().stats()}
 
 @router.websocket("/ws/{client_type}")
-async def websocket_endpoint(websocket: WebSocket, client_type: Literal["dashboard", "camera"]):
+async def websocket_endpoint(websocket: WebSocket, client_type: Literal["dashboard", "camera"], camera_id: Optional[str] = None):
     """
     WebSocket endpoint for real-time communication.
     
+    Cameras may also push binary JPEG frames on this socket; each one is run
+    through the detector (newest frame wins when inference falls behind) and a
+    `detection_result` message is sent back.
+    
+    Everything sent to the client goes through its outbound queue (see
+    app.websockets), in order with the broadcasts.
+    
+    Dashboards may send `{"type": "subscribe", "channels": {"sensors":
+    {"max_rate": 2, "mode": "summary"}, "status": {}}}` to receive throttled
+    `channel_update` messages (a snapshot, then deltas) for the sensors,
+    detections and status channels instead of every raw message; alerts
+    such as `fire_confirmed` are always sent immediately.
+    
     Args:
         client_type: Type of client ('dashboard' or 'camera').
+        camera_id: Optional identifier used to name a camera's frames.
     """
-    if client_type not in ["dashboard", "camera"]:
+    if client_type not in CLIENT_TYPES:
         await websocket.close(code=1003, reason="Invalid client type")
         return
     
-    await manager.connect(websocket, client_type)
+    client = await manager.connect(websocket, client_type)
+    
+    stream = None
+    if client_type == "camera":
+        from app.camera_stream import CameraStream
+        from app.dependencies import get_inference_engine
+        settings = get_settings()
+        stream = CameraStream(client, camera_id or f"{id(websocket):x}", get_inference_engine(), settings)
+        stream.start()
     
     try:
-        await websocket.send_json({
+        await client.send_json({
             "type": "connection_established",
             "client_type": client_type,
             "message": f"Connected as {client_type}",
@@ -72,8 +57,26 @@ async def websocket_endpoint(websocket: WebSocket, client_type: Literal["dashboa
         })
         
         while True:
-            # Keep connection alive
-            await websocket.receive_text()
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            
+            # Dashboards may (un)subscribe to channels; other text messages only keep the connection alive
+            text = message.get("text")
+            if text is not None and client_type == "dashboard":
+                manager.handle_control(client, text)
+                continue
+            data = message.get("bytes")
+            if stream is None or data is None:
+                continue
+            if len(data) > settings.INGEST_MAX_UPLOAD_BYTES:
+                await client.send_json({"type": "detection_error", "message": "Frame too large"})
+                continue
+            stream.push(data)
             
     except WebSocketDisconnect:
+        pass
+    finally:
         manager.disconnect(websocket, client_type)
+        if stream is not None:
+            await stream.stop()
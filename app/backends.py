@@ -0,0 +1,148 @@
+from ultralytics import YOLO
+from app.config import Settings
+from typing import Dict, List, Optional
+import logging
+import os
+import shutil
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "onnx", "openvino")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+def model_artifact_path(model_path: str, backend: str, int8: bool = False) -> str:
+    """
+    Where the exported model for a backend lives, derived from the .pt path.
+
+    models/best.pt -> models/best.onnx, models/best_int8.onnx,
+    models/best_openvino_model, models/best_int8_openvino_model
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown model backend '{backend}', expected one of {BACKENDS}")
+    if backend == "torch":
+        return model_path
+
+    base, _ = os.path.splitext(model_path)
+    suffix = "_int8" if int8 else ""
+    if backend == "onnx":
+        return f"{base}{suffix}.onnx"
+    return f"{base}{suffix}_openvino_model"
+
+def model_version(settings: Settings) -> str:
+    """Identify the loaded model artifact, e.g. for cache keys."""
+    path = model_artifact_path(settings.MODEL_PATH, settings.MODEL_BACKEND, settings.MODEL_INT8)
+    if not os.path.exists(path):
+        path = settings.MODEL_PATH
+    mtime = int(os.path.getmtime(path)) if os.path.exists(path) else 0
+    return f"{settings.MODEL_BACKEND}{'-int8' if settings.MODEL_INT8 else ''}:{path}:{mtime}"
+
+def load_model(settings: Settings) -> YOLO:
+    """
+    Load the detection model for the configured MODEL_BACKEND.
+
+    Ultralytics exposes the same predict() API for .pt, ONNX Runtime and
+    OpenVINO artifacts, so everything downstream is backend agnostic. Falls
+    back to the PyTorch weights if the exported artifact is missing.
+    """
+    backend = settings.MODEL_BACKEND
+    path = model_artifact_path(settings.MODEL_PATH, backend, settings.MODEL_INT8)
+
+    if backend != "torch" and not os.path.exists(path):
+        print(f"Warning: {backend} model not found at {path}. Run `python -m app.export --backend {backend}` to create it. Falling back to PyTorch.")
+        path = settings.MODEL_PATH
+
+    if not os.path.exists(path):
+        print(f"Warning: Model not found at {path}. Using 'models/best.pt' for demonstration.")
+        path = "models/best.pt"
+
+    print(f"Loading {backend} model from {path}...")
+    return YOLO(path, task="detect")
+
+def export_model(model_path: str, backend: str, int8: bool = False, imgsz: int = 640, data: Optional[str] = None) -> str:
+    """
+    Export the PyTorch weights to a CPU-optimized backend.
+
+    ONNX INT8 uses ONNX Runtime dynamic quantization on top of the fp32 export;
+    OpenVINO INT8 uses the ultralytics/NNCF post-training quantization, calibrated
+    on `data` (a dataset yaml) when given.
+
+    Returns:
+        str: Path of the exported artifact, as expected by model_artifact_path.
+    """
+    target = model_artifact_path(model_path, backend, int8)
+    if backend == "torch":
+        return target
+
+    model = YOLO(model_path)
+    if backend == "onnx":
+        # Dynamic batch axis so the inference engine can send whole batches
+        exported = model.export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+        if int8:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            quantize_dynamic(exported, target, weight_type=QuantType.QUInt8)
+            return target
+    else:
+        kwargs = {"data": data} if data else {}
+        exported = model.export(format="openvino", imgsz=imgsz, dynamic=True, int8=int8, **kwargs)
+
+    exported = str(exported)
+    if os.path.abspath(exported) != os.path.abspath(target):
+        if os.path.isdir(target):
+            shutil.rmtree(target)
+        shutil.move(exported, target)
+    return target
+
+def _iou(a: List[float], b: List[float]) -> float:
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, ix2 - ix1) * max(0.0, iy2 - iy1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+def compare_models(reference: YOLO, candidate: YOLO, images_dir: str, conf: float, iou: float = 0.5) -> Dict[str, float]:
+    """
+    Check a quantized/exported model against the fp32 reference on a folder of images.
+
+    Boxes are matched greedily by class and IoU. Recall is the share of reference
+    boxes the candidate reproduces, precision the share of candidate boxes that
+    match a reference box.
+    """
+    images = sorted(
+        os.path.join(images_dir, name)
+        for name in os.listdir(images_dir)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    if not images:
+        raise ValueError(f"No images found in {images_dir}")
+
+    ref_total = cand_total = matched = 0
+    conf_deltas = []
+    for path in images:
+        ref = reference.predict(path, conf=conf, verbose=False)[0].boxes
+        cand = candidate.predict(path, conf=conf, verbose=False)[0].boxes
+        ref_boxes = list(zip(ref.xyxy.tolist(), ref.cls.tolist(), ref.conf.tolist()))
+        cand_boxes = list(zip(cand.xyxy.tolist(), cand.cls.tolist(), cand.conf.tolist()))
+        ref_total += len(ref_boxes)
+        cand_total += len(cand_boxes)
+
+        unmatched = list(cand_boxes)
+        for box, cls, score in sorted(ref_boxes, key=lambda b: -b[2]):
+            best, best_iou = None, iou
+            for other in unmatched:
+                overlap = _iou(box, other[0])
+                if other[1] == cls and overlap >= best_iou:
+                    best, best_iou = other, overlap
+            if best is not None:
+                unmatched.remove(best)
+                matched += 1
+                conf_deltas.append(abs(score - best[2]))
+
+    return {
+        "images": len(images),
+        "reference_boxes": ref_total,
+        "candidate_boxes": cand_total,
+        "matched": matched,
+        "recall": matched / ref_total if ref_total else 1.0,
+        "precision": matched / cand_total if cand_total else 1.0,
+        "mean_confidence_delta": sum(conf_deltas) / len(conf_deltas) if conf_deltas else 0.0,
+    }
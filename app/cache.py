@@ -0,0 +1,192 @@
+from PIL import Image
+from app.schemas import DetectionResult
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set
+import hashlib
+import threading
+import time
+
+HASH_BITS = 64
+
+# Upper bound on near-duplicate candidates compared per lookup
+MAX_NEAR_CANDIDATES = 64
+
+@dataclass(frozen=True)
+class Fingerprint:
+    digest: str  # sha256 of the uploaded bytes
+    phash: int   # 64-bit difference hash of the decoded image
+    width: int   # Size of the original upload, the coordinate space of its boxes
+    height: int
+
+@dataclass
+class CacheEntry:
+    fingerprint: Fingerprint
+    result: DetectionResult
+    created_at: float
+    used_at: float
+
+def difference_hash(image: Image.Image) -> int:
+    """64-bit dHash: compares horizontally adjacent pixels of a 9x8 grayscale thumbnail."""
+    small = image.resize((9, 8), Image.BILINEAR, reducing_gap=2.0).convert("L")
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (1 if left < right else 0)
+    return value
+
+def hash_bands(phash: int, count: int) -> List[int]:
+    """Split a hash into `count` bit ranges; two hashes within count-1 bits agree on at least one."""
+    bounds = [round(i * HASH_BITS / count) for i in range(count + 1)]
+    return [(phash >> low) & ((1 << (high - low)) - 1) for low, high in zip(bounds, bounds[1:])]
+
+class DetectionCache:
+    """
+    LRU/TTL cache of detection results for duplicate and near-duplicate frames.
+
+    Entries are keyed on the exact content hash and a perceptual hash of the
+    decoded image, namespaced by model version and confidence threshold. A
+    frame whose dHash is within `max_distance` bits of a cached one is a near
+    hit, and reuses the cached boxes (scaled to its own size) and annotated
+    image URL. Near-hit candidates come from an index of the hash split into
+    max_distance + 1 bands, so a lookup never scans the whole cache.
+    """
+
+    def __init__(self, namespace: str, max_entries: int = 1024, ttl_seconds: float = 300.0, max_distance: int = 4):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_distance = max_distance
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._bands: Dict[tuple, Set[str]] = defaultdict(set)  # (band index, band value) -> keys
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def fingerprint(image_bytes: bytes, image: Image.Image, width: int, height: int) -> Fingerprint:
+        return Fingerprint(
+            digest=hashlib.sha256(image_bytes).hexdigest(),
+            phash=difference_hash(image),
+            width=width,
+            height=height
+        )
+
+    def _key(self, fingerprint: Fingerprint) -> str:
+        return f"{self.namespace}:{fingerprint.digest}"
+
+    def _expired(self, entry: CacheEntry, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - entry.created_at > self.ttl_seconds
+
+    def _band_keys(self, phash: int) -> List[tuple]:
+        return list(enumerate(hash_bands(phash, self.max_distance + 1)))
+
+    def _remove(self, key: str, evicted: bool = True):
+        entry = self._entries.pop(key)
+        for band in self._band_keys(entry.fingerprint.phash):
+            keys = self._bands.get(band)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._bands[band]
+        if evicted:
+            self.evictions += 1
+
+    def _find_near(self, fingerprint: Fingerprint, now: float) -> Optional[str]:
+        """
+        Key of the closest fresh entry within max_distance bits (the most
+        recently used one among equals); expired candidates are evicted and skipped.
+        """
+        candidates = set()
+        for band in self._band_keys(fingerprint.phash):
+            candidates.update(self._bands.get(band, ()))
+        best_key, best_rank = None, None
+        for checked, key in enumerate(candidates):
+            if checked >= MAX_NEAR_CANDIDATES:
+                break
+            entry = self._entries[key]
+            if self._expired(entry, now):
+                self._remove(key)
+                continue
+            distance = (entry.fingerprint.phash ^ fingerprint.phash).bit_count()
+            if distance > self.max_distance:
+                continue
+            rank = (-distance, entry.used_at)
+            if best_rank is None or rank > best_rank:
+                best_key, best_rank = key, rank
+        return best_key
+
+    def get(self, fingerprint: Fingerprint, filename: str, near: bool = True) -> Optional[DetectionResult]:
+        """
+        Return a cached result for this frame (renamed to `filename`), or None.
+
+        near=False only accepts byte-identical frames.
+        """
+        now = time.monotonic()
+        with self._lock:
+            key = self._key(fingerprint)
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry, now):
+                self._remove(key)
+                entry = None
+
+            is_near = False
+            if entry is None and near and self.max_distance > 0:
+                key = self._find_near(fingerprint, now)
+                if key is not None:
+                    entry, is_near = self._entries[key], True
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            entry.used_at = now
+            if is_near:
+                self.near_hits += 1
+            else:
+                self.hits += 1
+            return self._adapt(entry, fingerprint, filename)
+
+    @staticmethod
+    def _adapt(entry: CacheEntry, fingerprint: Fingerprint, filename: str) -> DetectionResult:
+        """The cached result renamed, with its boxes scaled to the size of the new frame."""
+        cached = entry.fingerprint
+        update = {"filename": filename}
+        if (cached.width, cached.height) != (fingerprint.width, fingerprint.height):
+            sx = fingerprint.width / cached.width
+            sy = fingerprint.height / cached.height
+            update["detections"] = [
+                d.model_copy(update={"x1": d.x1 * sx, "y1": d.y1 * sy, "x2": d.x2 * sx, "y2": d.y2 * sy})
+                for d in entry.result.detections
+            ]
+        return entry.result.model_copy(update=update)
+
+    def put(self, fingerprint: Fingerprint, result: DetectionResult):
+        with self._lock:
+            key = self._key(fingerprint)
+            if key in self._entries:
+                self._remove(key, evicted=False)
+            now = time.monotonic()
+            self._entries[key] = CacheEntry(fingerprint, result, now, now)
+            for band in self._band_keys(fingerprint.phash):
+                self._bands[band].add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.near_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.near_hits) / lookups if lookups else 0.0,
+            }
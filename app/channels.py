@@ -0,0 +1,288 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+import asyncio
+import json
+import time
+
+CHANNELS = ("sensors", "detections", "status")
+MODES = ("latest", "summary")
+
+SENSOR_FIELDS = ("temperature", "humidity", "smoke_level")
+DETECTION_FIELDS = ("id", "filename", "annotated_image_url", "object_count", "has_fire", "timestamp")
+
+# Dashboard message types feeding each channel
+CHANNEL_OF = {
+    "sensor_reading": "sensors",
+    "sensor_batch": "sensors",
+    "detection_event": "detections",
+}
+
+# Only delivered through the detections channel; dashboards that never subscribed didn't ask for them
+CHANNEL_ONLY_TYPES = {"detection_event"}
+
+@dataclass(frozen=True)
+class Subscription:
+    channel: str
+    max_rate: float  # Updates per second
+    mode: str = "latest"  # latest value, or min/max/avg summary of the window
+    deltas: bool = True  # Only send what changed since the last update
+
+def parse_subscriptions(request: dict, default_rate: float, max_rate: float) -> List[Subscription]:
+    """
+    Subscriptions from a dashboard's `subscribe` message.
+
+    `channels` is either a list of names (using the top-level `max_rate`,
+    `mode` and `deltas`) or an object mapping each name to its own options.
+
+    Raises:
+        ValueError: describing the first invalid field.
+    """
+    channels = request.get("channels")
+    if isinstance(channels, list):
+        channels = {name: {} for name in channels}
+    if not isinstance(channels, dict) or not channels:
+        raise ValueError("channels must be a non-empty list or object")
+
+    subscriptions = []
+    for name, options in channels.items():
+        if name not in CHANNELS:
+            raise ValueError(f"Unknown channel '{name}', expected one of {CHANNELS}")
+        if not isinstance(options, dict):
+            raise ValueError(f"Options of channel '{name}' must be an object")
+        options = {**{k: request[k] for k in ("max_rate", "mode", "deltas") if k in request}, **options}
+        try:
+            rate = float(options.get("max_rate", default_rate))
+        except (TypeError, ValueError):
+            raise ValueError("max_rate must be a number")
+        if rate <= 0:
+            raise ValueError("max_rate must be positive")
+        mode = options.get("mode", "latest")
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}")
+        subscriptions.append(Subscription(name, min(rate, max_rate), mode, bool(options.get("deltas", True))))
+    return subscriptions
+
+def diff(previous: dict, current: dict) -> dict:
+    """Top-level keys of `current` whose value differs from `previous`."""
+    return {key: value for key, value in current.items() if previous.get(key) != value}
+
+class ChannelGroup:
+    """
+    The dashboards sharing one Subscription, updated together.
+
+    Messages fed in during a window of 1/max_rate seconds are coalesced; at
+    the end of the window one update is serialized for the whole group. The
+    first update after a quiet period goes out right away, and an urgent
+    message (a reading with fire risk) flushes immediately.
+
+    With deltas, members get only the keys that changed since the previous
+    update; members that just joined or lost messages to the slow-consumer
+    policy get a full snapshot instead.
+    """
+
+    def __init__(self, subscription: Subscription):
+        self.subscription = subscription
+        self.interval = 1.0 / subscription.max_rate
+        self.members: Dict[object, int] = {}  # Client -> its drop count when we last sent to it (-1: needs a snapshot)
+        self.last: Optional[dict] = None
+        self.seq = 0
+        self.updates = 0
+        self.coalesced = 0
+        self._dirty = False
+        self._last_flush = float("-inf")
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._reset()
+
+    def _reset(self):
+        self.count = 0
+        self.latest: Optional[dict] = None
+        self.fire_risk = False
+        self.risk_count = 0
+        self.fire_count = 0
+        self.summary = {field: [float("inf"), float("-inf"), 0.0] for field in SENSOR_FIELDS}
+
+    def join(self, client):
+        self.members[client] = -1
+        if self.last is not None:
+            self._send(client, self._message("snapshot", self.last))
+        elif self.subscription.channel == "status":
+            self._dirty = True
+            self.flush()
+
+    def leave(self, client):
+        self.members.pop(client, None)
+        if not self.members and self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def add(self, message: dict):
+        """Fold a sensor_reading, sensor_batch or detection_event message into the current window."""
+        self._dirty = True
+        kind = message.get("type")
+        if kind == "detection_event":
+            self.count += message.get("count", 1)
+            self.fire_count += message.get("fire_count", 0)
+            self.latest = message["data"]
+            return
+
+        count = message.get("count", 1)
+        self.count += count
+        self.latest = {**message["data"], "fire_risk": message.get("fire_risk", False)}
+        self.fire_risk = self.fire_risk or message.get("fire_risk", False)
+        self.risk_count += message.get("risk_count", int(bool(message.get("fire_risk"))))
+        for field in SENSOR_FIELDS:
+            stats = self.summary[field]
+            if kind == "sensor_batch":
+                low, high, avg = (message["summary"][field][key] for key in ("min", "max", "avg"))
+            else:
+                low = high = avg = message["data"][field]
+            stats[0] = min(stats[0], low)
+            stats[1] = max(stats[1], high)
+            stats[2] += avg * count
+
+    def touch(self):
+        """Something the status depends on changed."""
+        self._dirty = True
+
+    def schedule(self, urgent: bool = False):
+        if self._timer is not None and not urgent:
+            self.coalesced += 1
+            return
+        wait = 0.0 if urgent else self._last_flush + self.interval - time.monotonic()
+        if wait <= 0:
+            self.flush()
+        else:
+            self.coalesced += 1
+            self._timer = asyncio.get_running_loop().call_later(wait, self.flush)
+
+    def _snapshot(self) -> dict:
+        channel, mode = self.subscription.channel, self.subscription.mode
+        if channel == "status":
+            from app.dependencies import get_incident_manager
+            from app.live_state import live_state
+            incident = get_incident_manager().current
+            return {
+                "status": live_state.status().value,
+                "is_fire_detected": incident["state"] != "normal",
+                "incident": incident["state"],
+                "incident_id": incident.get("id"),
+            }
+        if channel == "detections":
+            if mode == "latest":
+                return dict(self.latest)
+            return {"count": self.count, "fire_count": self.fire_count, "latest": self.latest}
+        if mode == "latest":
+            return dict(self.latest)
+        return {
+            "count": self.count,
+            **{
+                field: {"min": low, "max": high, "avg": total / self.count}
+                for field, (low, high, total) in self.summary.items()
+            },
+            "fire_risk": self.fire_risk,
+            "risk_count": self.risk_count,
+            "latest": self.latest,
+        }
+
+    def _message(self, kind: str, data: dict) -> str:
+        return json.dumps({
+            "type": "channel_update",
+            "channel": self.subscription.channel,
+            "kind": kind,
+            "seq": self.seq,
+            "data": data,
+            "timestamp": datetime.now().isoformat()
+        }, separators=(",", ":"), ensure_ascii=False, default=str)
+
+    def _send(self, client, text: str):
+        drops = client.dropped
+        client.offer(text)
+        # Recorded before offering: if that push dropped an older update, the next one is a snapshot
+        self.members[client] = drops
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._dirty or not self.members:
+            return
+        snapshot = self._snapshot()
+        self._reset()
+        self._dirty = False
+        self._last_flush = time.monotonic()
+
+        delta = diff(self.last, snapshot) if self.subscription.deltas and self.last is not None else None
+        self.last = snapshot
+        texts = {}
+        for client, drops in list(self.members.items()):
+            if client.closed:
+                del self.members[client]
+                continue
+            if delta is None or drops != client.dropped:
+                kind, data = "snapshot", snapshot
+            elif delta:
+                kind, data = "delta", delta
+            else:
+                continue  # Nothing visible changed
+            if not texts:
+                self.seq += 1
+                self.updates += 1
+            if kind not in texts:
+                texts[kind] = self._message(kind, data)
+            self._send(client, texts[kind])
+
+class ChannelHub:
+    """Dashboard subscriptions of this worker, grouped so each update is built once per group."""
+
+    def __init__(self):
+        self.groups: Dict[Subscription, ChannelGroup] = {}
+
+    def subscribe(self, client, subscriptions: Iterable[Subscription]):
+        for subscription in subscriptions:
+            self.unsubscribe(client, [subscription.channel])
+            group = self.groups.get(subscription)
+            if group is None:
+                group = self.groups[subscription] = ChannelGroup(subscription)
+            client.subscriptions[subscription.channel] = subscription
+            group.join(client)
+
+    def unsubscribe(self, client, channels: Optional[Iterable[str]] = None):
+        for channel in list(channels if channels is not None else client.subscriptions):
+            subscription = client.subscriptions.pop(channel, None)
+            group = self.groups.get(subscription) if subscription else None
+            if group is not None:
+                group.leave(client)
+                if not group.members:
+                    del self.groups[subscription]
+
+    def feed(self, message: dict):
+        """Route a dashboard broadcast into the groups of its channel (and the status groups)."""
+        if not self.groups:
+            return
+        channel = CHANNEL_OF.get(message.get("type"))
+        urgent = bool(message.get("fire_risk")) or message.get("type") in ("fire_confirmed", "incident_update")
+        for group in list(self.groups.values()):
+            if group.subscription.channel == channel:
+                group.add(message)
+            elif group.subscription.channel == "status":
+                group.touch()
+            else:
+                continue
+            group.schedule(urgent)
+
+    def stats(self) -> dict:
+        return {
+            "groups": [
+                {
+                    "channel": group.subscription.channel,
+                    "max_rate": group.subscription.max_rate,
+                    "mode": group.subscription.mode,
+                    "deltas": group.subscription.deltas,
+                    "members": len(group.members),
+                    "updates": group.updates,
+                    "coalesced": group.coalesced,
+                }
+                for group in self.groups.values()
+            ]
+        }
@@ -5,6 +5,103 @@ class Settings(BaseSettings):
     APP_NAME: str = "YOLO Fire Detection API"
     MODEL_PATH: str = "models/best.pt"  # Default path, can be overridden by env var
     CONFIDENCE_THRESHOLD: float = 0.1
+    MODEL_BACKEND: str = "torch"  # torch | onnx | openvino, see `python -m app.export`
+    MODEL_INT8: bool = False  # Load the INT8-quantized export of MODEL_BACKEND
+
+    # Inference engine (micro-batching)
+    INFERENCE_MAX_BATCH_SIZE: int = 8
+    INFERENCE_MAX_WAIT_MS: float = 10.0
+    INFERENCE_WORKERS: int = 0  # >0 runs the model in that many worker processes
+
+    # Duplicate-frame detection cache (0 entries disables it)
+    DETECTION_CACHE_SIZE: int = 1024
+    DETECTION_CACHE_TTL_SECONDS: float = 300.0
+    DETECTION_CACHE_MAX_DISTANCE: int = 4  # Hamming distance between perceptual hashes
+
+    # Image ingest
+    INGEST_MAX_UPLOAD_BYTES: int = 20 * 1024 * 1024
+    INGEST_TARGET_SIZE: int = 640  # Decode/resize so the long side is about the model input size (0 = full resolution)
+
+    # Tiled (sliced) inference for large images
+    TILED_INFERENCE: bool = False  # Default for /predict; the `tiled` query parameter overrides it
+    TILE_SIZE: int = 640
+    TILE_OVERLAP: float = 0.2
+    TILE_MIN_SIDE: int = 1280  # Smaller images are not tiled
+    TILE_NMS_IOU: float = 0.5
+
+    # Camera frame streaming over /ws/camera
+    CAMERA_MAX_FPS: float = 2.0  # Per camera; 0 = as fast as inference allows
+    CAMERA_RECORD_EMPTY: bool = False  # Also store DetectionEvents for frames with no detections
+
+    # WebSocket broadcasts
+    WS_QUEUE_SIZE: int = 256  # Outbound messages buffered per connection
+    WS_SLOW_CONSUMER_POLICY: str = "drop_oldest"  # drop_oldest | drop_newest | evict, when a connection's queue is full
+    WS_SEND_TIMEOUT: float = 5.0  # A connection whose send stalls this long is evicted
+    WS_DEFAULT_UPDATE_RATE: float = 1.0  # Updates/second of a dashboard channel subscription that doesn't ask for a rate
+    WS_MAX_UPDATE_RATE: float = 10.0  # Highest rate a subscription may ask for
+
+    # Cross-worker pub/sub for broadcasts and the fire state
+    BUS_BACKEND: str = "memory"  # memory (single worker) | unix (uvicorn --workers N on one host)
+    BUS_SOCKET_PATH: str = "/tmp/iot_api_bus.sock"  # Unix-socket broker address (plus a .lock file next to it)
+
+    # Video clip analysis
+    VIDEO_MAX_UPLOAD_BYTES: int = 200 * 1024 * 1024
+    VIDEO_SAMPLE_FPS: float = 2.0
+    VIDEO_BATCH_SIZE: int = 8
+    VIDEO_CONFIRM_K: int = 3  # Fire in K of the last N sampled frames confirms it
+    VIDEO_CONFIRM_N: int = 5
+
+    # Annotated images
+    ANNOTATION_MODE: str = "background"  # sync | background | lazy (rendered on first GET)
+    ANNOTATION_FORMAT: str = "jpeg"  # jpeg | webp
+    ANNOTATION_QUALITY: int = 85
+    ANNOTATION_WORKERS: int = 2
+    ANNOTATE_EMPTY: bool = True  # False skips rendering when nothing was detected
+    
+    # Sensor ingestion
+    SENSOR_STREAM_BATCH_SIZE: int = 500  # Readings per INSERT on /sensors/stream
+    SENSOR_DURABILITY: str = "group"  # sync (commit per request), group (wait for group commit) or async (write-behind)
+    SENSOR_FLUSH_BATCH_SIZE: int = 500  # Flush the write buffer once this many readings are queued...
+    SENSOR_FLUSH_INTERVAL_MS: float = 10.0  # ...or this long after the first one arrived
+    SENSOR_BUFFER_MAX_SIZE: int = 10000  # Queued writes before producers are made to wait
+    
+    # Overload control (see app.admission) and fire incidents (see app.incidents)
+    ADMISSION_QUEUE_HIGH: float = 0.5  # Write buffer fill (fraction of SENSOR_BUFFER_MAX_SIZE) at which readings start being sampled...
+    ADMISSION_TARGET_LATENCY_MS: float = 100.0  # ...or the sensor write latency at which they do
+    ADMISSION_REJECT_PRESSURE: float = 4.0  # Load (1 = at the limits above) at which routine single readings get 503 outside an incident
+    ADMISSION_CHANGE_THRESHOLD: float = 0.05  # A reading that moved this fraction from the last stored one is always stored
+    ADMISSION_MIN_KEEP_SECONDS: float = 1.0  # At least one reading is stored per interval under any load
+    INCIDENT_CLEAR_MARGIN: float = 0.1  # Readings must fall this fraction below the thresholds to start clearing an incident...
+    INCIDENT_CLEAR_SECONDS: float = 60.0  # ...and stay there this long before it closes
+    
+    # In-memory history
+    HISTORY_SENSOR_BUFFER_SIZE: int = 100000  # Recent readings kept for /history/sensors (~40 bytes each; 0 = always query the DB)
+    HISTORY_DETECTION_BUFFER_SIZE: int = 1000  # Recent detection events kept for /history/detections
+    EXPORT_BATCH_SIZE: int = 5000  # Rows per query/chunk in /export/* streams
+    
+    # Rollups (/history/sensors/aggregate)
+    ROLLUP_1M_RETENTION_DAYS: int = 30  # Drop 1-minute buckets older than this (0 = keep)
+    ROLLUP_1H_RETENTION_DAYS: int = 730  # Drop 1-hour buckets older than this (0 = keep); 1-day buckets are kept
+    ROLLUP_COMPACTION_INTERVAL: float = 3600.0  # Seconds between compaction runs (0 = never)
+    AGGREGATE_MAX_BUCKETS: int = 100000  # Upper bound on buckets read per aggregate query
+    
+    # Retention (0 disables a limit)
+    RETENTION_INTERVAL: float = 86400.0  # Seconds between retention runs (0 = never)
+    RETENTION_ARCHIVE_DIR: str = "archive"  # Expired rows are archived here before deletion
+    RETENTION_BATCH_SIZE: int = 10000  # Rows per archive batch / DELETE statement
+    RETENTION_SENSOR_DAYS: int = 90
+    RETENTION_SENSOR_MAX_ROWS: int = 0
+    RETENTION_DETECTION_DAYS: int = 365
+    RETENTION_DETECTION_MAX_ROWS: int = 0
+    RETENTION_LOG_DAYS: int = 90
+    RETENTION_LOG_MAX_ROWS: int = 0
+    RETENTION_RESULTS_DAYS: int = 365  # static/results and static/frames
+    RETENTION_RESULTS_MAX_BYTES: int = 0
+    RETENTION_AUDIO_DAYS: int = 90  # static/audio
+    RETENTION_AUDIO_MAX_BYTES: int = 0
+    
+    # Live state
+    LIVE_STATE_SYNC_INTERVAL: float = 1.0  # Seconds between cross-worker version checks of live state and thresholds (0 = never)
     
     # Mailtrap Settings
     MAIL_USERNAME: str
@@ -13,6 +110,17 @@ class Settings(BaseSettings):
     MAIL_TO: str = "admin@example.com"
     MAIL_SERVER: str = "sandbox.smtp.mailtrap.io"
     MAIL_PORT: int = 2525
+    MAIL_STARTTLS: bool = True  # False for servers without TLS, e.g. a local test SMTP server
+    MAIL_TIMEOUT: float = 10.0  # Seconds before an SMTP connect/command gives up
+    
+    # Alert outbox
+    ALERT_DEDUP_SECONDS: float = 900.0  # Repeats of an incident's alert within this window are not sent again
+    ALERT_MIN_INTERVAL: float = 60.0  # At most one email per interval; alerts queued in between go out as one digest
+    ALERT_MAX_ATTEMPTS: int = 8  # Failed sends before a message is marked failed
+    ALERT_RETRY_BASE_SECONDS: float = 5.0  # Retry delay, doubled after each failed attempt...
+    ALERT_RETRY_MAX_SECONDS: float = 600.0  # ...up to this
+    ALERT_SMTP_IDLE_SECONDS: float = 60.0  # Close the pooled SMTP connection after this long unused
+    ALERT_POLL_INTERVAL: float = 30.0  # Seconds between outbox checks when nothing wakes the worker
 
     class Config:
         env_file = ".env"
@@ -1,17 +1,94 @@
 from sqlmodel import SQLModel, create_engine, Session
-from typing import Generator
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import event, inspect
+from sqlalchemy.ext.asyncio import create_async_engine
+from typing import AsyncGenerator, Generator
 
+import fcntl
 import os
 
 sqlite_file_name = os.getenv("DB_PATH", "database.db")
 sqlite_url = f"sqlite:///{sqlite_file_name}"
+async_sqlite_url = f"sqlite+aiosqlite:///{sqlite_file_name}"
 
 connect_args = {"check_same_thread": False}
-engine = create_engine(sqlite_url, connect_args=connect_args)
+
+# Connection pool (SQLite connections are cheap, but reusing them keeps the pragmas and page cache warm)
+pool_size = int(os.getenv("DB_POOL_SIZE", "10"))
+max_overflow = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+pool_timeout = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+# Applied to every new connection
+SQLITE_PRAGMAS = {
+    # First: only takes effect before the database file is initialized, which switching
+    # to WAL does (retention converts databases created without it once, with a VACUUM)
+    "auto_vacuum": "INCREMENTAL",
+    "journal_mode": "WAL",          # Readers don't block the writer and vice versa
+    "synchronous": "NORMAL",        # Safe with WAL; fsync at checkpoints instead of every commit
+    "busy_timeout": int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000")),
+    "cache_size": -int(os.getenv("DB_CACHE_SIZE_KB", "65536")),   # Negative = KiB
+    "mmap_size": int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "temp_store": "MEMORY",
+}
+
+engine = create_engine(
+    sqlite_url,
+    connect_args=connect_args,
+    pool_size=pool_size,
+    max_overflow=max_overflow,
+    pool_timeout=pool_timeout
+)
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record=None):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+event.listen(engine, "connect", apply_sqlite_pragmas)
+
+# Async engine for async routes, so DB round-trips don't block the event loop
+async_engine = create_async_engine(
+    async_sqlite_url,
+    pool_size=pool_size,
+    max_overflow=max_overflow,
+    pool_timeout=pool_timeout
+)
+event.listen(async_engine.sync_engine, "connect", apply_sqlite_pragmas)
 
 def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+    # Serialized across processes: `uvicorn --workers N` starts N of these at once
+    with open(f"{sqlite_file_name}.init.lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        SQLModel.metadata.create_all(engine)
+        migrate()
+
+def migrate():
+    """
+    Bring existing tables up to date with the models.
+
+    create_all() never alters a table that already exists, so columns added to
+    a model later are appended here (they must be nullable), and indexes added
+    later are created.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(engine.dialect)
+                    conn.exec_driver_sql(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}')
+
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(conn)
 
 def get_session() -> Generator[Session, None, None]:
     with Session(engine) as session:
         yield session
+
+async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
@@ -1,24 +1,138 @@
 from ultralytics import YOLO
 from app.config import get_settings
+from app.backends import load_model, model_version
 from functools import lru_cache
-import os
+import logging
+
+logger = logging.getLogger(__name__)
 
 # Global variable to hold the model instance
 _model_instance = None
 
-def get_model():
+def get_model() -> YOLO:
     global _model_instance
     if _model_instance is None:
-        settings = get_settings()
-        # Check if custom model exists, otherwise use standard yolov8n as fallback/placeholder
+        # Loads the exported artifact for MODEL_BACKEND (torch, onnx or openvino).
         # In production, you'd likely want to fail if the specific model isn't found.
-        model_path = settings.MODEL_PATH
-        
-        if not os.path.exists(model_path):
-            print(f"Warning: Model not found at {model_path}. Using 'models/best.pt' for demonstration.")
-            model_path = "models/best.pt" # Auto-downloads
-            
-        print(f"Loading model from {model_path}...")
-        _model_instance = YOLO(model_path)
-        
+        _model_instance = load_model(get_settings())
+
     return _model_instance
+
+_renderer_instance = None
+
+def get_annotation_renderer():
+    """Return the shared AnnotationRenderer."""
+    global _renderer_instance
+    if _renderer_instance is None:
+        from app.annotations import AnnotationRenderer
+        _renderer_instance = AnnotationRenderer(get_settings())
+    return _renderer_instance
+
+_engine_instance = None
+
+def get_inference_engine():
+    """Return the shared micro-batching InferenceEngine, creating it on first use."""
+    global _engine_instance
+    if _engine_instance is None:
+        from app.inference import InferenceEngine
+        from app.cache import DetectionCache
+        settings = get_settings()
+        cache = None
+        if settings.DETECTION_CACHE_SIZE > 0:
+            cache = DetectionCache(
+                namespace=f"{model_version(settings)}:{settings.CONFIDENCE_THRESHOLD}",
+                max_entries=settings.DETECTION_CACHE_SIZE,
+                ttl_seconds=settings.DETECTION_CACHE_TTL_SECONDS,
+                max_distance=settings.DETECTION_CACHE_MAX_DISTANCE
+            )
+        pool = None
+        if settings.INFERENCE_WORKERS > 0:
+            from app.workers import InferencePool
+            try:
+                pool = InferencePool(settings.INFERENCE_WORKERS)
+            except Exception as e:
+                logger.error(f"Inference workers failed to start, running the model in-process: {e!r}")
+        # Each worker process loads its own model; with a pool the parent doesn't need one
+        model = None if pool is not None else get_model()
+        _engine_instance = InferenceEngine(model, settings, pool=pool, cache=cache, renderer=get_annotation_renderer())
+    return _engine_instance
+
+_sensor_buffer_instance = None
+
+def get_sensor_buffer():
+    """Return the shared SensorWriteBuffer."""
+    global _sensor_buffer_instance
+    if _sensor_buffer_instance is None:
+        from app.sensor_buffer import SensorWriteBuffer
+        _sensor_buffer_instance = SensorWriteBuffer(get_settings())
+    return _sensor_buffer_instance
+
+_history_instance = None
+
+def get_history_buffers():
+    """Return the shared in-memory HistoryBuffers."""
+    global _history_instance
+    if _history_instance is None:
+        from app.ring_buffer import HistoryBuffers
+        _history_instance = HistoryBuffers(get_settings())
+    return _history_instance
+
+_compactor_instance = None
+
+def get_rollup_compactor():
+    """Return the shared RollupCompactor."""
+    global _compactor_instance
+    if _compactor_instance is None:
+        from app.rollups import RollupCompactor
+        _compactor_instance = RollupCompactor(get_settings())
+    return _compactor_instance
+
+_retention_instance = None
+
+def get_retention_manager():
+    """Return the shared RetentionManager."""
+    global _retention_instance
+    if _retention_instance is None:
+        from app.retention import RetentionManager
+        _retention_instance = RetentionManager(get_settings())
+    return _retention_instance
+
+_outbox_instance = None
+
+def get_alert_outbox():
+    """Return the shared AlertOutbox."""
+    global _outbox_instance
+    if _outbox_instance is None:
+        from app.notifications import AlertOutbox
+        _outbox_instance = AlertOutbox(get_settings())
+    return _outbox_instance
+
+_bus_instance = None
+
+def get_bus():
+    """Return the shared pub/sub bus for BUS_BACKEND."""
+    global _bus_instance
+    if _bus_instance is None:
+        from app.pubsub import create_bus
+        _bus_instance = create_bus(get_settings())
+    return _bus_instance
+
+_incident_instance = None
+
+def get_incident_manager():
+    """Return the shared fire IncidentManager."""
+    global _incident_instance
+    if _incident_instance is None:
+        from app.incidents import IncidentManager
+        _incident_instance = IncidentManager(get_settings(), get_bus())
+    return _incident_instance
+
+_admission_instance = None
+
+def get_admission_controller():
+    """Return the AdmissionController guarding the sensor write buffer."""
+    global _admission_instance
+    if _admission_instance is None:
+        from app.admission import AdmissionController
+        _admission_instance = AdmissionController(get_settings(), get_sensor_buffer())
+    return _admission_instance
@@ -0,0 +1,47 @@
+"""
+Export (and optionally quantize) the YOLO weights for a CPU-optimized backend.
+
+Usage:
+    python -m app.export --backend onnx
+    python -m app.export --backend openvino --int8 --validate data/val
+
+Set MODEL_BACKEND (and MODEL_INT8) afterwards to serve the exported model.
+"""
+import argparse
+import sys
+from ultralytics import YOLO
+from app.backends import BACKENDS, compare_models, export_model
+from app.config import get_settings
+
+def main(argv=None) -> int:
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=[b for b in BACKENDS if b != "torch"], required=True)
+    parser.add_argument("--model", default=settings.MODEL_PATH, help="PyTorch weights to export")
+    parser.add_argument("--int8", action="store_true", help="Produce an INT8-quantized variant")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--data", default=None, help="Dataset yaml used for OpenVINO INT8 calibration")
+    parser.add_argument("--validate", metavar="DIR", default=None, help="Folder of images to compare against the fp32 model")
+    parser.add_argument("--min-recall", type=float, default=0.9, help="Fail if recall vs fp32 falls below this")
+    args = parser.parse_args(argv)
+
+    path = export_model(args.model, args.backend, int8=args.int8, imgsz=args.imgsz, data=args.data)
+    print(f"Exported {args.backend}{' INT8' if args.int8 else ''} model to {path}")
+
+    if args.validate:
+        report = compare_models(
+            YOLO(args.model),
+            YOLO(path, task="detect"),
+            args.validate,
+            conf=settings.CONFIDENCE_THRESHOLD
+        )
+        for key, value in report.items():
+            print(f"  {key}: {value:.4f}" if isinstance(value, float) else f"  {key}: {value}")
+        if report["recall"] < args.min_recall:
+            print(f"Accuracy check failed: recall {report['recall']:.3f} < {args.min_recall}")
+            return 1
+        print("Accuracy check passed.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, tuple_
+from sqlmodel import Session
+from app.database import engine as db_engine
+from datetime import datetime
+from typing import Iterator, List, Optional, Sequence, Tuple
+import base64
+import csv
+import io
+import json
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+def local_time(timestamp: Optional[datetime]) -> Optional[datetime]:
+    """Stored timestamps are naive local time; convert an aware one (e.g. a `...Z` query bound) to match."""
+    if timestamp is not None and timestamp.tzinfo is not None:
+        return timestamp.astimezone().replace(tzinfo=None)
+    return timestamp
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    """Opaque keyset cursor pointing just past (timestamp, id)."""
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{row_id}".encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        timestamp, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def keyset_page(
+    session: Session,
+    model,
+    limit: int,
+    cursor: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+) -> Tuple[List, Optional[str]]:
+    """
+    One page of `model` rows, newest first, ordered by (timestamp, id).
+
+    Returns:
+        The rows and the cursor of the next page (None on the last page).
+    """
+    query = select(model)
+    if cursor:
+        query = query.where(tuple_(model.timestamp, model.id) < tuple_(*decode_cursor(cursor)))
+    if start is not None:
+        query = query.where(model.timestamp >= start)
+    if end is not None:
+        query = query.where(model.timestamp <= end)
+    rows = session.execute(query.order_by(model.timestamp.desc(), model.id.desc()).limit(limit)).scalars().all()
+    next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].id) if rows and len(rows) == limit else None
+    return rows, next_cursor
+
+def iter_batches(
+    model,
+    columns: Sequence[str],
+    start: Optional[datetime],
+    end: Optional[datetime],
+    batch_size: int
+) -> Iterator[List[tuple]]:
+    """
+    Yield plain row tuples of `columns`, oldest first, `batch_size` at a time.
+
+    Each batch is its own keyset query, so memory stays constant however long
+    the range is and no read transaction is held between batches.
+    """
+    selected = [getattr(model, name) for name in columns]
+    after = None
+    while True:
+        query = select(*selected, model.timestamp, model.id)
+        if after is not None:
+            query = query.where(tuple_(model.timestamp, model.id) > tuple_(*after))
+        if start is not None:
+            query = query.where(model.timestamp >= start)
+        if end is not None:
+            query = query.where(model.timestamp <= end)
+        with Session(db_engine) as session:
+            rows = session.execute(query.order_by(model.timestamp, model.id).limit(batch_size)).all()
+        if not rows:
+            return
+        after = (rows[-1][-2], rows[-1][-1])
+        yield [tuple(row[:len(columns)]) for row in rows]
+        if len(rows) < batch_size:
+            return
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands out what was written since the last drain()."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+def _jsonable(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def ndjson_chunks(columns, batches):
+    for batch in batches:
+        yield "".join(
+            json.dumps({name: _jsonable(value) for name, value in zip(columns, row)}) + "\n"
+            for row in batch
+        )
+
+def _csv(columns, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for batch in batches:
+        writer.writerows(
+            [json.dumps(value) if isinstance(value, (list, dict)) else _jsonable(value) for value in row]
+            for row in batch
+        )
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def _arrow_schema(model, columns):
+    import pyarrow as pa
+
+    types = {int: pa.int64(), float: pa.float64(), bool: pa.bool_(), datetime: pa.timestamp("us")}
+    fields = []
+    for name in columns:
+        try:
+            python_type = model.__table__.columns[name].type.python_type
+        except NotImplementedError:
+            python_type = None
+        fields.append(pa.field(name, types.get(python_type, pa.string())))
+    return pa.schema(fields)
+
+def arrow_chunks(model, columns, batches, parquet: bool, compression: Optional[str] = None):
+    """Encode row batches as an Arrow IPC stream or a Parquet file, yielding bytes as they are produced."""
+    import pyarrow as pa
+
+    schema = _arrow_schema(model, columns)
+    sink = _ChunkSink()
+    if parquet:
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(sink, schema, compression=compression or "snappy")
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+    for batch in batches:
+        data = {
+            name: [json.dumps(value) if isinstance(value, (list, dict)) else value for value in values]
+            for name, values in zip(columns, zip(*batch))
+        }
+        writer.write_table(pa.Table.from_pydict(data, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+def export_response(
+    name: str,
+    model,
+    columns: Sequence[str],
+    export_format: str,
+    start: Optional[datetime],
+    end: Optional[datetime],
+    batch_size: int
+) -> StreamingResponse:
+    """Stream a table range as NDJSON, CSV, Arrow IPC or Parquet, one batch at a time."""
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    if export_format in ("arrow", "parquet"):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=400, detail=f"{export_format} export requires pyarrow")
+
+    batches = iter_batches(model, columns, local_time(start), local_time(end), batch_size)
+    if export_format == "ndjson":
+        body = ndjson_chunks(columns, batches)
+    elif export_format == "csv":
+        body = _csv(columns, batches)
+    else:
+        body = arrow_chunks(model, columns, batches, parquet=export_format == "parquet")
+
+    media_type, extension = EXPORT_FORMATS[export_format]
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{name}.{extension}"'}
+    )
@@ -0,0 +1,289 @@
+from sqlalchemy import select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session
+from app.config import Settings
+from app.database import engine as db_engine
+from app.models import IncidentState, SystemLog
+from app.schemas import SensorData, SystemStatus
+from datetime import datetime
+from typing import Callable, Optional, Tuple
+import asyncio
+import json
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
+INCIDENT_KEY = "incident"
+PEAK_KEY = "incident_peak"
+INCIDENT_STATES = ("normal", "alarm", "acknowledged", "clearing")
+
+NORMAL = {"state": "normal"}
+
+# What a transition step returns: the incident to store, the transition name and,
+# when it differs from the stored incident, what dashboards are told
+Step = Callable[[dict], Optional[Tuple[dict, str, Optional[dict]]]]
+
+class IncidentManager:
+    """
+    The fire incident state machine, shared by every worker.
+
+    - normal -> alarm: a reading over the thresholds or a visually confirmed
+      fire opens an incident.
+    - alarm -> acknowledged: an operator acknowledged it.
+    - alarm/acknowledged -> clearing: a reading at or below the clear level
+      (the thresholds less INCIDENT_CLEAR_MARGIN). Any reading above that
+      level returns to the previous state, so values hovering around a
+      threshold don't make the incident flap.
+    - clearing -> normal: INCIDENT_CLEAR_SECONDS below the clear level. An
+      incident confirmed visually must have been acknowledged first.
+    - any -> normal: an operator cleared it.
+
+    The incident is stored in the IncidentState row and every transition is
+    a compare-and-set on its version: it only applies if no other worker
+    moved the incident since this one last saw it. A worker that loses the
+    race adopts the stored incident and re-evaluates, so two workers seeing
+    the same risky reading open one incident between them. Committed
+    incidents are published on the bus, where readings are checked against
+    them without a query; the peak readings, which change far more often
+    than the state, go on the bus alone.
+
+    Sensor readings keep being processed in every state. Transitions are
+    logged as SystemLog rows and broadcast to dashboards as `incident_update`.
+    """
+
+    def __init__(self, settings: Settings, bus):
+        self.bus = bus
+        self.clear_margin = settings.INCIDENT_CLEAR_MARGIN
+        self.clear_seconds = settings.INCIDENT_CLEAR_SECONDS
+        self.transitions = 0
+        self.conflicts = 0
+
+    @property
+    def current(self) -> dict:
+        incident = self.bus.get(INCIDENT_KEY) or NORMAL
+        peak = self.bus.get(PEAK_KEY)
+        if peak and incident.get("id") is not None and peak["id"] == incident["id"]:
+            incident = {
+                **incident,
+                "peak": {field: max(incident["peak"][field], peak[field]) for field in ("temperature", "smoke_level")}
+            }
+        return incident
+
+    @property
+    def active(self) -> bool:
+        return self.current["state"] != "normal"
+
+    def load(self):
+        """Publish the stored incident on the bus (one left open before a restart stays open)."""
+        with Session(db_engine) as session:
+            self._ensure_row(session)
+            stored = self._stored(session)
+            session.commit()
+        self.bus.set(INCIDENT_KEY, stored)
+
+    async def observe(self, data: SensorData, risk: bool) -> Optional[str]:
+        """
+        Advance the state machine with one reading.
+
+        Returns:
+            The transition taken ("opened", "clearing", "resumed" or "cleared"), if any.
+        """
+        self._raise_peak(self.current, data)
+
+        def step(incident: dict):
+            if incident["state"] == "normal":
+                return (self._new("sensor_risk", data), "opened", None) if risk else None
+            now = datetime.now()
+            if self._below_clear_level(data):
+                if incident["state"] != "clearing":
+                    return {**incident, "state": "clearing", "previous": incident["state"], "clear_since": now.isoformat()}, "clearing", None
+                if self._may_close(incident, now):
+                    return self._closing(incident, "cleared")
+            elif incident["state"] == "clearing":
+                return {**incident, "state": incident["previous"], "previous": None, "clear_since": None}, "resumed", None
+            return None
+
+        return await self._apply(step)
+
+    async def confirm(self, image_url: Optional[str] = None) -> bool:
+        """Record a visual fire confirmation; returns True if it opened a new incident."""
+        def step(incident: dict):
+            if incident["state"] == "normal":
+                return self._new("fire_confirmed", None, confirmed=True, image_url=image_url), "opened", None
+            if not incident.get("confirmed") or incident["state"] == "clearing":
+                state = incident["previous"] if incident["state"] == "clearing" else incident["state"]
+                return {
+                    **incident, "state": state, "previous": None, "clear_since": None,
+                    "confirmed": True, "image_url": image_url or incident.get("image_url")
+                }, "confirmed", None
+            return None
+
+        return await self._apply(step) == "opened"
+
+    async def acknowledge(self, by: Optional[str] = None, note: Optional[str] = None) -> dict:
+        def step(incident: dict):
+            if incident["state"] == "normal" or incident.get("acknowledged_at"):
+                return None
+            incident = {**incident, "acknowledged_at": datetime.now().isoformat(), "acknowledged_by": by, "note": note}
+            if incident["state"] == "clearing":
+                incident["previous"] = "acknowledged"
+            else:
+                incident["state"] = "acknowledged"
+            return incident, "acknowledged", None
+
+        await self._apply(step)
+        return self.current
+
+    async def clear(self, by: Optional[str] = None, note: Optional[str] = None) -> dict:
+        def step(incident: dict):
+            if incident["state"] == "normal":
+                return None
+            return self._closing({**incident, "cleared_by": by, "note": note or incident.get("note")}, "cleared manually")
+
+        await self._apply(step)
+        return self.current
+
+    async def _apply(self, step: Step) -> Optional[str]:
+        """Run a transition step on the shared incident and commit its result, re-running it if another worker won."""
+        while True:
+            incident = self.current
+            outcome = step(incident)
+            if outcome is None:
+                return None
+            updated, transition, announced = outcome
+            committed = await self._commit(incident, updated)
+            if committed is None:
+                continue
+            announced = announced or committed
+            self._changed(announced, transition)
+            if transition == "opened":
+                logger.warning(f"Fire incident {committed['id']} opened ({committed['trigger']})")
+            elif announced["state"] == "normal":
+                logger.info(f"Fire incident {announced['id']} {transition}")
+            return transition
+
+    async def _commit(self, expected: dict, incident: dict) -> Optional[dict]:
+        """
+        Store `incident` if the stored one is still at the version of `expected`.
+
+        Returns:
+            The incident with its new version, or None when another worker got
+            there first (its incident is published on the bus instead).
+        """
+        version = expected.get("version", 0)
+        stored = {key: value for key, value in incident.items() if key != "version"}
+        # In a thread: waiting on the SQLite write lock must not stall the event loop holding it
+        winner = await asyncio.to_thread(self._compare_and_set, version, stored)
+        if winner is not None:
+            self.conflicts += 1
+            self.bus.set(INCIDENT_KEY, winner)
+            return None
+        committed = {**stored, "version": version + 1}
+        self.bus.set(INCIDENT_KEY, committed)
+        return committed
+
+    def _compare_and_set(self, version: int, incident: dict) -> Optional[dict]:
+        """Conditional UPDATE of the incident row; returns the stored incident if its version moved on."""
+        with Session(db_engine) as session:
+            self._ensure_row(session)
+            result = session.execute(
+                update(IncidentState)
+                .where(IncidentState.key == INCIDENT_KEY, IncidentState.version == version)
+                .values(version=version + 1, incident=incident)
+            )
+            winner = None if result.rowcount == 1 else self._stored(session)
+            session.commit()
+        return winner
+
+    @staticmethod
+    def _ensure_row(session: Session):
+        # Safe when several workers start together
+        session.execute(
+            sqlite_insert(IncidentState).values(key=INCIDENT_KEY, version=0, incident=NORMAL).on_conflict_do_nothing()
+        )
+
+    @staticmethod
+    def _stored(session: Session) -> dict:
+        row = session.execute(
+            select(IncidentState.version, IncidentState.incident).where(IncidentState.key == INCIDENT_KEY)
+        ).one()
+        return {**row.incident, "version": row.version}
+
+    def _raise_peak(self, incident: dict, data: SensorData):
+        if incident["state"] == "normal":
+            return
+        peak = incident["peak"]
+        if data.temperature > peak["temperature"] or data.smoke_level > peak["smoke_level"]:
+            self.bus.set(PEAK_KEY, {
+                "id": incident["id"],
+                "temperature": max(peak["temperature"], data.temperature),
+                "smoke_level": max(peak["smoke_level"], data.smoke_level),
+            })
+
+    def _below_clear_level(self, data: SensorData) -> bool:
+        from app.thresholds import thresholds_cache
+        thresholds = thresholds_cache.current
+        factor = 1.0 - self.clear_margin
+        return data.temperature <= thresholds.temperature_max * factor and data.smoke_level <= thresholds.gas_max * factor
+
+    def _may_close(self, incident: dict, now: datetime) -> bool:
+        if incident.get("confirmed") and not incident.get("acknowledged_at"):
+            return False
+        return (now - datetime.fromisoformat(incident["clear_since"])).total_seconds() >= self.clear_seconds
+
+    @staticmethod
+    def _new(trigger: str, data: Optional[SensorData], **extra) -> dict:
+        return {
+            "id": uuid.uuid4().hex[:12],
+            "state": "alarm",
+            "trigger": trigger,
+            "opened_at": datetime.now().isoformat(),
+            "confirmed": False,
+            "acknowledged_at": None,
+            "acknowledged_by": None,
+            "previous": None,
+            "clear_since": None,
+            "peak": {
+                "temperature": data.temperature if data else 0.0,
+                "smoke_level": data.smoke_level if data else 0.0,
+            },
+            **extra
+        }
+
+    @staticmethod
+    def _closing(incident: dict, reason: str) -> Tuple[dict, str, dict]:
+        return NORMAL, reason, {**incident, "state": "normal", "closed_at": datetime.now().isoformat()}
+
+    def _changed(self, incident: dict, transition: str):
+        from app.websockets import manager
+        self.transitions += 1
+        manager.notify_threadsafe("dashboard", {
+            "type": "incident_update",
+            "transition": transition,
+            "incident": incident,
+            "timestamp": datetime.now().isoformat()
+        })
+
+        if incident["state"] == "normal":
+            status = SystemStatus.NORMAL
+        elif incident.get("confirmed"):
+            status = SystemStatus.CONFIRMADO
+        else:
+            status = SystemStatus.RIESGO
+        details = json.dumps({"transition": transition, **incident})
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write_log(status, details)
+        else:
+            loop.run_in_executor(None, self._write_log, status, details)
+
+    @staticmethod
+    def _write_log(status: SystemStatus, details: str):
+        try:
+            with Session(db_engine) as session:
+                session.add(SystemLog(status=status, details=details))
+                session.commit()
+        except Exception as e:
+            logger.error(f"Failed to log incident transition: {e}")
@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from app.cache import DetectionCache, Fingerprint
+from app.config import Settings
+from app.ingest import Frame, frame_from_bgr
+from app.schemas import DetectionResult
+from app.services import FireDetectionService
+from app.tiling import merge_boxes, offset_boxes, tile_grid
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class InferenceRequest:
+    frame: Frame
+    filename: str
+    fingerprint: Optional[Fingerprint] = None
+    source: Optional[bytes] = None
+    annotate: bool = True
+    future: Future = field(default_factory=Future)
+
+class InferenceEngine:
+    """
+    Owns the YOLO model and runs it on a dedicated worker thread.
+
+    Requests submitted concurrently are collected into batches of up to
+    INFERENCE_MAX_BATCH_SIZE images, waiting at most INFERENCE_MAX_WAIT_MS for
+    the batch to fill, so a burst of uploads becomes a single forward pass while
+    the event loop keeps serving other traffic.
+
+    When a process pool is given (INFERENCE_WORKERS > 0) the batch is fanned
+    out to the pool instead of the in-process model.
+
+    An optional DetectionCache short-circuits duplicate frames before they
+    reach the queue.
+    """
+
+    def __init__(self, model, settings: Settings, pool=None, cache: Optional[DetectionCache] = None, renderer=None):
+        self.model = model
+        self.pool = pool
+        self.cache = cache
+        self.settings = settings
+        self.max_batch_size = max(1, settings.INFERENCE_MAX_BATCH_SIZE)
+        self.max_wait = max(0.0, settings.INFERENCE_MAX_WAIT_MS) / 1000.0
+        self._service = FireDetectionService(model, settings, renderer=renderer)
+        self._queue: "queue.Queue[Optional[InferenceRequest]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="inference-engine", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+        if self.pool is not None:
+            self.pool.shutdown()
+
+    def prepare(self, image_bytes: bytes, full_resolution: bool = False) -> Tuple[Frame, Optional[Fingerprint]]:
+        """Decode an upload and fingerprint it for the cache. Blocking; run it in a thread."""
+        frame = self._service.decode(image_bytes, full_resolution)
+        fingerprint = self.cache.fingerprint(image_bytes, frame.image, frame.width, frame.height) if self.cache else None
+        return frame, fingerprint
+
+    async def submit(
+        self,
+        frame: Frame,
+        filename: str,
+        fingerprint: Optional[Fingerprint] = None,
+        source: Optional[bytes] = None,
+        annotate: bool = True,
+        near_match: bool = True
+    ) -> DetectionResult:
+        """
+        Queue a frame for inference and wait for its own DetectionResult.
+
+        `source` is the raw upload, kept for lazily rendered annotations;
+        annotate=False skips the annotated image altogether. near_match=False
+        only reuses cached results of byte-identical frames.
+        """
+        if self.cache and fingerprint:
+            cached = self.cache.get(fingerprint, filename, near=near_match)
+            if cached is not None:
+                return cached
+
+        if self._thread is None:
+            self.start()
+        request = InferenceRequest(frame=frame, filename=filename, fingerprint=fingerprint, source=source, annotate=annotate)
+        self._queue.put(request)
+        return await asyncio.wrap_future(request.future)
+
+    async def submit_tiled(self, frame: Frame, filename: str, source: Optional[bytes] = None) -> DetectionResult:
+        """
+        Detect on overlapping TILE_SIZE tiles of a full-resolution frame.
+
+        Small, distant objects that vanish when a large image is letterboxed down
+        to the model input stay visible at tile scale. The tiles plus a downscaled
+        overview of the whole image are submitted together (so they run as one
+        batch, spread over the worker pool if there is one), then the boxes are
+        mapped back to image coordinates and merged with class-wise NMS.
+        """
+        overview, tiles = await asyncio.to_thread(self._make_tiles, frame)
+        if not tiles:
+            return await self.submit(overview, filename, source=source)
+
+        results = await asyncio.gather(
+            self.submit(overview, filename, annotate=False),
+            *(self.submit(tile, f"{filename}#{x},{y}", annotate=False) for tile, (x, y) in tiles)
+        )
+        detections = list(results[0].detections)
+        for (_, (x, y)), result in zip(tiles, results[1:]):
+            detections.extend(offset_boxes(result.detections, x, y))
+        merged = merge_boxes(detections, self.settings.TILE_NMS_IOU)
+
+        return await asyncio.to_thread(self._service.build_result, overview, merged, filename, source)
+
+    def _make_tiles(self, frame: Frame) -> Tuple[Frame, List[Tuple[Frame, Tuple[int, int]]]]:
+        overview = frame_from_bgr(frame.array, self.settings.INGEST_TARGET_SIZE)
+        if max(frame.width, frame.height) < self.settings.TILE_MIN_SIDE:
+            return overview, []
+
+        tiles = []
+        for x1, y1, x2, y2 in tile_grid(frame.width, frame.height, self.settings.TILE_SIZE, self.settings.TILE_OVERLAP):
+            crop = np.ascontiguousarray(frame.array[y1:y2, x1:x2])
+            tiles.append((Frame(image=None, array=crop, width=x2 - x1, height=y2 - y1), (x1, y1)))
+        return overview, tiles
+
+    def _collect(self, first: InferenceRequest) -> List[InferenceRequest]:
+        """Gather more queued requests until the batch is full or the wait expires."""
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Put the sentinel back so the main loop exits after this batch
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = self._collect(first)
+            batch = [r for r in batch if r.future.set_running_or_notify_cancel()]
+            if batch:
+                self._process(batch)
+
+    def _process(self, batch: List[InferenceRequest]):
+        if self.pool is not None:
+            self._process_pool(batch)
+            return
+
+        try:
+            results = self.model.predict(
+                [r.frame.array for r in batch],
+                conf=self.settings.CONFIDENCE_THRESHOLD,
+                verbose=False
+            )
+        except Exception as e:
+            logger.error(f"Batch inference failed: {e}")
+            for request in batch:
+                request.future.set_exception(e)
+            return
+
+        for request, result in zip(batch, results):
+            try:
+                detections = request.frame.to_original(self._service.extract_boxes(result))
+                self._resolve(request, self._service.build_result(
+                    request.frame, detections, request.filename, request.source, request.annotate
+                ))
+            except Exception as e:
+                request.future.set_exception(e)
+
+    def _process_pool(self, batch: List[InferenceRequest]):
+        try:
+            outputs = self.pool.predict([r.frame.array for r in batch], self.settings.CONFIDENCE_THRESHOLD)
+        except Exception as e:
+            logger.error(f"Pool inference failed: {e}")
+            for request in batch:
+                request.future.set_exception(e)
+            return
+
+        for request, boxes in zip(batch, outputs):
+            try:
+                detections = request.frame.to_original(self._service.boxes_from_array(boxes, self.pool.names))
+                self._resolve(request, self._service.build_result(
+                    request.frame, detections, request.filename, request.source, request.annotate
+                ))
+            except Exception as e:
+                request.future.set_exception(e)
+
+    def _resolve(self, request: InferenceRequest, result: DetectionResult):
+        if self.cache and request.fingerprint:
+            self.cache.put(request.fingerprint, result)
+        request.future.set_result(result)
@@ -0,0 +1,193 @@
+from PIL import Image
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+from python_multipart.exceptions import FormParserError
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+from app.config import get_settings
+from app.schemas import Box
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import io
+
+import numpy as np
+
+CHUNK_SIZE = 1024 * 1024
+EXIF_ORIENTATION = 0x0112
+
+# EXIF orientation -> transpose that brings the image upright
+ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+# Upload routes whose request bodies are capped while they stream in -> (setting holding
+# the cap, whether it applies to each file of a multi-file upload rather than the whole body)
+UPLOAD_LIMITS = {
+    "/predict": ("INGEST_MAX_UPLOAD_BYTES", False),
+    "/predict/batch": ("INGEST_MAX_UPLOAD_BYTES", True),
+    "/predict/video": ("VIDEO_MAX_UPLOAD_BYTES", False),
+}
+
+@dataclass
+class Frame:
+    image: Optional[Image.Image]  # Decoded, upright RGB image (possibly reduced); None for inference-only tiles
+    array: np.ndarray   # Same pixels as a contiguous uint8 BGR array, the layout the model expects
+    width: int          # Upright size of the original upload
+    height: int
+
+    @property
+    def scale(self) -> float:
+        """Factor from decoded pixels back to original pixels."""
+        return self.width / self.array.shape[1]
+
+    def to_original(self, detections: List[Box]) -> List[Box]:
+        """Map boxes found on the decoded frame back into original image coordinates."""
+        scale = self.scale
+        if scale == 1:
+            return detections
+        return [
+            d.model_copy(update={"x1": d.x1 * scale, "y1": d.y1 * scale, "x2": d.x2 * scale, "y2": d.y2 * scale})
+            for d in detections
+        ]
+
+class PartSizes:
+    """Follows a multipart body as it streams in and tracks the largest part seen so far."""
+
+    def __init__(self, boundary: bytes):
+        self.current = 0
+        self.largest = 0
+        self.parser = MultipartParser(boundary, {"on_part_begin": self._begin, "on_part_data": self._data})
+
+    def _begin(self):
+        self.current = 0
+
+    def _data(self, data: bytes, start: int, end: int):
+        self.current += end - start
+        self.largest = max(self.largest, self.current)
+
+    def feed(self, chunk: bytes) -> int:
+        """Parse the next chunk; returns the size of the largest part so far."""
+        if self.parser is not None:
+            try:
+                self.parser.write(chunk)
+            except FormParserError:
+                self.parser = None  # Malformed; the form parser reports it
+        return self.largest
+
+    @classmethod
+    def for_request(cls, headers: Headers) -> Optional["PartSizes"]:
+        content_type, options = parse_options_header(headers.get("content-type", ""))
+        if content_type != b"multipart/form-data" or not options.get(b"boundary"):
+            return None
+        return cls(options[b"boundary"])
+
+class UploadLimitMiddleware:
+    """
+    Cap upload request bodies while they stream in.
+
+    Starlette spools a whole multipart body before the endpoint runs, so a
+    limit checked in the endpoint only fires once everything was received.
+    On the routes in UPLOAD_LIMITS a declared Content-Length over the cap is
+    refused before reading anything, and body bytes are counted as they
+    arrive: a body without a Content-Length, or larger than it claimed,
+    fails with 413 as soon as it grows past the cap. On multi-file routes
+    the body is parsed along the way and the cap applies to each file, so
+    a burst of N images may total N times the cap.
+    """
+
+    def __init__(self, app: ASGIApp, limits: Dict[str, Tuple[str, bool]] = UPLOAD_LIMITS):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        max_bytes = getattr(get_settings(), limit[0]) if limit else 0
+        if not max_bytes:
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        parts = PartSizes.for_request(headers) if limit[1] else None
+        length = headers.get("content-length")
+        if parts is None and length and length.isdigit() and int(length) > max_bytes:
+            response = JSONResponse({"detail": f"Upload exceeds {max_bytes} bytes"}, status_code=413)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def counted_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                body = message.get("body", b"")
+                if parts is not None:
+                    if parts.feed(body) > max_bytes:
+                        raise HTTPException(status_code=413, detail=f"A file in the upload exceeds {max_bytes} bytes")
+                else:
+                    received += len(body)
+                    if received > max_bytes:
+                        raise HTTPException(status_code=413, detail=f"Upload exceeds {max_bytes} bytes")
+            return message
+
+        await self.app(scope, counted_receive, send)
+
+async def read_upload(file: UploadFile, max_bytes: int) -> bytes:
+    """Read an upload in chunks, rejecting it as soon as it grows past max_bytes."""
+    buffer = bytearray()
+    while True:
+        chunk = await file.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        buffer.extend(chunk)
+        if max_bytes and len(buffer) > max_bytes:
+            raise HTTPException(status_code=413, detail=f"{file.filename} exceeds {max_bytes} bytes")
+    return bytes(buffer)
+
+def frame_from_bgr(array: np.ndarray, target_size: Optional[int] = None) -> Frame:
+    """Wrap an already decoded BGR frame (e.g. from a video), shrinking it like decode_frame."""
+    height, width = array.shape[:2]
+    image = Image.fromarray(np.ascontiguousarray(array[..., ::-1]))
+    if target_size and max(width, height) > target_size:
+        image.thumbnail((target_size, target_size), Image.BILINEAR)
+        array = np.ascontiguousarray(np.asarray(image)[..., ::-1])
+    return Frame(image=image, array=np.ascontiguousarray(array), width=width, height=height)
+
+def decode_frame(data: bytes, target_size: Optional[int] = None) -> Frame:
+    """
+    Decode an upload into a Frame sized close to the model input.
+
+    JPEGs are decoded at a reduced DCT scale with draft() so a 12MP still never
+    gets fully decoded, then any image is shrunk so its long side is at most
+    target_size. The EXIF orientation is read once and applied to the small
+    image. target_size of 0/None keeps full resolution.
+    """
+    image = Image.open(io.BytesIO(data))
+    orientation = image.getexif().get(EXIF_ORIENTATION, 1)
+    width, height = image.size
+
+    if target_size and max(width, height) > target_size:
+        ratio = target_size / max(width, height)
+        requested = (max(1, round(width * ratio)), max(1, round(height * ratio)))
+        if image.format == "JPEG":
+            image.draft("RGB", requested)
+        image = image.convert("RGB")
+        image.thumbnail(requested, Image.BILINEAR)
+    else:
+        image = image.convert("RGB")
+
+    transpose = ORIENTATION_TRANSPOSE.get(orientation)
+    if transpose is not None:
+        image = image.transpose(transpose)
+        if orientation >= 5:
+            width, height = height, width
+
+    array = np.ascontiguousarray(np.asarray(image)[..., ::-1])
+    return Frame(image=image, array=array, width=width, height=height)
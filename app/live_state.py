@@ -0,0 +1,186 @@
+from sqlalchemy import update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.database import engine as db_engine
+from app.models import DetectionEvent, SensorReading, StateVersion
+from app.schemas import DashboardResponse, SensorData, SystemStatus, Thresholds
+from datetime import datetime
+from typing import Optional
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+LIVE_STATE_KEY = "live"
+
+def bump_version(session: Session, key: str = LIVE_STATE_KEY) -> int:
+    """Increment a state version inside the caller's transaction and return the new value."""
+    statement = update(StateVersion).where(StateVersion.key == key).values(version=StateVersion.version + 1).returning(StateVersion.version)
+    return session.execute(statement).scalar_one_or_none() or 0
+
+async def bump_version_async(session: AsyncSession, key: str = LIVE_STATE_KEY) -> int:
+    """bump_version on an AsyncSession."""
+    statement = update(StateVersion).where(StateVersion.key == key).values(version=StateVersion.version + 1).returning(StateVersion.version)
+    return (await session.execute(statement)).scalar_one_or_none() or 0
+
+def ensure_version(session: Session, key: str = LIVE_STATE_KEY):
+    """Create a version counter at 0 unless it exists (safe when several workers start together)."""
+    session.execute(sqlite_insert(StateVersion).values(key=key, version=0).on_conflict_do_nothing())
+    session.commit()
+
+def read_version(session: Session, key: str = LIVE_STATE_KEY) -> int:
+    row = session.get(StateVersion, key)
+    return row.version if row else 0
+
+class LiveState:
+    """
+    What the read endpoints show: latest reading and latest detection
+    (thresholds live in app.thresholds.thresholds_cache).
+
+    Seeded from the DB at startup and updated by the code paths that write
+    readings and detections, so /dashboard, /status, /sensors, /thresholds
+    and /media/latest never query the DB.
+
+    Every write also bumps a version counter in the DB (StateVersion "live")
+    in the same transaction. Each worker polls that single row every
+    LIVE_STATE_SYNC_INTERVAL seconds and reloads when another worker has
+    written since (also invalidating the history buffers), so state goes
+    stale for at most one interval.
+    """
+
+    def __init__(self):
+        self.sensors = SensorData(temperature=0, humidity=0, smoke_level=0)
+        self.sensors_at: Optional[datetime] = None
+        self.last_photo_url: Optional[str] = None
+        self.last_detection_has_fire = False
+        self.last_detection_at: Optional[datetime] = None
+        self.version = 0
+        self.reloads = 0
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def thresholds(self) -> Thresholds:
+        from app.thresholds import thresholds_cache
+        return thresholds_cache.current
+
+    def status(self) -> SystemStatus:
+        """Overall system status from the latest sensors and detection."""
+        from app.thresholds import thresholds_cache
+        status = SystemStatus.NORMAL
+        if thresholds_cache.check([self.sensors])[0]:
+            status = SystemStatus.RIESGO
+
+        if self.last_detection_has_fire:
+            status = SystemStatus.CONFIRMADO
+
+        return status
+
+    def dashboard(self) -> DashboardResponse:
+        return DashboardResponse(
+            status=self.status(),
+            sensors=self.sensors,
+            thresholds=self.thresholds,
+            last_photo_url=self.last_photo_url,
+            last_audio_url=None
+        )
+
+    def etag(self) -> str:
+        """
+        Validator for dashboard(): the live and thresholds versions, plus the
+        time of the latest reading, which shows before its version bump.
+        """
+        from app.thresholds import thresholds_cache
+        with self._lock:
+            received = self.sensors_at.timestamp() if self.sensors_at else 0
+            return f'"{self.version}-{thresholds_cache.version}-{received:.6f}"'
+
+    def update_reading(self, data: SensorData, received_at: datetime):
+        """Show a reading as soon as it is accepted; its version bump comes with the flush."""
+        with self._lock:
+            if self.sensors_at is None or received_at >= self.sensors_at:
+                self.sensors = data.model_copy(update={"timestamp": str(received_at)})
+                self.sensors_at = received_at
+
+    def record_detection(self, event: dict, version: int):
+        """Show a committed DetectionEvent (as a dict)."""
+        with self._lock:
+            if self.last_detection_at is None or event["timestamp"] >= self.last_detection_at:
+                self.last_photo_url = event["annotated_image_url"] or None
+                self.last_detection_has_fire = event["has_fire"]
+                self.last_detection_at = event["timestamp"]
+            self._observe(version)
+
+    def observe(self, version: int):
+        """Record a version produced by a local write (e.g. a sensor buffer flush)."""
+        with self._lock:
+            self._observe(version)
+
+    def _observe(self, version: int):
+        # A gap means another worker wrote in between: reload on the next sync
+        if version != self.version + 1:
+            self._dirty = True
+        self.version = max(self.version, version)
+
+    def load(self):
+        """(Re)load the whole state from the DB."""
+        with Session(db_engine) as session:
+            ensure_version(session)
+            version = read_version(session)
+            reading = session.exec(select(SensorReading).order_by(SensorReading.timestamp.desc())).first()
+            detection = session.exec(select(DetectionEvent).order_by(DetectionEvent.timestamp.desc())).first()
+
+        # Timestamps guard against a load overwriting newer local writes
+        with self._lock:
+            if reading and (self.sensors_at is None or reading.timestamp >= self.sensors_at):
+                self.sensors_at = reading.timestamp
+                self.sensors = SensorData(
+                    temperature=reading.temperature,
+                    humidity=reading.humidity,
+                    smoke_level=reading.smoke_level,
+                    timestamp=str(reading.timestamp)
+                )
+            if detection and (self.last_detection_at is None or detection.timestamp >= self.last_detection_at):
+                self.last_photo_url = detection.annotated_image_url or None
+                self.last_detection_has_fire = detection.has_fire
+                self.last_detection_at = detection.timestamp
+            self.version = version
+            self._dirty = False
+            self.reloads += 1
+
+    def start(self, interval: float):
+        if interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._sync(interval))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _stale(self) -> bool:
+        with Session(db_engine) as session:
+            return self._dirty or read_version(session) > self.version
+
+    async def _sync(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if await asyncio.to_thread(self._stale):
+                    await asyncio.to_thread(self.load)
+                    # Other workers wrote rows this worker's history buffers never saw
+                    from app.dependencies import get_history_buffers
+                    get_history_buffers().invalidate()
+            except Exception as e:
+                logger.error(f"Live state sync failed: {e}")
+
+    def stats(self) -> dict:
+        return {"version": self.version, "reloads": self.reloads, "stale": self._dirty}
+
+live_state = LiveState()
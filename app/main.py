@@ -1,9 +1,17 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-from app.api.routers import sensors, dashboard, media, predict, websockets
-from app.dependencies import get_model
+from app.api.routers import sensors, dashboard, media, predict, websockets, incidents, alerts, retention
+from app.dependencies import (
+    get_alert_outbox, get_bus, get_incident_manager, get_inference_engine, get_annotation_renderer,
+    get_history_buffers, get_retention_manager, get_rollup_compactor, get_sensor_buffer
+)
 from app.database import create_db_and_tables
+from app.ingest import UploadLimitMiddleware
+from app.config import get_settings
+from app.live_state import live_state
+from app.thresholds import thresholds_cache
+from app.websockets import manager
 import os
 from fastapi.staticfiles import StaticFiles
 
@@ -11,15 +19,51 @@ from fastapi.staticfiles import StaticFiles
 async def lifespan(app: FastAPI):
     """
     Lifecycle manager for the FastAPI app.
-    - Loads the YOLO model.
+    - Joins the pub/sub bus carrying broadcasts and the fire state across workers, and publishes the stored incident.
+    - Loads the YOLO model and starts the inference engine.
     - Creates database tables.
     - Ensures necessary static directories exist.
+    - Starts the sensor write buffer and flushes it on shutdown.
+    - Seeds the live state, thresholds cache and history buffers served by the read endpoints.
+    - Backfills sensor rollups and starts their compaction job.
+    - Starts the scheduled retention job.
+    - Starts the alert outbox worker, which delivers alert emails queued before or during this run.
     """
-    get_model()
     create_db_and_tables()
+    settings = get_settings()
+    bus = get_bus()
+    manager.attach(bus)
+    await bus.start()
+    get_incident_manager().load()
+    thresholds_cache.load()
+    thresholds_cache.start(settings.LIVE_STATE_SYNC_INTERVAL)
+    live_state.load()
+    live_state.start(settings.LIVE_STATE_SYNC_INTERVAL)
+    get_history_buffers().load()
+    compactor = get_rollup_compactor()
+    compactor.backfill()
+    compactor.start()
+    retention = get_retention_manager()
+    retention.start()
+    outbox = get_alert_outbox()
+    outbox.start()
     os.makedirs("static/audio", exist_ok=True)
     os.makedirs("static/results", exist_ok=True)
+    os.makedirs("static/frames", exist_ok=True)
+    engine = get_inference_engine()
+    engine.start()
+    sensor_buffer = get_sensor_buffer()
+    sensor_buffer.start()
     yield
+    await sensor_buffer.stop()
+    await live_state.stop()
+    await thresholds_cache.stop()
+    await compactor.stop()
+    await retention.stop()
+    await outbox.stop()
+    engine.stop()
+    get_annotation_renderer().shutdown()
+    await bus.stop()
 
 app = FastAPI(
     title="YOLO Fire Detection API",
@@ -28,6 +72,9 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Cap upload bodies while they stream in, before they are spooled
+app.add_middleware(UploadLimitMiddleware)
+
 # CORS Configuration
 app.add_middleware(
     CORSMiddleware,
@@ -46,6 +93,9 @@ app.include_router(dashboard.router, tags=["Dashboard"])
 app.include_router(media.router, tags=["Media"])
 app.include_router(predict.router, tags=["Prediction"])
 app.include_router(websockets.router, tags=["WebSockets"])
+app.include_router(incidents.router, tags=["Incidents"])
+app.include_router(alerts.router, tags=["Alerts"])
+app.include_router(retention.router, tags=["Retention"])
 
 @app.get("/")
 def read_root():
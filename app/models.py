@@ -1,5 +1,5 @@
-from typing import Optional
-from sqlmodel import Field, SQLModel
+from typing import List, Optional
+from sqlmodel import Field, SQLModel, Column, JSON
 from datetime import datetime
 from app.schemas import SystemStatus
 
@@ -8,7 +8,7 @@ class SensorReading(SQLModel, table=True):
     temperature: float
     humidity: float
     smoke_level: float
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: datetime = Field(default_factory=datetime.utcnow, index=True)
 
 class DetectionEvent(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -16,16 +16,57 @@ class DetectionEvent(SQLModel, table=True):
     annotated_image_url: str
     object_count: int
     has_fire: bool
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: datetime = Field(default_factory=datetime.utcnow, index=True)
+    boxes: Optional[List[dict]] = Field(default=None, sa_column=Column(JSON))
 
 class SystemLog(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     status: SystemStatus
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: datetime = Field(default_factory=datetime.utcnow, index=True)
     details: Optional[str] = None
 
 class ThresholdsModel(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     temperature_max: float
     gas_max: float
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+class StateVersion(SQLModel, table=True):
+    """Version counters bumped on every write to shared state, so workers can detect stale caches."""
+    key: str = Field(primary_key=True)
+    version: int = 0
+
+class IncidentState(SQLModel, table=True):
+    """The current fire incident; `version` makes its transitions compare-and-set across workers (see app.incidents)."""
+    key: str = Field(primary_key=True)
+    version: int = 0
+    incident: dict = Field(default_factory=dict, sa_column=Column(JSON))
+
+class SensorRollup(SQLModel, table=True):
+    """Per-bucket min/max/sum/count of sensor readings, maintained on ingest (see app.rollups)."""
+    bucket: str = Field(primary_key=True)  # 1m, 1h or 1d
+    bucket_start: datetime = Field(primary_key=True)
+    count: int = 0
+    temperature_min: float
+    temperature_max: float
+    temperature_sum: float
+    humidity_min: float
+    humidity_max: float
+    humidity_sum: float
+    smoke_level_min: float
+    smoke_level_max: float
+    smoke_level_sum: float
+
+class OutboxMessage(SQLModel, table=True):
+    """An alert email waiting for (or done with) delivery by the AlertOutbox worker."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    incident_key: Optional[str] = Field(default=None, index=True)  # Repeats within ALERT_DEDUP_SECONDS are folded in
+    subject: str
+    body: str
+    status: str = Field(default="pending", index=True)  # pending | sent | failed
+    attempts: int = 0
+    duplicates: int = 0
+    timestamp: datetime = Field(default_factory=datetime.now, index=True)
+    next_attempt_at: datetime = Field(default_factory=datetime.now, index=True)
+    sent_at: Optional[datetime] = None
+    last_error: Optional[str] = None
@@ -1,38 +1,317 @@
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from app.config import get_settings
+from sqlalchemy import func, update
+from sqlmodel import Session, select
+from app.config import Settings
+from app.database import engine as db_engine
+from app.models import OutboxMessage
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+import asyncio
 import logging
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
-def send_email_alert(subject: str, body: str):
-    """
-    Send an email alert using Mailtrap settings.
-    """
-    settings = get_settings()
-    
-    sender = settings.MAIL_FROM
-    receiver = settings.MAIL_TO
-    
+# A claimed message is retried by any worker if not settled within this long (e.g. the process died mid-send)
+CLAIM_LEASE = timedelta(minutes=5)
+
+# Most messages folded into one digest email
+DIGEST_MAX_MESSAGES = 50
+
+def build_message(settings: Settings, subject: str, body: str) -> MIMEMultipart:
     message = MIMEMultipart()
     message["Subject"] = subject
-    message["From"] = sender
-    message["To"] = receiver
-    
+    message["From"] = settings.MAIL_FROM
+    message["To"] = settings.MAIL_TO
     message.attach(MIMEText(body, "plain"))
-    
-    try:
-        with smtplib.SMTP(settings.MAIL_SERVER, settings.MAIL_PORT) as server:
-            # Mailtrap often requires starttls, but sometimes it depends on the port. 
-            # Port 2525 usually works with starttls.
-            # Only starttls if not using SSL port (465 usually SSL, 587/2525 usually TLS)
-            # The user code sample showed starttls.
-            server.starttls() 
-            server.login(settings.MAIL_USERNAME, settings.MAIL_PASSWORD)
-            server.sendmail(sender, receiver, message.as_string())
-        logger.info(f"Email sent successfully to {receiver}")
-        return True, None
-    except Exception as e:
-        logger.error(f"Failed to send email: {e}")
-        return False, str(e)
+    return message
+
+class SMTPClient:
+    """
+    One authenticated SMTP connection, kept open between messages.
+
+    The connection (and the STARTTLS/login round trips) is reused until the
+    server drops it or it sits unused for ALERT_SMTP_IDLE_SECONDS. A reused
+    connection that turns out to be dead is reopened once before giving up.
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.idle_seconds = settings.ALERT_SMTP_IDLE_SECONDS
+        self._server: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+        self.connects = 0
+
+    @property
+    def connected(self) -> bool:
+        return self._server is not None
+
+    def _connect(self) -> smtplib.SMTP:
+        settings = self.settings
+        server = smtplib.SMTP(settings.MAIL_SERVER, settings.MAIL_PORT, timeout=settings.MAIL_TIMEOUT)
+        try:
+            # Mailtrap and most submission ports (587/2525) want STARTTLS; a local test server usually doesn't
+            if settings.MAIL_STARTTLS:
+                server.starttls()
+            if settings.MAIL_USERNAME:
+                server.login(settings.MAIL_USERNAME, settings.MAIL_PASSWORD)
+        except Exception:
+            server.close()
+            raise
+        self.connects += 1
+        return server
+
+    def send(self, subject: str, body: str):
+        message = build_message(self.settings, subject, body).as_string()
+        while True:
+            reused = self._server is not None
+            if not reused:
+                self._server = self._connect()
+            try:
+                self._server.sendmail(self.settings.MAIL_FROM, self.settings.MAIL_TO, message)
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                self._server = None
+                if reused:
+                    continue
+                raise
+            except Exception:
+                self.close()
+                raise
+            self._last_used = time.monotonic()
+            return
+
+    def close_if_idle(self):
+        if self._server is not None and time.monotonic() - self._last_used > self.idle_seconds:
+            self.close()
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                self._server.close()
+            self._server = None
+
+class AlertOutbox:
+    """
+    Persistent queue of alert emails, delivered by a background worker.
+
+    enqueue() only writes an OutboxMessage row, so request handlers never wait
+    on the mail server and queued alerts survive a restart. The worker sends
+    due messages over a pooled SMTPClient:
+
+    - an alert with the same incident key as one queued in the last
+      ALERT_DEDUP_SECONDS is not sent again; the earlier message counts it;
+    - at most one email goes out per ALERT_MIN_INTERVAL seconds, and alerts
+      that pile up in between are coalesced into a single digest;
+    - failed sends are retried with exponential backoff (ALERT_RETRY_BASE_SECONDS
+      doubling up to ALERT_RETRY_MAX_SECONDS) and given up after
+      ALERT_MAX_ATTEMPTS.
+    """
+
+    def __init__(self, settings: Settings):
+        self.dedup_window = timedelta(seconds=settings.ALERT_DEDUP_SECONDS)
+        self.min_interval = settings.ALERT_MIN_INTERVAL
+        self.max_attempts = settings.ALERT_MAX_ATTEMPTS
+        self.retry_base = settings.ALERT_RETRY_BASE_SECONDS
+        self.retry_max = settings.ALERT_RETRY_MAX_SECONDS
+        self.poll_interval = settings.ALERT_POLL_INTERVAL
+        self.client = SMTPClient(settings)
+        self.sent = 0
+        self.failed_sends = 0
+        self.last_error: Optional[str] = None
+        self._last_sent = float("-inf")
+        self._lock = threading.Lock()  # The SMTP connection is used by one thread at a time
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def enqueue(self, subject: str, body: str, incident_key: Optional[str] = None) -> dict:
+        """
+        Queue an alert email and wake the worker.
+
+        Returns:
+            The message id and whether it was "queued" or "deduplicated" into an earlier one.
+        """
+        result = await asyncio.to_thread(self._enqueue, subject, body, incident_key)
+        if result["status"] == "queued" and self._wake is not None:
+            self._wake.set()
+        return result
+
+    def _enqueue(self, subject: str, body: str, incident_key: Optional[str]) -> dict:
+        now = datetime.now()
+        with Session(db_engine) as session:
+            if incident_key is not None:
+                earlier = session.exec(
+                    select(OutboxMessage)
+                    .where(
+                        OutboxMessage.incident_key == incident_key,
+                        OutboxMessage.timestamp >= now - self.dedup_window,
+                        OutboxMessage.status != "failed"
+                    )
+                    .order_by(OutboxMessage.timestamp.desc())
+                ).first()
+                if earlier is not None:
+                    earlier.duplicates += 1
+                    session.commit()
+                    return {"id": earlier.id, "status": "deduplicated"}
+            message = OutboxMessage(incident_key=incident_key, subject=subject, body=body, timestamp=now, next_attempt_at=now)
+            session.add(message)
+            session.commit()
+            return {"id": message.id, "status": "queued"}
+
+    def start(self):
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self._close)
+
+    def _close(self):
+        with self._lock:
+            self.client.close()
+
+    def _claim(self, now: datetime) -> List[OutboxMessage]:
+        """Lease the oldest due messages so no other worker sends them concurrently."""
+        with Session(db_engine) as session:
+            due = (
+                select(OutboxMessage.id)
+                .where(OutboxMessage.status == "pending", OutboxMessage.next_attempt_at <= now)
+                .order_by(OutboxMessage.timestamp)
+                .limit(DIGEST_MAX_MESSAGES)
+                .scalar_subquery()
+            )
+            ids = session.execute(
+                update(OutboxMessage)
+                .where(OutboxMessage.id.in_(due), OutboxMessage.status == "pending", OutboxMessage.next_attempt_at <= now)
+                .values(next_attempt_at=now + CLAIM_LEASE)
+                .returning(OutboxMessage.id)
+            ).scalars().all()
+            session.commit()
+            if not ids:
+                return []
+            return session.exec(
+                select(OutboxMessage).where(OutboxMessage.id.in_(ids)).order_by(OutboxMessage.timestamp)
+            ).all()
+
+    @staticmethod
+    def compose(messages: List[OutboxMessage]) -> Tuple[str, str]:
+        """Subject and body of one email covering `messages` (a digest when there are several)."""
+        def text(message: OutboxMessage) -> str:
+            if message.duplicates:
+                return f"{message.body}\n\n(Repeated {message.duplicates} more time{'s' if message.duplicates > 1 else ''} since.)"
+            return message.body
+
+        if len(messages) == 1:
+            return messages[0].subject, text(messages[0])
+        first, last = messages[0].timestamp, messages[-1].timestamp
+        subject = f"🔥 {len(messages)} fire alerts ({first:%Y-%m-%d %H:%M:%S} - {last:%H:%M:%S})"
+        body = "\n\n----------\n\n".join(f"{message.subject}\n\n{text(message)}" for message in messages)
+        return subject, body
+
+    def _settle(self, messages: List[OutboxMessage], error: Optional[str]):
+        now = datetime.now()
+        with Session(db_engine) as session:
+            for message in messages:
+                # Fresh copy: duplicates may have been counted since the claim
+                message = session.get(OutboxMessage, message.id)
+                message.attempts += 1
+                if error is None:
+                    message.status = "sent"
+                    message.sent_at = now
+                    message.last_error = None
+                else:
+                    message.last_error = error
+                    if message.attempts >= self.max_attempts:
+                        message.status = "failed"
+                    else:
+                        delay = min(self.retry_base * 2 ** (message.attempts - 1), self.retry_max)
+                        message.next_attempt_at = now + timedelta(seconds=delay)
+            session.commit()
+
+    def _next_due(self) -> Optional[datetime]:
+        with Session(db_engine) as session:
+            return session.exec(
+                select(func.min(OutboxMessage.next_attempt_at)).where(OutboxMessage.status == "pending")
+            ).first()
+
+    def deliver(self) -> float:
+        """
+        Send what is due as one email, if the rate limit allows.
+
+        Returns:
+            Seconds until the worker should look again.
+        """
+        with self._lock:
+            wait = self._last_sent + self.min_interval - time.monotonic()
+            if wait > 0:
+                return wait
+
+            messages = self._claim(datetime.now())
+            if messages:
+                subject, body = self.compose(messages)
+                try:
+                    self.client.send(subject, body)
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                    self.failed_sends += 1
+                    self.last_error = error
+                    logger.error(f"Failed to send alert email ({len(messages)} message(s)): {error}")
+                    self._settle(messages, error)
+                else:
+                    self._last_sent = time.monotonic()
+                    self.sent += 1
+                    logger.info(f"Alert email sent ({len(messages)} message(s)) to {self.client.settings.MAIL_TO}")
+                    self._settle(messages, None)
+                    return self.min_interval
+            else:
+                self.client.close_if_idle()
+
+            next_due = self._next_due()
+            if next_due is None:
+                return self.poll_interval
+            return min(self.poll_interval, max(0.0, (next_due - datetime.now()).total_seconds()))
+
+    def stats(self) -> dict:
+        with Session(db_engine) as session:
+            counts = dict(session.exec(
+                select(OutboxMessage.status, func.count()).group_by(OutboxMessage.status)
+            ).all())
+            oldest = session.exec(
+                select(func.min(OutboxMessage.timestamp)).where(OutboxMessage.status == "pending")
+            ).first()
+        return {
+            "pending": counts.get("pending", 0),
+            "sent": counts.get("sent", 0),
+            "failed": counts.get("failed", 0),
+            "oldest_pending": oldest.isoformat() if oldest else None,
+            "emails_sent": self.sent,
+            "failed_sends": self.failed_sends,
+            "smtp_connected": self.client.connected,
+            "smtp_connects": self.client.connects,
+            "last_error": self.last_error,
+        }
+
+    async def _run(self):
+        while True:
+            # Cleared before looking, so an enqueue during delivery still wakes the next wait
+            self._wake.clear()
+            try:
+                delay = await asyncio.to_thread(self.deliver)
+            except Exception as e:
+                logger.error(f"Alert outbox delivery failed: {e}")
+                delay = self.poll_interval
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
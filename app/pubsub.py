@@ -0,0 +1,259 @@
+from app.config import Settings
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Set
+import asyncio
+import fcntl
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+BUS_BACKENDS = ("memory", "unix")
+
+# Largest frame accepted on the broker socket
+MAX_FRAME_BYTES = 1024 * 1024
+
+# A peer whose socket buffer grows past this is disconnected instead of buffering without bound
+MAX_PEER_BUFFER_BYTES = 8 * 1024 * 1024
+
+RECONNECT_DELAY = 0.2
+
+class MemoryBus:
+    """
+    Pub/sub and shared key/value state for a single process.
+
+    publish() calls the local subscribers of a channel right away and set()
+    changes the value every later get() sees. Subclasses additionally
+    forward both to the other workers.
+    """
+
+    backend = "memory"
+
+    def __init__(self):
+        self._handlers: Dict[str, List[Callable[[dict], Any]]] = defaultdict(list)
+        self._state: Dict[str, Any] = {}
+        self.published = 0
+        self.received = 0
+
+    def subscribe(self, channel: str, handler: Callable[[dict], Any]):
+        self._handlers[channel].append(handler)
+
+    def publish(self, channel: str, message: dict):
+        """Deliver a message to the subscribers of `channel` in every worker (never blocks)."""
+        self.published += 1
+        self._deliver(channel, message)
+        self._send({"op": "pub", "channel": channel, "message": message})
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._state.get(key, default)
+
+    def set(self, key: str, value: Any):
+        """Set a shared value (JSON-serializable) in every worker."""
+        self._state[key] = value
+        self._send({"op": "set", "key": key, "value": value})
+
+    def _send(self, frame: dict):
+        """Forward a frame to the other workers; nothing to do in a single process."""
+
+    def _deliver(self, channel: str, message: dict):
+        for handler in self._handlers.get(channel, ()):
+            try:
+                handler(message)
+            except Exception as e:
+                logger.error(f"Bus subscriber on {channel} failed: {e}")
+
+    def _receive(self, frame: dict):
+        """Apply a frame that came from another worker."""
+        self.received += 1
+        op = frame.get("op")
+        if op == "pub":
+            self._deliver(frame["channel"], frame["message"])
+        elif op == "set":
+            self._state[frame["key"]] = frame["value"]
+        elif op == "snapshot":
+            self._state.update(frame["state"])
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": self.backend, "published": self.published, "received": self.received}
+
+def _encode(frame: dict) -> bytes:
+    return (json.dumps(frame, separators=(",", ":"), default=str) + "\n").encode()
+
+class UnixSocketBus(MemoryBus):
+    """
+    Pub/sub and shared state across the workers of one host.
+
+    The first worker to take an exclusive lock on `<BUS_SOCKET_PATH>.lock`
+    becomes the broker: it listens on BUS_SOCKET_PATH and relays every frame
+    (newline-delimited JSON) it gets from one worker to all the others. The
+    rest connect to it as peers and receive a snapshot of the shared state on
+    connecting. When the broker exits its lock is released and the peers
+    elect a new one among themselves; frames sent during that gap are lost,
+    so anything that must survive it (alert emails) is persisted elsewhere.
+    """
+
+    backend = "unix"
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self.role: Optional[str] = None  # broker | peer
+        self.elections = 0
+        self.dropped = 0
+        self._lock_file = None
+        self._broker: Optional[asyncio.StreamWriter] = None
+        self._peers: Set[asyncio.StreamWriter] = set()
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Join the bus, waiting briefly for the shared state so the first requests see it."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout=2.0)
+            except asyncio.TimeoutError:
+                logger.warning(f"Bus at {self.path} not ready yet, continuing")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _try_lock(self) -> bool:
+        lock_file = open(f"{self.path}.lock", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    async def _run(self):
+        try:
+            while True:
+                if self._try_lock():
+                    await self._serve()
+                try:
+                    reader, writer = await asyncio.open_unix_connection(self.path, limit=MAX_FRAME_BYTES)
+                except OSError:
+                    # Broker is starting up or just went away
+                    await asyncio.sleep(RECONNECT_DELAY)
+                    continue
+                self.role = "peer"
+                self._broker = writer
+                try:
+                    await self._read(reader, self._receive)
+                finally:
+                    self._broker = None
+                    writer.close()
+                logger.warning("Bus broker went away, electing a new one")
+                self.elections += 1
+        finally:
+            self._shutdown()
+
+    async def _serve(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # Left by a broker that died; we hold the lock now
+        self._server = await asyncio.start_unix_server(self._handle_peer, path=self.path, limit=MAX_FRAME_BYTES)
+        self.role = "broker"
+        self._ready.set()
+        logger.info(f"Bus broker listening on {self.path}")
+        await asyncio.Event().wait()
+
+    async def _handle_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._peers.add(writer)
+        writer.write(_encode({"op": "snapshot", "state": self._state}))
+        try:
+            await self._read(reader, lambda frame: self._relay(frame, writer))
+        except Exception as e:
+            logger.warning(f"Bus peer disconnected: {e}")
+        finally:
+            self._peers.discard(writer)
+            writer.close()
+
+    @staticmethod
+    async def _read(reader: asyncio.StreamReader, handle: Callable[[dict], Any]):
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            handle(json.loads(line))
+
+    def _receive(self, frame: dict):
+        super()._receive(frame)
+        if frame.get("op") == "snapshot":
+            self._ready.set()
+
+    def _relay(self, frame: dict, origin: asyncio.StreamWriter):
+        """Broker: apply a peer's frame locally and pass it on to every other peer."""
+        self._receive(frame)
+        data = _encode(frame)
+        for peer in list(self._peers):
+            if peer is not origin:
+                self._write(peer, data)
+
+    def _send(self, frame: dict):
+        data = _encode(frame)
+        if self.role == "broker":
+            for peer in list(self._peers):
+                self._write(peer, data)
+        elif self._broker is not None:
+            self._write(self._broker, data)
+        else:
+            self.dropped += 1
+
+    def _write(self, writer: asyncio.StreamWriter, data: bytes):
+        if writer.transport.get_write_buffer_size() > MAX_PEER_BUFFER_BYTES:
+            self.dropped += 1
+            logger.warning("Bus connection is not keeping up, closing it")
+            writer.close()
+            return
+        writer.write(data)
+
+    def _shutdown(self):
+        for peer in list(self._peers):
+            peer.close()
+        self._peers.clear()
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+        if self._lock_file is not None:
+            # Releasing the lock lets a peer take over as broker
+            self._lock_file.close()
+            self._lock_file = None
+        self.role = None
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(),
+            "role": self.role,
+            "peers": len(self._peers),
+            "elections": self.elections,
+            "dropped": self.dropped,
+        }
+
+def create_bus(settings: Settings) -> MemoryBus:
+    """Build the pub/sub bus for BUS_BACKEND."""
+    if settings.BUS_BACKEND not in BUS_BACKENDS:
+        raise ValueError(f"Unknown bus backend '{settings.BUS_BACKEND}', expected one of {BUS_BACKENDS}")
+    if settings.BUS_BACKEND == "unix":
+        return UnixSocketBus(settings.BUS_SOCKET_PATH)
+    return MemoryBus()
@@ -0,0 +1,279 @@
+from sqlalchemy import delete, func, select
+from sqlmodel import Session
+from app.config import Settings
+from app.database import engine as db_engine
+from app.history import arrow_chunks, iter_batches, ndjson_chunks
+from app.live_state import bump_version, live_state
+from app.models import DetectionEvent, SensorReading, SystemLog
+from app.annotations import FRAMES_DIR, RESULTS_DIR
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Optional
+import asyncio
+import gzip
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+AUDIO_DIR = "static/audio"
+
+# Freshly written media may not be referenced by a committed row yet
+ORPHAN_GRACE_SECONDS = 3600
+
+@dataclass
+class TablePolicy:
+    model: type
+    columns: tuple
+    max_age_days: int = 0   # 0 = no age limit
+    max_rows: int = 0       # 0 = no row limit
+
+@dataclass
+class MediaPolicy:
+    directory: str
+    max_age_days: int = 0
+    max_bytes: int = 0      # 0 = no quota; oldest files go first
+
+class RetentionManager:
+    """
+    Scheduled cleanup of old rows and media.
+
+    Every RETENTION_INTERVAL seconds, for each table, rows beyond the age or
+    row-count policy are archived to RETENTION_ARCHIVE_DIR (zstd Parquet when
+    pyarrow is installed, gzipped NDJSON otherwise) and deleted in batches.
+    Rows deleted this way are dropped from the in-memory history buffers.
+    Media directories are trimmed by age and byte quota, annotated images and
+    their source frames no DetectionEvent refers to are removed, and freed DB
+    pages are returned to the filesystem with incremental VACUUM.
+    """
+
+    def __init__(self, settings: Settings):
+        self.interval = settings.RETENTION_INTERVAL
+        self.archive_dir = settings.RETENTION_ARCHIVE_DIR
+        self.batch_size = settings.RETENTION_BATCH_SIZE
+        self.tables = [
+            TablePolicy(SensorReading, ("id", "timestamp", "temperature", "humidity", "smoke_level"),
+                        settings.RETENTION_SENSOR_DAYS, settings.RETENTION_SENSOR_MAX_ROWS),
+            TablePolicy(DetectionEvent, ("id", "timestamp", "filename", "annotated_image_url", "object_count", "has_fire", "boxes"),
+                        settings.RETENTION_DETECTION_DAYS, settings.RETENTION_DETECTION_MAX_ROWS),
+            TablePolicy(SystemLog, ("id", "timestamp", "status", "details"),
+                        settings.RETENTION_LOG_DAYS, settings.RETENTION_LOG_MAX_ROWS),
+        ]
+        self.media = [
+            MediaPolicy(RESULTS_DIR, settings.RETENTION_RESULTS_DAYS, settings.RETENTION_RESULTS_MAX_BYTES),
+            MediaPolicy(FRAMES_DIR, settings.RETENTION_RESULTS_DAYS, settings.RETENTION_RESULTS_MAX_BYTES),
+            MediaPolicy(AUDIO_DIR, settings.RETENTION_AUDIO_DAYS, settings.RETENTION_AUDIO_MAX_BYTES),
+        ]
+        self.last_report: Optional[dict] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run_once(self) -> dict:
+        """Run a full retention pass in a worker thread (one at a time)."""
+        async with self._lock:
+            self.last_report = await asyncio.to_thread(self.run)
+            return self.last_report
+
+    def run(self) -> dict:
+        started = time.perf_counter()
+        db_before = self._db_bytes()
+
+        tables = {policy.model.__tablename__: self._apply_table(policy) for policy in self.tables}
+        if any(table["deleted"] for table in tables.values()):
+            self._forget_pruned_rows()
+        media = {policy.directory: self._apply_media(policy) for policy in self.media}
+        orphans = self._delete_orphans()
+        self._vacuum()
+
+        db_reclaimed = max(0, db_before - self._db_bytes())
+        media_reclaimed = sum(m["bytes"] for m in media.values()) + orphans["bytes"]
+        report = {
+            "finished_at": datetime.now().isoformat(),
+            "duration_seconds": round(time.perf_counter() - started, 3),
+            "tables": tables,
+            "media": media,
+            "orphans": orphans,
+            "db_bytes_reclaimed": db_reclaimed,
+            "media_bytes_reclaimed": media_reclaimed,
+            "bytes_reclaimed": db_reclaimed + media_reclaimed,
+        }
+        logger.info(
+            f"Retention reclaimed {report['bytes_reclaimed']} bytes in {report['duration_seconds']}s"
+        )
+        return report
+
+    @staticmethod
+    def _forget_pruned_rows():
+        """
+        Stop serving deleted rows from memory: this worker's history buffers
+        no longer trust what they hold, and bumping the live-state version
+        makes the other workers (and polling dashboards) resync.
+        """
+        from app.dependencies import get_history_buffers
+        with Session(db_engine) as session:
+            version = bump_version(session)
+            session.commit()
+        get_history_buffers().invalidate()
+        live_state.observe(version)
+
+    def _cutoff(self, session: Session, policy: TablePolicy) -> Optional[datetime]:
+        """Rows strictly older than the returned timestamp are expired."""
+        cutoffs = []
+        if policy.max_age_days > 0:
+            cutoffs.append(datetime.now() - timedelta(days=policy.max_age_days))
+        if policy.max_rows > 0:
+            model = policy.model
+            oldest_kept = session.execute(
+                select(model.timestamp).order_by(model.timestamp.desc()).offset(policy.max_rows - 1).limit(1)
+            ).scalar_one_or_none()
+            if oldest_kept is not None:
+                cutoffs.append(oldest_kept)
+        return max(cutoffs) if cutoffs else None
+
+    def _apply_table(self, policy: TablePolicy) -> dict:
+        model = policy.model
+        with Session(db_engine) as session:
+            cutoff = self._cutoff(session, policy)
+            if cutoff is None:
+                return {"archived": 0, "deleted": 0, "archive": None}
+            expired, max_id = session.execute(
+                select(func.count(), func.max(model.id)).where(model.timestamp < cutoff)
+            ).one()
+        if not expired:
+            return {"archived": 0, "deleted": 0, "archive": None}
+
+        # iter_batches is inclusive at the end; stop just before the cutoff
+        end = cutoff - timedelta(microseconds=1)
+        archive = self._archive(policy, end)
+
+        deleted = 0
+        while True:
+            with Session(db_engine) as session:
+                # Rows written after the archive was taken (id > max_id) are left for the next run
+                ids = select(model.id).where(model.timestamp < cutoff, model.id <= max_id).limit(self.batch_size).scalar_subquery()
+                result = session.execute(delete(model).where(model.id.in_(ids)))
+                session.commit()
+            deleted += result.rowcount
+            if result.rowcount < self.batch_size:
+                break
+        return {"archived": expired, "deleted": deleted, "archive": archive}
+
+    def _archive(self, policy: TablePolicy, end: datetime) -> str:
+        os.makedirs(self.archive_dir, exist_ok=True)
+        name = f"{policy.model.__tablename__}_until_{end:%Y%m%dT%H%M%S}_{datetime.now():%Y%m%dT%H%M%S}"
+        batches = iter_batches(policy.model, policy.columns, None, end, self.batch_size)
+        try:
+            import pyarrow  # noqa: F401
+            path = os.path.join(self.archive_dir, f"{name}.parquet")
+            with open(f"{path}.tmp", "wb") as out:
+                for chunk in arrow_chunks(policy.model, policy.columns, batches, parquet=True, compression="zstd"):
+                    out.write(chunk)
+        except ImportError:
+            path = os.path.join(self.archive_dir, f"{name}.ndjson.gz")
+            with gzip.open(f"{path}.tmp", "wt") as out:
+                for chunk in ndjson_chunks(policy.columns, batches):
+                    out.write(chunk)
+        # Only a complete archive gets its final name, and only then are rows deleted
+        os.replace(f"{path}.tmp", path)
+        return path
+
+    @staticmethod
+    def _files(directory: str) -> List[os.DirEntry]:
+        if not os.path.isdir(directory):
+            return []
+        return [entry for entry in os.scandir(directory) if entry.is_file()]
+
+    @staticmethod
+    def _remove(entry: os.DirEntry) -> int:
+        size = entry.stat().st_size
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            return 0
+        return size
+
+    def _apply_media(self, policy: MediaPolicy) -> dict:
+        files = sorted(self._files(policy.directory), key=lambda entry: entry.stat().st_mtime)
+        removed = reclaimed = 0
+        if policy.max_age_days > 0:
+            cutoff = time.time() - policy.max_age_days * 86400
+            while files and files[0].stat().st_mtime < cutoff:
+                reclaimed += self._remove(files.pop(0))
+                removed += 1
+        if policy.max_bytes > 0:
+            total = sum(entry.stat().st_size for entry in files)
+            while files and total > policy.max_bytes:
+                entry = files.pop(0)
+                total -= entry.stat().st_size
+                reclaimed += self._remove(entry)
+                removed += 1
+        return {"files": removed, "bytes": reclaimed}
+
+    def _delete_orphans(self) -> dict:
+        """
+        Remove annotated images (and their source frames) that no DetectionEvent refers to.
+
+        Events point at /results/<name> or, before lazy rendering, at
+        /static/results/<name>; both are matched on the file name.
+        """
+        referenced = set()
+        with Session(db_engine) as session:
+            for url in session.execute(
+                select(DetectionEvent.annotated_image_url).where(DetectionEvent.annotated_image_url != "")
+            ).scalars():
+                name = url.rsplit("/", 1)[-1]
+                referenced.add(name)
+                # Source frames are stored under the image name without its extension
+                referenced.add(os.path.splitext(name)[0])
+
+        grace = time.time() - ORPHAN_GRACE_SECONDS
+        removed = reclaimed = 0
+        for directory in (RESULTS_DIR, FRAMES_DIR):
+            for entry in self._files(directory):
+                if entry.name.startswith(".") or entry.name in referenced or entry.stat().st_mtime > grace:
+                    continue
+                reclaimed += self._remove(entry)
+                removed += 1
+        return {"files": removed, "bytes": reclaimed}
+
+    @staticmethod
+    def _db_bytes() -> int:
+        with db_engine.connect() as conn:
+            page_count = conn.exec_driver_sql("PRAGMA page_count").scalar()
+            page_size = conn.exec_driver_sql("PRAGMA page_size").scalar()
+        return page_count * page_size
+
+    @staticmethod
+    def _vacuum():
+        with db_engine.connect() as conn:
+            if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 2:
+                # Databases created before incremental auto-vacuum need one full VACUUM to switch
+                logger.info("Converting database to incremental auto-vacuum")
+                conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+                conn.exec_driver_sql("VACUUM")
+            # Frees one page per step, and the sqlite3 driver steps a statement without
+            # result columns only once; executescript runs it until the freelist is empty
+            conn.connection.driver_connection.executescript("PRAGMA incremental_vacuum")
+            conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Retention run failed: {e}")
@@ -0,0 +1,233 @@
+from sqlmodel import Session, select
+from app.config import Settings
+from app.database import engine as db_engine
+from app.models import DetectionEvent, SensorReading
+from collections import deque
+from datetime import datetime, timedelta
+from typing import List, Optional, Sequence
+import threading
+
+import numpy as np
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+UNBOUNDED = np.iinfo(np.int64).min
+
+def to_micros(timestamp: datetime) -> int:
+    """Naive datetime -> integer microseconds, exact in both directions."""
+    return (timestamp - EPOCH) // MICROSECOND
+
+def from_micros(micros: int) -> datetime:
+    return EPOCH + timedelta(microseconds=int(micros))
+
+class SeriesRing:
+    """
+    Fixed-capacity ring of the most recent rows of one series.
+
+    Values are kept in parallel NumPy columns (float64 per value column, int64
+    for id and for timestamps in microseconds), so memory is bounded by
+    `capacity` and queries never build ORM objects.
+
+    The ring is only trusted for rows newer than `boundary`: everything with a
+    timestamp strictly after it is known to be in the ring. Evicting the
+    oldest row or receiving a row older than the newest one (a backfill) moves
+    the boundary up; queries reaching past it return None so the caller falls
+    back to the DB.
+    """
+
+    def __init__(self, columns: Sequence[str], capacity: int):
+        self.columns = list(columns)
+        self.capacity = capacity
+        self._values = {name: np.zeros(capacity, dtype=np.float64) for name in self.columns}
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._times = np.zeros(capacity, dtype=np.int64)
+        self._start = 0
+        self._size = 0
+        self.boundary: Optional[int] = None  # None until seeded: nothing is trusted
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        return self._ids.nbytes + self._times.nbytes + sum(column.nbytes for column in self._values.values())
+
+    def seed(self, rows: List[dict], complete: bool):
+        """
+        Fill the ring from rows ordered oldest first.
+
+        `complete` says the rows are the whole series (the table held fewer
+        rows than the ring's capacity).
+        """
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            self._start = self._size = 0
+            self.boundary = UNBOUNDED
+            if rows and not complete:
+                self.boundary = to_micros(rows[0]["timestamp"])
+            self._append(rows)
+
+    def append(self, rows: List[dict]):
+        """Add freshly committed rows (dicts with id, timestamp and the value columns)."""
+        if self.capacity <= 0 or self.boundary is None:
+            return
+        with self._lock:
+            self._append(rows)
+
+    def _append(self, rows: List[dict]):
+        for row in rows:
+            micros = to_micros(row["timestamp"])
+            if self._size and micros < self._times[(self._start + self._size - 1) % self.capacity]:
+                # Out-of-order row: keep the ring sorted and stop trusting it that far back
+                self.boundary = max(self.boundary, micros)
+                continue
+            if self._size == self.capacity:
+                self.boundary = max(self.boundary, int(self._times[self._start]))
+                self._start = (self._start + 1) % self.capacity
+                self._size -= 1
+            index = (self._start + self._size) % self.capacity
+            self._ids[index] = row["id"]
+            self._times[index] = micros
+            for name in self.columns:
+                self._values[name][index] = row[name]
+            self._size += 1
+
+    def invalidate(self):
+        """Another writer may have added rows we never saw: only trust rows appended from now on."""
+        with self._lock:
+            if self.boundary is not None and self._size:
+                self.boundary = max(self.boundary, int(self._times[(self._start + self._size - 1) % self.capacity]))
+
+    @property
+    def complete(self) -> bool:
+        """True when the ring holds the whole series."""
+        return self.boundary == UNBOUNDED
+
+    def _take(self, column: np.ndarray, first: int, last: int) -> np.ndarray:
+        """Logical rows [first, last) (oldest = 0) of a column, as a copy."""
+        return column[(self._start + np.arange(first, last)) % self.capacity]
+
+    def _search(self, micros: int, side: str) -> int:
+        """Logical insertion point of a timestamp, searching the two physical segments."""
+        head = self._times[self._start:min(self._start + self._size, self.capacity)]
+        position = int(np.searchsorted(head, micros, side=side))
+        if position < len(head):
+            return position
+        tail = self._times[:self._size - len(head)]
+        return len(head) + int(np.searchsorted(tail, micros, side=side))
+
+    def _slice(self, first: int, last: int) -> List[dict]:
+        """Logical rows [first, last) shaped like serialized SensorReadings, newest first."""
+        ids = self._take(self._ids, first, last)[::-1].tolist()
+        times = self._take(self._times, first, last)[::-1].tolist()
+        values = {name: self._take(column, first, last)[::-1].tolist() for name, column in self._values.items()}
+        return [
+            {
+                "id": row_id,
+                **{name: values[name][i] for name in self.columns},
+                "timestamp": from_micros(micros).isoformat()
+            }
+            for i, (row_id, micros) in enumerate(zip(ids, times))
+        ]
+
+    def latest(self, limit: int) -> Optional[List[dict]]:
+        """The newest `limit` rows, or None when the ring can't answer for sure."""
+        with self._lock:
+            if self.boundary is None:
+                return None
+            count = min(limit, self._size)
+            if count < limit and not self.complete:
+                return None
+            first = self._size - count
+            if count and self._times[(self._start + first) % self.capacity] <= self.boundary:
+                return None
+            return self._slice(first, self._size)
+
+    def window(self, start: datetime, end: Optional[datetime], limit: int) -> Optional[List[dict]]:
+        """Newest `limit` rows with start <= timestamp <= end, or None when the window reaches past the boundary."""
+        low = to_micros(start)
+        with self._lock:
+            if self.boundary is None or low <= self.boundary:
+                return None
+            first = self._search(low, "left")
+            last = self._search(to_micros(end), "right") if end else self._size
+            return self._slice(max(first, last - limit), last)
+
+    def stats(self) -> dict:
+        return {
+            "size": self._size,
+            "capacity": self.capacity,
+            "bytes": self.nbytes,
+            "complete": self.complete,
+            "oldest": from_micros(self._times[self._start]).isoformat() if self._size else None
+        }
+
+class RecentRows:
+    """Bounded list of the most recent rows of a series with mixed column types, newest last."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._rows = deque(maxlen=capacity)
+        self._complete = False
+        self._seeded = False
+        self._lock = threading.Lock()
+
+    def seed(self, rows: List[dict], complete: bool):
+        with self._lock:
+            self._rows.clear()
+            self._rows.extend(rows)
+            self._complete = complete
+            self._seeded = True
+
+    def append(self, rows: List[dict]):
+        if self.capacity <= 0 or not self._seeded:
+            return
+        with self._lock:
+            for row in rows:
+                if len(self._rows) == self.capacity:
+                    self._complete = False
+                self._rows.append(row)
+
+    def invalidate(self):
+        """Another writer may have added rows we never saw: start over from the next append."""
+        with self._lock:
+            self._rows.clear()
+            self._complete = False
+
+    def latest(self, limit: int) -> Optional[List[dict]]:
+        with self._lock:
+            if not self._seeded or (limit > len(self._rows) and not self._complete):
+                return None
+            return list(self._rows)[-limit:][::-1] if limit else []
+
+SENSOR_COLUMNS = ("temperature", "humidity", "smoke_level")
+
+class HistoryBuffers:
+    """The in-memory history served by /history/sensors and /history/detections."""
+
+    def __init__(self, settings: Settings):
+        self.sensors = SeriesRing(SENSOR_COLUMNS, settings.HISTORY_SENSOR_BUFFER_SIZE)
+        self.detections = RecentRows(settings.HISTORY_DETECTION_BUFFER_SIZE)
+
+    def load(self):
+        """Seed both buffers with the newest rows in the DB."""
+        with Session(db_engine) as session:
+            if self.sensors.capacity > 0:
+                readings = session.exec(
+                    select(SensorReading).order_by(SensorReading.timestamp.desc()).limit(self.sensors.capacity)
+                ).all()
+                self.sensors.seed(
+                    [reading.model_dump() for reading in reversed(readings)],
+                    complete=len(readings) < self.sensors.capacity
+                )
+            if self.detections.capacity > 0:
+                events = session.exec(
+                    select(DetectionEvent).order_by(DetectionEvent.timestamp.desc()).limit(self.detections.capacity)
+                ).all()
+                self.detections.seed(
+                    [event.model_dump() for event in reversed(events)],
+                    complete=len(events) < self.detections.capacity
+                )
+
+    def invalidate(self):
+        self.sensors.invalidate()
+        self.detections.invalidate()
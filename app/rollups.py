@@ -0,0 +1,239 @@
+from sqlalchemy import DateTime, bindparam, delete, func, select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session
+from app.config import Settings
+from app.database import engine as db_engine
+from app.models import SensorReading, SensorRollup
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import logging
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+METRICS = ("temperature", "humidity", "smoke_level")
+
+BUCKETS = {
+    "1m": timedelta(minutes=1),
+    "1h": timedelta(hours=1),
+    "1d": timedelta(days=1),
+}
+
+# strftime patterns producing the exact text SQLAlchemy stores for a truncated datetime
+BUCKET_SQL_FORMAT = {
+    "1m": "%Y-%m-%d %H:%M:00.000000",
+    "1h": "%Y-%m-%d %H:00:00.000000",
+    "1d": "%Y-%m-%d 00:00:00.000000",
+}
+
+def bucket_start(timestamp: datetime, bucket: str) -> datetime:
+    if bucket == "1m":
+        return timestamp.replace(second=0, microsecond=0)
+    if bucket == "1h":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def summarize(rows: List[dict]) -> List[dict]:
+    """Aggregate raw reading dicts into one SensorRollup row per (bucket, bucket_start)."""
+    groups: Dict[Tuple[str, datetime], dict] = {}
+    for row in rows:
+        for bucket in BUCKETS:
+            key = (bucket, bucket_start(row["timestamp"], bucket))
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = {"bucket": key[0], "bucket_start": key[1], "count": 0}
+                for metric in METRICS:
+                    group[f"{metric}_min"] = group[f"{metric}_max"] = row[metric]
+                    group[f"{metric}_sum"] = 0.0
+            group["count"] += 1
+            for metric in METRICS:
+                value = row[metric]
+                group[f"{metric}_min"] = min(group[f"{metric}_min"], value)
+                group[f"{metric}_max"] = max(group[f"{metric}_max"], value)
+                group[f"{metric}_sum"] += value
+    return list(groups.values())
+
+def add_to_rollups(session: Session, rows: List[dict]):
+    """Fold freshly inserted readings into the rollups, inside the caller's transaction."""
+    if not rows:
+        return
+    statement = sqlite_insert(SensorRollup)
+    excluded = statement.excluded
+    updates = {"count": SensorRollup.count + excluded["count"]}
+    for metric in METRICS:
+        updates[f"{metric}_min"] = func.min(getattr(SensorRollup, f"{metric}_min"), excluded[f"{metric}_min"])
+        updates[f"{metric}_max"] = func.max(getattr(SensorRollup, f"{metric}_max"), excluded[f"{metric}_max"])
+        updates[f"{metric}_sum"] = getattr(SensorRollup, f"{metric}_sum") + excluded[f"{metric}_sum"]
+    statement = statement.on_conflict_do_update(index_elements=["bucket", "bucket_start"], set_=updates)
+    session.execute(statement, summarize(rows))
+
+def rebuild_rollups(session: Session, bucket: str, start: Optional[datetime] = None, end: Optional[datetime] = None):
+    """Recompute one bucket size from the raw readings in [start, end), e.g. for data that predates the rollups."""
+    conditions = ["bucket = :bucket"]
+    raw_conditions = ["1 = 1"]
+    params = {"bucket": bucket, "fmt": BUCKET_SQL_FORMAT[bucket]}
+    if start is not None:
+        params["start"] = bucket_start(start, bucket)
+        conditions.append("bucket_start >= :start")
+        raw_conditions.append("timestamp >= :start")
+    if end is not None:
+        params["end"] = end
+        conditions.append("bucket_start < :end")
+        raw_conditions.append("timestamp < :end")
+
+    types = [bindparam(name, type_=DateTime) for name in ("start", "end") if name in params]
+    session.execute(text(f"DELETE FROM sensorrollup WHERE {' AND '.join(conditions)}").bindparams(*types), params)
+    aggregates = ", ".join(
+        f"MIN({m}), MAX({m}), SUM({m})" for m in METRICS
+    )
+    columns = ", ".join(f"{m}_min, {m}_max, {m}_sum" for m in METRICS)
+    session.execute(text(
+        f"INSERT INTO sensorrollup (bucket, bucket_start, count, {columns}) "
+        f"SELECT :bucket, strftime(:fmt, timestamp), COUNT(*), {aggregates} "
+        f"FROM sensorreading WHERE {' AND '.join(raw_conditions)} "
+        f"GROUP BY strftime(:fmt, timestamp)"
+    ).bindparams(*types), params)
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Returns the indices of `threshold` points of (x, y) that keep the visual
+    shape of the series.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    every = (n - 2) / (threshold - 2)
+    previous = 0
+    for i in range(threshold - 2):
+        start, stop = int(i * every) + 1, int((i + 1) * every) + 1
+        # Average of the next bucket is the third vertex of the triangle
+        next_stop = min(int((i + 2) * every) + 1, n)
+        avg_x = x[stop:next_stop].mean()
+        avg_y = y[stop:next_stop].mean()
+        area = np.abs(
+            (x[previous] - avg_x) * (y[start:stop] - y[previous])
+            - (x[previous] - x[start:stop]) * (avg_y - y[previous])
+        )
+        previous = start + int(area.argmax())
+        indices[i + 1] = previous
+    return indices
+
+def query_rollups(
+    session: Session,
+    bucket: str,
+    start: datetime,
+    end: datetime,
+    limit: int,
+    points: Optional[int] = None,
+    metric: str = "temperature"
+) -> List[dict]:
+    """
+    min/max/avg/count per bucket in [start, end), oldest first.
+
+    With `points` the buckets are reduced with LTTB over the average of
+    `metric`, so charts get a fixed number of representative points.
+    """
+    # Plain rows rather than ORM instances: a wide range can be tens of thousands of buckets
+    rows = session.execute(
+        select(SensorRollup.__table__)
+        .where(SensorRollup.bucket == bucket, SensorRollup.bucket_start >= bucket_start(start, bucket), SensorRollup.bucket_start < end)
+        .order_by(SensorRollup.bucket_start)
+        .limit(limit)
+    ).all()
+
+    if points and len(rows) > points:
+        x = np.array([row.bucket_start.timestamp() for row in rows])
+        y = np.array([getattr(row, f"{metric}_sum") / row.count for row in rows])
+        rows = [rows[i] for i in lttb(x, y, points)]
+
+    return [
+        {
+            "bucket_start": row.bucket_start.isoformat(),
+            "count": row.count,
+            **{
+                m: {
+                    "min": getattr(row, f"{m}_min"),
+                    "max": getattr(row, f"{m}_max"),
+                    "avg": getattr(row, f"{m}_sum") / row.count
+                }
+                for m in METRICS
+            }
+        }
+        for row in rows
+    ]
+
+class RollupCompactor:
+    """
+    Background job keeping the rollup tables tidy.
+
+    backfill() (run once at startup) builds rollups for readings that predate
+    them; every ROLLUP_COMPACTION_INTERVAL seconds the job drops fine-grained buckets
+    past their retention (1m after ROLLUP_1M_RETENTION_DAYS, 1h after
+    ROLLUP_1H_RETENTION_DAYS), leaving the coarser buckets for old data.
+    """
+
+    def __init__(self, settings: Settings):
+        self.interval = settings.ROLLUP_COMPACTION_INTERVAL
+        self.retention = {
+            "1m": settings.ROLLUP_1M_RETENTION_DAYS,
+            "1h": settings.ROLLUP_1H_RETENTION_DAYS,
+        }
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def backfill(self):
+        """Build the rollups from raw readings when the table is empty but readings exist."""
+        with Session(db_engine) as session:
+            if session.execute(select(SensorRollup.bucket).limit(1)).first() is not None:
+                return
+            if session.execute(select(SensorReading.id).limit(1)).first() is None:
+                return
+            started = time.perf_counter()
+            for bucket in BUCKETS:
+                rebuild_rollups(session, bucket)
+            session.commit()
+        logger.info(f"Backfilled sensor rollups in {time.perf_counter() - started:.2f}s")
+
+    def compact(self) -> int:
+        """Drop expired fine-grained buckets; returns the number of rows removed."""
+        removed = 0
+        with Session(db_engine) as session:
+            for bucket, days in self.retention.items():
+                if days > 0:
+                    cutoff = bucket_start(datetime.now() - timedelta(days=days), bucket)
+                    result = session.execute(
+                        delete(SensorRollup).where(SensorRollup.bucket == bucket, SensorRollup.bucket_start < cutoff)
+                    )
+                    removed += result.rowcount
+            session.commit()
+        return removed
+
+    async def _run(self):
+        while self.interval > 0:
+            try:
+                removed = await asyncio.to_thread(self.compact)
+                if removed:
+                    logger.info(f"Compacted {removed} expired rollup buckets")
+            except Exception as e:
+                logger.error(f"Rollup compaction failed: {e}")
+            await asyncio.sleep(self.interval)
@@ -21,6 +21,10 @@ class ThresholdsUpdate(BaseModel):
     temperature_max: Optional[float] = None
     gas_max: Optional[float] = None
 
+class IncidentAction(BaseModel):
+    by: Optional[str] = None
+    note: Optional[str] = None
+
 class Box(BaseModel):
     x1: float
     y1: float
@@ -34,7 +38,18 @@ class DetectionResult(BaseModel):
     filename: str
     detections: List[Box]
     message: str
-    annotated_image_url: str = None
+    annotated_image_url: Optional[str] = None
+
+class VideoAnalysisResult(BaseModel):
+    filename: str
+    frames_sampled: int
+    frames_with_fire: int
+    fire_confirmed: bool
+    confirmed_at_seconds: Optional[float] = None
+    best_frame_seconds: Optional[float] = None
+    detections: List[Box]
+    message: str
+    annotated_image_url: Optional[str] = None
 
 class DashboardResponse(BaseModel):
     status: SystemStatus
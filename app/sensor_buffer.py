@@ -0,0 +1,197 @@
+from sqlalchemy import insert
+from sqlmodel import Session
+from app.config import Settings
+from app.database import engine as db_engine
+from app.dependencies import get_history_buffers
+from app.live_state import bump_version, live_state
+from app.models import SensorReading
+from app.rollups import add_to_rollups
+from typing import List, Optional
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+DURABILITY_MODES = ("sync", "group", "async")
+
+# Weight of the newest sample in the write latency average, and how fast it fades once writes stop
+LATENCY_EWMA_ALPHA = 0.2
+LATENCY_HALF_LIFE = 1.0
+
+class SensorWriteBuffer:
+    """
+    Write-behind buffer for sensor readings with group commit.
+
+    Readings are appended to a bounded queue and a background task writes them
+    (and folds them into the rollups) with one transaction per group, flushing when
+    SENSOR_FLUSH_BATCH_SIZE rows are waiting or SENSOR_FLUSH_INTERVAL_MS after
+    the first one arrived. SENSOR_DURABILITY controls when a write returns:
+
+    - sync: commit the rows right away (one commit per request).
+    - group: wait until the group holding the rows has been committed.
+    - async: return as soon as the rows are queued; they are committed on the
+      next flush and on shutdown.
+    """
+
+    def __init__(self, settings: Settings):
+        if settings.SENSOR_DURABILITY not in DURABILITY_MODES:
+            raise ValueError(f"SENSOR_DURABILITY must be one of {DURABILITY_MODES}")
+        self.mode = settings.SENSOR_DURABILITY
+        self.batch_size = max(1, settings.SENSOR_FLUSH_BATCH_SIZE)
+        self.interval = settings.SENSOR_FLUSH_INTERVAL_MS / 1000.0
+        self.max_size = settings.SENSOR_BUFFER_MAX_SIZE
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flushes = 0
+        self._rows_written = 0
+        self._rows_failed = 0
+        self._max_depth = 0
+        self._last_flush_ms = 0.0
+        self._max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+        self._latency_ms = 0.0
+        self._latency_at = time.monotonic()
+
+    def start(self):
+        if self.mode == "sync" or self._task is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flusher once everything queued before the call is committed."""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        # Writes that raced with the stop marker
+        leftover = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not None:
+                leftover.append(item)
+        if leftover:
+            await self._flush(leftover)
+
+    async def write(self, rows: List[dict]):
+        """Persist SensorReading rows according to the durability mode."""
+        if not rows:
+            return
+        started = time.monotonic()
+        try:
+            if self._task is None:
+                await self._flush([(rows, None)], raise_errors=True)
+                return
+
+            future = asyncio.get_running_loop().create_future() if self.mode == "group" else None
+            # Blocks when the queue is full, pushing back on producers
+            await self._queue.put((rows, future))
+            self._max_depth = max(self._max_depth, self._queue.qsize())
+            if future is not None:
+                await future
+        finally:
+            finished = time.monotonic()
+            elapsed = (finished - started) * 1000
+            self._latency_ms = self.write_latency_ms + LATENCY_EWMA_ALPHA * (elapsed - self.write_latency_ms)
+            self._latency_at = finished
+
+    @property
+    def queue_fill(self) -> float:
+        """Fraction of the queue capacity in use."""
+        return self._queue.qsize() / self.max_size if self._queue and self.max_size > 0 else 0.0
+
+    @property
+    def write_latency_ms(self) -> float:
+        """Moving average of how long write() takes to return; decays towards 0 while idle."""
+        idle = time.monotonic() - self._latency_at
+        return self._latency_ms * 0.5 ** (idle / LATENCY_HALF_LIFE)
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "max_queue_depth": self._max_depth,
+            "queue_capacity": self.max_size,
+            "flushes": self._flushes,
+            "rows_written": self._rows_written,
+            "rows_failed": self._rows_failed,
+            "last_flush_ms": round(self._last_flush_ms, 3),
+            "max_flush_ms": round(self._max_flush_ms, 3),
+            "avg_flush_ms": round(self._total_flush_ms / self._flushes, 3) if self._flushes else 0.0,
+            "write_latency_ms": round(self.write_latency_ms, 3)
+        }
+
+    def _drain(self, group: list) -> bool:
+        """Move queued items into group up to batch_size rows; False once the stop marker is seen."""
+        count = sum(len(rows) for rows, _ in group)
+        while count < self.batch_size and not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is None:
+                return False
+            group.append(item)
+            count += len(item[0])
+        return True
+
+    async def _run(self):
+        running = True
+        while running:
+            first = await self._queue.get()
+            if first is None:
+                break
+            group = [first]
+            deadline = time.monotonic() + self.interval
+            running = self._drain(group)
+            while running and sum(len(rows) for rows, _ in group) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    running = False
+                    break
+                group.append(item)
+                running = self._drain(group)
+            await self._flush(group)
+
+    async def _flush(self, group: list, raise_errors: bool = False):
+        rows = [row for item_rows, _ in group for row in item_rows]
+        started = time.perf_counter()
+        try:
+            version = await asyncio.to_thread(self._insert, rows)
+        except Exception as e:
+            self._rows_failed += len(rows)
+            logger.error(f"Failed to flush {len(rows)} sensor readings: {e}")
+            for _, future in group:
+                if future is not None and not future.done():
+                    future.set_exception(e)
+            if raise_errors:
+                raise
+            return
+
+        elapsed = (time.perf_counter() - started) * 1000
+        self._flushes += 1
+        self._rows_written += len(rows)
+        self._last_flush_ms = elapsed
+        self._max_flush_ms = max(self._max_flush_ms, elapsed)
+        self._total_flush_ms += elapsed
+        live_state.observe(version)
+        for _, future in group:
+            if future is not None and not future.done():
+                future.set_result(None)
+
+    @staticmethod
+    def _insert(rows: List[dict]) -> int:
+        with Session(db_engine) as session:
+            ids = session.execute(
+                insert(SensorReading).returning(SensorReading.id, sort_by_parameter_order=True), rows
+            ).scalars().all()
+            add_to_rollups(session, rows)
+            version = bump_version(session)
+            session.commit()
+        get_history_buffers().sensors.append([{**row, "id": row_id} for row, row_id in zip(rows, ids)])
+        return version
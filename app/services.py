@@ -1,74 +1,87 @@
-from PIL import Image
 from ultralytics import YOLO
 from app.schemas import DetectionResult, Box
 from app.config import Settings
+from app.channels import DETECTION_FIELDS
+from app.ingest import Frame, decode_frame
+from app.live_state import bump_version, bump_version_async, live_state
 from app.models import DetectionEvent
-from sqlmodel import Session, select
-import io
+from app.thresholds import thresholds_cache
+from sqlmodel import Session
+from datetime import datetime
+from typing import List, Optional
 
 class FireDetectionService:
-    def __init__(self, model: YOLO, settings: Settings, db: Session):
+    def __init__(self, model: YOLO, settings: Settings, db=None, renderer=None):
+        # db is a Session for the sync methods or an AsyncSession for the *_async ones
         self.model = model
         self.settings = settings
         self.db = db
+        self._renderer = renderer
+
+    @property
+    def renderer(self):
+        if self._renderer is None:
+            from app.dependencies import get_annotation_renderer
+            self._renderer = get_annotation_renderer()
+        return self._renderer
+
+    def decode(self, image_bytes: bytes, full_resolution: bool = False) -> Frame:
+        """Decode raw upload bytes into a Frame sized for the model (or untouched, for tiling)."""
+        return decode_frame(image_bytes, 0 if full_resolution else self.settings.INGEST_TARGET_SIZE)
 
     def predict(self, image_bytes: bytes, filename: str) -> DetectionResult:
-        image = Image.open(io.BytesIO(image_bytes))
-        
+        frame = self.decode(image_bytes)
+
         # Run inference
-        results = self.model.predict(image, conf=self.settings.CONFIDENCE_THRESHOLD)
-        
+        results = self.model.predict(frame.array, conf=self.settings.CONFIDENCE_THRESHOLD)
+
+        detections = frame.to_original(self.extract_boxes(results[0]))
+        result = self.build_result(frame, detections, filename, source=image_bytes)
+        self.record_event(result)
+        return result
+
+    @staticmethod
+    def extract_boxes(result) -> List[Box]:
+        """Convert a single ultralytics result into our Box schema."""
         detections = []
-        for result in results:
-            for box in result.boxes:
-                # Get box coordinates
-                x1, y1, x2, y2 = box.xyxy[0].tolist()
-                confidence = float(box.conf[0])
-                class_id = int(box.cls[0])
-                class_name = result.names[class_id]
-                
-                detections.append(Box(
-                    x1=x1,
-                    y1=y1,
-                    x2=x2,
-                    y2=y2,
-                    confidence=confidence,
-                    class_id=class_id,
-                    class_name=class_name
-                ))
-        
+        for box in result.boxes:
+            # Get box coordinates
+            x1, y1, x2, y2 = box.xyxy[0].tolist()
+            confidence = float(box.conf[0])
+            class_id = int(box.cls[0])
+            class_name = result.names[class_id]
+
+            detections.append(Box(
+                x1=x1,
+                y1=y1,
+                x2=x2,
+                y2=y2,
+                confidence=confidence,
+                class_id=class_id,
+                class_name=class_name
+            ))
+        return detections
+
+    def build_result(
+        self,
+        frame: Frame,
+        detections: List[Box],
+        filename: str,
+        source: Optional[bytes] = None,
+        annotate: bool = True
+    ) -> DetectionResult:
+        """
+        Turn the boxes found in one frame (in original image coordinates) into a DetectionResult.
+
+        The annotated image is handed to the AnnotationRenderer, which only
+        reserves its URL here and draws it according to ANNOTATION_MODE. Does
+        not touch the database, so it is safe to call from inference worker threads.
+        """
         message = f"Found {len(detections)} objects."
         if len(detections) == 0:
             message = "No fire detected."
-        
-        # Save annotated image
-        import os
-        import uuid
-        
-        # Create a unique filename
-        name, ext = os.path.splitext(filename)
-        unique_filename = f"{name}_{uuid.uuid4().hex}{ext}"
-        save_path = os.path.join("static/results", unique_filename)
-        
-        # Plot results on the image
-        # plot() returns a numpy array (BGR), we need to convert it back to RGB and save
-        im_array = results[0].plot()  # plot() returns BGR numpy array
-        im = Image.fromarray(im_array[..., ::-1])  # RGB PIL Image
-        im.save(save_path)
-        
-        annotated_image_url = f"/static/results/{unique_filename}"
-        
-        # Save to DB
-        has_fire = any(d.class_name == 'fire' for d in detections)
-        event = DetectionEvent(
-            filename=filename,
-            annotated_image_url=annotated_image_url,
-            object_count=len(detections),
-            has_fire=has_fire
-        )
-        self.db.add(event)
-        self.db.commit()
-        self.db.refresh(event)
+
+        annotated_image_url = self.renderer.submit(filename, frame, detections, source) if annotate else None
 
         return DetectionResult(
             filename=filename,
@@ -78,27 +91,112 @@ class FireDetectionService:
         )
 
     @staticmethod
-    def check_sensor_risk(data, session: Session) -> bool:
+    def boxes_from_array(array, names: dict) -> List[Box]:
+        """Convert a compact (n, 6) [x1, y1, x2, y2, conf, cls] array into Boxes."""
+        return [
+            Box(
+                x1=float(x1),
+                y1=float(y1),
+                x2=float(x2),
+                y2=float(y2),
+                confidence=float(conf),
+                class_id=int(cls),
+                class_name=names[int(cls)]
+            )
+            for x1, y1, x2, y2, conf, cls in array.tolist()
+        ]
+
+    @staticmethod
+    def to_event(result: DetectionResult, has_fire: Optional[bool] = None) -> DetectionEvent:
+        """Build the DetectionEvent row describing a result."""
+        if has_fire is None:
+            has_fire = any(d.class_name == 'fire' for d in result.detections)
+        return DetectionEvent(
+            filename=result.filename,
+            # Empty when rendering was skipped; the column predates optional images
+            annotated_image_url=result.annotated_image_url or "",
+            object_count=len(result.detections),
+            has_fire=has_fire,
+            boxes=[d.model_dump() for d in result.detections]
+        )
+
+    def record_event(self, result: DetectionResult, has_fire: Optional[bool] = None) -> DetectionEvent:
+        """Persist a DetectionEvent for an already computed result."""
+        event = self.to_event(result, has_fire)
+        self.db.add(event)
+        version = bump_version(self.db)  # Autoflushes, so the event has its id
+        rows = [event.model_dump()]
+        self.db.commit()
+        self.publish(rows, version)
+        return event
+
+    async def record_event_async(self, result: DetectionResult, has_fire: Optional[bool] = None) -> DetectionEvent:
+        """record_event for services built on an AsyncSession."""
+        event = self.to_event(result, has_fire)
+        self.db.add(event)
+        version = await bump_version_async(self.db)
+        rows = [event.model_dump()]
+        await self.db.commit()
+        self.publish(rows, version)
+        return event
+
+    async def record_events_async(self, results: List[DetectionResult]) -> List[DetectionEvent]:
+        """Persist the DetectionEvents of several results in one transaction (one commit, one version bump)."""
+        events = [self.to_event(result) for result in results]
+        if not events:
+            return events
+        self.db.add_all(events)
+        version = await bump_version_async(self.db)
+        rows = [event.model_dump() for event in events]
+        await self.db.commit()
+        self.publish(rows, version)
+        return events
+
+    @staticmethod
+    def publish(rows: List[dict], version: int):
+        """
+        Hand committed DetectionEvent rows to the in-memory readers and to the
+        dashboards' detections channel.
+
+        Rows are captured before commit() so nothing needs reloading from an
+        expired instance afterwards.
+        """
+        from app.dependencies import get_history_buffers
+        from app.websockets import manager
+        live_state.record_detection(rows[-1], version)
+        get_history_buffers().detections.append(rows)
+        latest = rows[-1]
+        manager.notify_threadsafe("dashboard", {
+            "type": "detection_event",
+            "count": len(rows),
+            "fire_count": sum(row["has_fire"] for row in rows),
+            "data": {
+                field: latest[field].isoformat() if isinstance(latest[field], datetime) else latest[field]
+                for field in DETECTION_FIELDS
+            },
+            "timestamp": datetime.now().isoformat()
+        })
+
+    @staticmethod
+    def check_sensor_risk(data, session: Optional[Session] = None) -> bool:
         """
         Evaluate sensor data for potential fire risks using dynamic thresholds.
-        
+
         Args:
             data: SensorData object containing current readings.
-            session: Database session to fetch current thresholds.
-            
+            session: Unused; thresholds come from the in-memory thresholds cache.
+
         Returns:
             bool: True if fire risk is detected, False otherwise.
         """
-        from app.models import ThresholdsModel
-        
-        # Fetch current thresholds or default
-        thresholds = session.exec(select(ThresholdsModel).order_by(ThresholdsModel.updated_at.desc())).first()
-        
-        # Default values if no DB entry
-        temp_max = thresholds.temperature_max if thresholds else 50.0
-        # utilizing gas_max as smoke_level threshold for now
-        smoke_max = thresholds.gas_max if thresholds else 300.0
-        
-        if data.temperature > temp_max or data.smoke_level > smoke_max:
-            return True
-        return False
+        return thresholds_cache.check([data])[0]
+
+    @staticmethod
+    def check_sensor_risk_batch(readings: List) -> List[bool]:
+        """
+        Evaluate a batch of sensor readings against the cached thresholds.
+
+        Returns:
+            List[bool]: Fire risk flag for each reading, in order.
+        """
+        return thresholds_cache.check(readings)
@@ -0,0 +1,86 @@
+from sqlmodel import Session, select
+from app.database import engine as db_engine
+from app.live_state import ensure_version, read_version
+from app.models import ThresholdsModel
+from app.schemas import Thresholds
+from typing import List, Optional
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+THRESHOLDS_KEY = "thresholds"
+
+# Enforced until a row is stored; risk checks have always fallen back to these
+DEFAULT_THRESHOLDS = Thresholds(temperature_max=50.0, gas_max=300.0)
+
+class ThresholdsCache:
+    """
+    The current alert thresholds, held in memory.
+
+    Loaded at startup and updated write-through by POST /thresholds, so risk
+    checks never query the DB. Writes bump the "thresholds" StateVersion
+    counter; other workers poll it every LIVE_STATE_SYNC_INTERVAL seconds and
+    reload when it moved. Without a stored row DEFAULT_THRESHOLDS (50/300)
+    apply, and are what GET /thresholds reports.
+    """
+
+    def __init__(self):
+        self.current = DEFAULT_THRESHOLDS
+        self.version = 0
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def check(self, readings: List) -> List[bool]:
+        """Fire risk flag for each reading, in order (pure in-memory comparison)."""
+        thresholds = self.current
+        # utilizing gas_max as smoke_level threshold for now
+        return [
+            data.temperature > thresholds.temperature_max or data.smoke_level > thresholds.gas_max
+            for data in readings
+        ]
+
+    def set(self, thresholds: Thresholds, version: int):
+        with self._lock:
+            if version >= self.version:
+                self.current = thresholds
+                self.version = version
+
+    def load(self):
+        with Session(db_engine) as session:
+            ensure_version(session, THRESHOLDS_KEY)
+            version = read_version(session, THRESHOLDS_KEY)
+            current = session.exec(select(ThresholdsModel).order_by(ThresholdsModel.updated_at.desc())).first()
+        self.set(
+            Thresholds(temperature_max=current.temperature_max, gas_max=current.gas_max) if current else DEFAULT_THRESHOLDS,
+            version
+        )
+
+    def start(self, interval: float):
+        if interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._sync(interval))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _stale(self) -> bool:
+        with Session(db_engine) as session:
+            return read_version(session, THRESHOLDS_KEY) > self.version
+
+    async def _sync(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if await asyncio.to_thread(self._stale):
+                    await asyncio.to_thread(self.load)
+            except Exception as e:
+                logger.error(f"Thresholds sync failed: {e}")
+
+thresholds_cache = ThresholdsCache()
@@ -0,0 +1,57 @@
+from app.schemas import Box
+from typing import List, Tuple
+
+import numpy as np
+
+def _starts(length: int, tile_size: int, stride: int) -> List[int]:
+    if length <= tile_size:
+        return [0]
+    starts = list(range(0, length - tile_size, stride))
+    starts.append(length - tile_size)  # Last tile flush with the edge
+    return starts
+
+def tile_grid(width: int, height: int, tile_size: int, overlap: float) -> List[Tuple[int, int, int, int]]:
+    """
+    Split an image into overlapping tiles.
+
+    Returns:
+        List of (x1, y1, x2, y2) pixel windows covering the whole image.
+    """
+    stride = max(1, int(tile_size * (1 - overlap)))
+    return [
+        (x, y, min(x + tile_size, width), min(y + tile_size, height))
+        for y in _starts(height, tile_size, stride)
+        for x in _starts(width, tile_size, stride)
+    ]
+
+def offset_boxes(detections: List[Box], dx: float, dy: float) -> List[Box]:
+    """Shift boxes found in a tile back into full-image coordinates."""
+    return [
+        d.model_copy(update={"x1": d.x1 + dx, "y1": d.y1 + dy, "x2": d.x2 + dx, "y2": d.y2 + dy})
+        for d in detections
+    ]
+
+def merge_boxes(detections: List[Box], iou_threshold: float) -> List[Box]:
+    """Class-wise greedy NMS over boxes gathered from overlapping tiles."""
+    if not detections:
+        return []
+
+    coords = np.array([[d.x1, d.y1, d.x2, d.y2] for d in detections], dtype=np.float64)
+    scores = np.array([d.confidence for d in detections])
+    classes = np.array([d.class_id for d in detections], dtype=np.float64)
+    # Shift each class into its own coordinate range so classes never suppress each other
+    coords += (classes * (coords.max() + 1))[:, None]
+    areas = (coords[:, 2] - coords[:, 0]) * (coords[:, 3] - coords[:, 1])
+
+    keep = []
+    order = scores.argsort()[::-1]
+    while order.size:
+        best, rest = order[0], order[1:]
+        keep.append(best)
+        width = np.clip(np.minimum(coords[best, 2], coords[rest, 2]) - np.maximum(coords[best, 0], coords[rest, 0]), 0, None)
+        height = np.clip(np.minimum(coords[best, 3], coords[rest, 3]) - np.maximum(coords[best, 1], coords[rest, 1]), 0, None)
+        inter = width * height
+        union = areas[best] + areas[rest] - inter
+        iou = np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+        order = rest[iou < iou_threshold]
+    return [detections[i] for i in keep]
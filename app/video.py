@@ -0,0 +1,139 @@
+from fastapi import HTTPException, UploadFile
+from app.config import Settings
+from app.inference import InferenceEngine
+from app.ingest import CHUNK_SIZE, Frame, frame_from_bgr
+from app.schemas import DetectionResult, VideoAnalysisResult
+from collections import deque
+from typing import List, Optional, Tuple
+import asyncio
+import os
+import tempfile
+
+import cv2
+
+async def spool_upload(file: UploadFile, max_bytes: int) -> str:
+    """Copy an upload to a temporary file chunk by chunk so it can be decoded as a stream."""
+    _, ext = os.path.splitext(file.filename or "")
+    fd, path = tempfile.mkstemp(suffix=ext or ".mp4")
+    written = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if max_bytes and written > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"{file.filename} exceeds {max_bytes} bytes")
+                out.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+class VideoFrameSampler:
+    """
+    Decodes a clip one frame at a time and yields frames at `sample_fps`.
+
+    Skipped frames are only grabbed (demuxed and decoded by the codec) and
+    never converted to an image, which is where most of the per-frame cost is.
+    """
+
+    def __init__(self, path: str, sample_fps: float, target_size: int):
+        self.capture = cv2.VideoCapture(path)
+        if not self.capture.isOpened():
+            raise HTTPException(status_code=400, detail="Could not decode video")
+        fps = self.capture.get(cv2.CAP_PROP_FPS) or 25.0
+        self.fps = fps
+        self.step = max(1, round(fps / sample_fps)) if sample_fps > 0 else 1
+        self.target_size = target_size
+        self._index = 0
+
+    def read(self, count: int) -> List[Tuple[float, Frame]]:
+        """Return up to `count` sampled (timestamp seconds, frame) pairs; empty at end of clip."""
+        sampled = []
+        while len(sampled) < count:
+            if not self.capture.grab():
+                break
+            index = self._index
+            self._index += 1
+            if index % self.step:
+                continue
+            ok, array = self.capture.retrieve()
+            if not ok:
+                break
+            sampled.append((index / self.fps, frame_from_bgr(array, self.target_size)))
+        return sampled
+
+    def close(self):
+        self.capture.release()
+
+def fire_confidence(result: DetectionResult) -> float:
+    return max((d.confidence for d in result.detections if d.class_name == 'fire'), default=0.0)
+
+async def analyze_video(
+    path: str,
+    filename: str,
+    engine: InferenceEngine,
+    settings: Settings
+) -> Tuple[VideoAnalysisResult, Optional[Frame], Optional[DetectionResult]]:
+    """
+    Run sampled frames of a clip through the model in batches.
+
+    Stops after the batch in which fire was seen in VIDEO_CONFIRM_K of the
+    last VIDEO_CONFIRM_N sampled frames. Every frame that went through the
+    model counts in frames_sampled and frames_with_fire, including the rest
+    of that batch.
+
+    Returns:
+        The aggregated result, plus the best frame and its detections so the
+        caller can annotate and record it.
+    """
+    sampler = await asyncio.to_thread(
+        VideoFrameSampler, path, settings.VIDEO_SAMPLE_FPS, settings.INGEST_TARGET_SIZE
+    )
+    window = deque(maxlen=settings.VIDEO_CONFIRM_N)
+    sampled = frames_with_fire = 0
+    confirmed = False
+    confirmed_at = None
+    best = None  # (rank, timestamp, frame, result)
+
+    try:
+        while not confirmed:
+            batch = await asyncio.to_thread(sampler.read, settings.VIDEO_BATCH_SIZE)
+            if not batch:
+                break
+            results = await asyncio.gather(*(
+                engine.submit(frame, f"{filename}@{timestamp:.2f}s", annotate=False)
+                for timestamp, frame in batch
+            ))
+            for (timestamp, frame), result in zip(batch, results):
+                sampled += 1
+                score = fire_confidence(result)
+                has_fire = score > 0
+                frames_with_fire += has_fire
+                window.append(has_fire)
+
+                # Prefer the strongest fire frame, else the frame with most detections
+                rank = (score, len(result.detections))
+                if best is None or rank > best[0]:
+                    best = (rank, timestamp, frame, result)
+
+                if not confirmed and sum(window) >= settings.VIDEO_CONFIRM_K:
+                    confirmed = True
+                    confirmed_at = timestamp
+    finally:
+        await asyncio.to_thread(sampler.close)
+
+    best_result = best[3] if best else None
+    message = "Fire confirmed in video." if confirmed else "No fire confirmed in video."
+    return VideoAnalysisResult(
+        filename=filename,
+        frames_sampled=sampled,
+        frames_with_fire=frames_with_fire,
+        fire_confirmed=confirmed,
+        confirmed_at_seconds=confirmed_at,
+        best_frame_seconds=best[1] if best else None,
+        detections=best_result.detections if best_result else [],
+        message=message
+    ), best[2] if best else None, best_result
@@ -1,44 +1,290 @@
 from fastapi import WebSocket
-from typing import List
+from app.channels import CHANNEL_ONLY_TYPES, ChannelHub, parse_subscriptions
+from app.config import Settings, get_settings
+from collections import deque
+from functools import partial
+from typing import Dict, List, Optional
+import asyncio
+import json
+import logging
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CLIENT_TYPES = ("dashboard", "camera")
+
+# Never dropped by the slow-consumer policy: losing one of these loses the alarm itself
+CRITICAL_TYPES = {"fire_confirmed", "search_image_alert", "incident_update"}
+
+# Close code for evicted slow consumers ("try again later")
+EVICTED_CLOSE_CODE = 1013
+
+def serialize(message: dict) -> str:
+    """JSON text exactly as WebSocket.send_json would produce it."""
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+class Client:
+    """
+    One connected socket: a bounded outbound queue drained by its own sender task.
+
+    Broadcasts only put already serialized text on the queue, so a slow socket
+    never holds up the others. When the queue is full the manager's
+    WS_SLOW_CONSUMER_POLICY decides whether the oldest or the newest message
+    is dropped, or the client is evicted; a send that stalls for
+    WS_SEND_TIMEOUT evicts the client in any case.
+    """
+
+    def __init__(self, manager: "ConnectionManager", websocket: WebSocket, client_type: str):
+        self.manager = manager
+        self.websocket = websocket
+        self.client_type = client_type
+        self.queue: "asyncio.Queue[tuple]" = asyncio.Queue(maxsize=manager.queue_size)  # (text, queued_at, critical)
+        self.sent = 0
+        self.dropped = 0
+        self.closed = False
+        self.subscriptions: Dict[str, object] = {}  # channel -> Subscription; empty = every dashboard message, unthrottled
+        self._task = asyncio.create_task(self._send_loop())
+
+    def offer(self, text: str, critical: bool = False) -> bool:
+        """Queue serialized text without waiting; False if it was dropped or the client is gone."""
+        if self.closed:
+            return False
+        if self.queue.full():
+            policy = self.manager.policy
+            if policy == "evict" and not critical:
+                self.manager.evict(self, "queue full")
+                return False
+            if policy == "drop_newest" and not critical:
+                self.dropped += 1
+                return False
+            if not self._drop_oldest():
+                # Queue is all critical messages: the client is hopelessly behind
+                self.manager.evict(self, "queue full")
+                return False
+        self.queue.put_nowait((text, time.monotonic(), critical))
+        return True
+
+    def _drop_oldest(self) -> bool:
+        """Discard the oldest non-critical queued message."""
+        items = []
+        dropped = False
+        while not self.queue.empty():
+            item = self.queue.get_nowait()
+            if not dropped and not item[2]:
+                dropped = True
+                continue
+            items.append(item)
+        for item in items:
+            self.queue.put_nowait(item)
+        if dropped:
+            self.dropped += 1
+        return dropped
+
+    async def send_json(self, message: dict):
+        """Reply to this client alone, in order with its broadcasts (never dropped)."""
+        self.offer(serialize(message), critical=True)
+
+    async def _send_loop(self):
+        while True:
+            text, queued_at, _ = await self.queue.get()
+            try:
+                await asyncio.wait_for(self.websocket.send_text(text), timeout=self.manager.send_timeout)
+            except asyncio.TimeoutError:
+                self.manager.evict(self, "send timed out")
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # The socket is gone; the endpoint's receive loop cleans up
+                self.manager.disconnect(self.websocket, self.client_type)
+                return
+            self.sent += 1
+            self.manager.latencies.append(time.monotonic() - queued_at)
+
+    def close(self):
+        """Stop the sender; queued messages are discarded."""
+        if not self.closed:
+            self.closed = True
+            if self._task is not asyncio.current_task():
+                self._task.cancel()
 
 class ConnectionManager:
-    def __init__(self):
-        self.dashboard_connections: List[WebSocket] = []
-        self.camera_connections: List[WebSocket] = []
-    
-    async def connect(self, websocket: WebSocket, client_type: str):
+    """
+    Dashboard and camera WebSocket connections, and the broadcasts to them.
+
+    Every broadcast is serialized once and handed to each connection's Client
+    queue without awaiting any socket, so delivery to many dashboards is
+    bounded by the slowest healthy client rather than the sum of all sends.
+
+    Once attached to a pub/sub bus, notify_* publish there and every worker
+    broadcasts to its own clients.
+
+    Dashboards that subscribed to channels (see app.channels) get throttled
+    channel updates instead of the raw messages; alerts (CRITICAL_TYPES)
+    reach every client immediately either way.
+    """
+
+    def __init__(self, settings: Optional[Settings] = None):
+        settings = settings or get_settings()
+        self.queue_size = settings.WS_QUEUE_SIZE
+        self.policy = settings.WS_SLOW_CONSUMER_POLICY
+        self.send_timeout = settings.WS_SEND_TIMEOUT
+        self.clients: Dict[str, Dict[WebSocket, Client]] = {client_type: {} for client_type in CLIENT_TYPES}
+        self.default_rate = settings.WS_DEFAULT_UPDATE_RATE
+        self.max_rate = settings.WS_MAX_UPDATE_RATE
+        self.hub = ChannelHub()
+        self.bus = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.broadcasts = 0
+        self.evicted = 0
+        self.dropped = 0  # Drops of clients that have since disconnected
+        self.latencies: deque = deque(maxlen=10000)  # Seconds from broadcast to socket send, per delivery
+        self.broadcast_seconds: deque = deque(maxlen=1000)  # Caller-side cost of serializing and enqueueing
+
+    async def connect(self, websocket: WebSocket, client_type: str) -> Client:
         await websocket.accept()
-        if client_type == "dashboard":
-            self.dashboard_connections.append(websocket)
-        elif client_type == "camera":
-            self.camera_connections.append(websocket)
-    
+        client = Client(self, websocket, client_type)
+        self.clients[client_type][websocket] = client
+        return client
+
     def disconnect(self, websocket: WebSocket, client_type: str):
-        if client_type == "dashboard" and websocket in self.dashboard_connections:
-            self.dashboard_connections.remove(websocket)
-        elif client_type == "camera" and websocket in self.camera_connections:
-            self.camera_connections.remove(websocket)
-    
+        client = self.clients.get(client_type, {}).pop(websocket, None)
+        if client is not None:
+            self.hub.unsubscribe(client)
+            self.dropped += client.dropped
+            client.close()
+
+    def evict(self, client: Client, reason: str):
+        """Drop a slow consumer and close its socket so it can reconnect and resync."""
+        if client.closed:
+            return
+        self.evicted += 1
+        logger.warning(f"Evicting slow {client.client_type} WebSocket client: {reason}")
+        self.disconnect(client.websocket, client.client_type)
+        asyncio.create_task(self._close(client.websocket))
+
+    @staticmethod
+    async def _close(websocket: WebSocket):
+        try:
+            await asyncio.wait_for(websocket.close(code=EVICTED_CLOSE_CODE, reason="Too slow"), timeout=1.0)
+        except Exception:
+            pass
+
+    def broadcast(self, client_type: str, message: dict) -> int:
+        """Queue one message for every client of a type; returns how many accepted it."""
+        started = time.perf_counter()
+        kind = message.get("type")
+        critical = kind in CRITICAL_TYPES
+        text = None
+        accepted = 0
+        for client in list(self.clients[client_type].values()):
+            # Subscribed dashboards get this through their channels
+            if kind in CHANNEL_ONLY_TYPES or (client.subscriptions and not critical):
+                continue
+            text = text or serialize(message)
+            accepted += client.offer(text, critical)
+        if client_type == "dashboard":
+            self.hub.feed(message)
+        self.broadcasts += 1
+        self.broadcast_seconds.append(time.perf_counter() - started)
+        return accepted
+
+    def attach(self, bus):
+        """Route notify_* through `bus` so the clients of every worker get them."""
+        self._loop = asyncio.get_running_loop()
+        if self.bus is bus:
+            return
+        self.bus = bus
+        for client_type in CLIENT_TYPES:
+            bus.subscribe(f"ws:{client_type}", partial(self.broadcast, client_type))
+
+    def _notify(self, client_type: str, message: dict):
+        if self.bus is None:
+            self.broadcast(client_type, message)
+        else:
+            self.bus.publish(f"ws:{client_type}", message)
+
+    def notify_threadsafe(self, client_type: str, message: dict):
+        """notify_* for code that may run outside the event loop, e.g. DB writes in worker threads."""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._notify(client_type, message)
+        else:
+            loop.call_soon_threadsafe(self._notify, client_type, message)
+
+    def handle_control(self, client: Client, text: str) -> bool:
+        """
+        Apply a dashboard's `subscribe` / `unsubscribe` message and queue the reply.
+
+        Returns:
+            False for text that isn't a control message (keep-alives).
+        """
+        try:
+            request = json.loads(text)
+        except ValueError:
+            return False
+        if not isinstance(request, dict) or request.get("type") not in ("subscribe", "unsubscribe"):
+            return False
+        if request["type"] == "unsubscribe":
+            channels = request.get("channels")
+            self.hub.unsubscribe(client, channels if isinstance(channels, list) else None)
+            subscriptions = []
+        else:
+            try:
+                subscriptions = parse_subscriptions(request, self.default_rate, self.max_rate)
+            except ValueError as e:
+                client.offer(serialize({"type": "subscription_error", "message": str(e)}), critical=True)
+                return True
+        # The reply goes first; joining a channel may send its current snapshot right away
+        channels = {**client.subscriptions, **{sub.channel: sub for sub in subscriptions}}
+        client.offer(serialize({
+            "type": "subscriptions",
+            "channels": {
+                channel: {"max_rate": sub.max_rate, "mode": sub.mode, "deltas": sub.deltas}
+                for channel, sub in channels.items()
+            }
+        }), critical=True)
+        self.hub.subscribe(client, subscriptions)
+        return True
+
     async def notify_cameras(self, message: dict):
         """Notify only camera clients"""
-        dead_connections = []
-        for connection in self.camera_connections:
-            try:
-                await connection.send_json(message)
-            except:
-                dead_connections.append(connection)
-        
-        for conn in dead_connections:
-            self.camera_connections.remove(conn)
-    
+        self._notify("camera", message)
+
     async def notify_dashboards(self, message: dict):
         """Notify only dashboard clients"""
-        dead_connections = []
-        for connection in self.dashboard_connections:
-            try:
-                await connection.send_json(message)
-            except:
-                dead_connections.append(connection)
-        
-        for conn in dead_connections:
-            self.dashboard_connections.remove(conn)
+        self._notify("dashboard", message)
+
+    @staticmethod
+    def _percentiles(samples: deque) -> dict:
+        if not samples:
+            return {"p50": None, "p99": None, "max": None}
+        values = np.fromiter(samples, dtype=np.float64) * 1000
+        p50, p99 = np.percentile(values, [50, 99])
+        return {"p50": round(float(p50), 3), "p99": round(float(p99), 3), "max": round(float(values.max()), 3)}
+
+    def stats(self) -> dict:
+        clients: List[Client] = [client for by_socket in self.clients.values() for client in by_socket.values()]
+        return {
+            "connections": {client_type: len(by_socket) for client_type, by_socket in self.clients.items()},
+            "queued": sum(client.queue.qsize() for client in clients),
+            "max_queued": max((client.queue.qsize() for client in clients), default=0),
+            "broadcasts": self.broadcasts,
+            "dropped": self.dropped + sum(client.dropped for client in clients),
+            "evicted": self.evicted,
+            "policy": self.policy,
+            "delivery_latency_ms": self._percentiles(self.latencies),
+            "channels": self.hub.stats(),
+            "broadcast_ms": self._percentiles(self.broadcast_seconds),
+        }
+
+# Singleton instance
+manager = ConnectionManager()
@@ -0,0 +1,126 @@
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Model loaded once per worker process by _init_worker
+_worker_model = None
+
+# (shared memory block name, frame shape)
+FrameSpec = Tuple[str, Tuple[int, ...]]
+
+def _init_worker(threads: int, model_loader: Optional[Callable] = None):
+    """Process initializer: pin torch intra-op threads and load the model once."""
+    global _worker_model
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["MKL_NUM_THREADS"] = str(threads)
+    import torch
+    torch.set_num_threads(threads)
+
+    if model_loader is None:
+        from app.dependencies import get_model
+        model_loader = get_model
+    _worker_model = model_loader()
+
+def _model_names() -> dict:
+    return dict(_worker_model.names)
+
+def _infer_shared(specs: List[FrameSpec], conf: float) -> List[np.ndarray]:
+    """
+    Run the model on frames living in shared memory.
+
+    Returns one float32 array of shape (n, 6) per frame with columns
+    x1, y1, x2, y2, confidence, class_id.
+    """
+    blocks = [shared_memory.SharedMemory(name=name) for name, _ in specs]
+    try:
+        frames = [
+            np.ndarray(shape, dtype=np.uint8, buffer=block.buf)
+            for block, (_, shape) in zip(blocks, specs)
+        ]
+        results = _worker_model.predict(frames, conf=conf, verbose=False)
+        outputs = []
+        for result in results:
+            boxes = result.boxes
+            outputs.append(np.concatenate([
+                boxes.xyxy.cpu().numpy(),
+                boxes.conf.cpu().numpy()[:, None],
+                boxes.cls.cpu().numpy()[:, None],
+            ], axis=1).astype(np.float32))
+        # Drop every view on the shared buffers before closing them
+        del frames, results
+        return outputs
+    finally:
+        for block in blocks:
+            block.close()
+
+class InferencePool:
+    """
+    Pool of worker processes that each load the YOLO model once.
+
+    Frames are copied straight into shared memory blocks and only their names
+    travel over the pipe; results come back as compact box arrays. Torch
+    intra-op threads are split evenly across the workers so they don't
+    oversubscribe the CPU.
+
+    `model_loader` is a picklable (module-level) function each worker calls
+    to load its model; by default the configured model. Raises if the
+    workers can't start, e.g. when loading the model fails.
+    """
+
+    def __init__(self, workers: int, model_loader: Optional[Callable] = None):
+        self.workers = workers
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(threads, model_loader)
+        )
+        try:
+            self.names = self._executor.submit(_model_names).result()
+        except Exception:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        logger.info(f"Started {workers} inference workers with {threads} threads each")
+
+    @staticmethod
+    def _to_shared(array: np.ndarray) -> Tuple[shared_memory.SharedMemory, FrameSpec]:
+        block = shared_memory.SharedMemory(create=True, size=array.nbytes)
+        frame = np.ndarray(array.shape, dtype=np.uint8, buffer=block.buf)
+        frame[...] = array
+        del frame
+        return block, (block.name, array.shape)
+
+    def predict(self, arrays: List[np.ndarray], conf: float) -> List[np.ndarray]:
+        """Run a batch of uint8 BGR frames across the workers, preserving order."""
+        blocks, specs = [], []
+        try:
+            for array in arrays:
+                block, spec = self._to_shared(array)
+                blocks.append(block)
+                specs.append(spec)
+
+            # Split the batch into one contiguous chunk per worker
+            size = -(-len(specs) // self.workers)
+            futures = [
+                self._executor.submit(_infer_shared, specs[i:i + size], conf)
+                for i in range(0, len(specs), size)
+            ]
+            outputs = []
+            for future in futures:
+                outputs.extend(future.result())
+            return outputs
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,199 @@
+"""
+Shared fixtures. The app reads its settings and DB path at import time, so the
+environment is set up here before anything from app/ is imported: every run
+gets a fresh SQLite file and static/ tree in a temp dir, and SMTP points at a
+closed local port.
+"""
+import os
+import sys
+import tempfile
+
+WORKDIR = tempfile.mkdtemp(prefix="iot_api_tests_")
+
+os.environ.update({
+    "DB_PATH": os.path.join(WORKDIR, "test.db"),
+    "MODEL_PATH": os.path.join(WORKDIR, "missing.pt"),
+    "MAIL_USERNAME": "",
+    "MAIL_PASSWORD": "",
+    "MAIL_SERVER": "127.0.0.1",
+    "MAIL_PORT": "1",
+    "MAIL_STARTTLS": "false",
+    "MAIL_TIMEOUT": "1",
+    "ANNOTATION_MODE": "sync",
+    "RETENTION_INTERVAL": "0",
+    "ROLLUP_COMPACTION_INTERVAL": "0",
+    "LIVE_STATE_SYNC_INTERVAL": "0",
+    "BUS_BACKEND": "memory",
+    "BUS_SOCKET_PATH": os.path.join(WORKDIR, "bus.sock"),
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import io
+import json
+import threading
+
+import numpy as np
+import pytest
+from PIL import Image
+
+def pytest_sessionstart(session):
+    # app.main mounts ./static on import; the test modules import it after this
+    os.chdir(WORKDIR)
+    for directory in ("static/audio", "static/results", "static/frames"):
+        os.makedirs(directory, exist_ok=True)
+
+FIRE_COLOR = (230, 40, 20)
+PLAIN_COLOR = (40, 90, 160)
+
+class FakeBoxes:
+    """The slice of ultralytics' Boxes that FireDetectionService.extract_boxes reads."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __iter__(self):
+        for x1, y1, x2, y2, conf, cls in self.rows:
+            box = type("Box", (), {})()
+            box.xyxy = np.array([[x1, y1, x2, y2]], dtype=np.float32)
+            box.conf = np.array([conf], dtype=np.float32)
+            box.cls = np.array([cls], dtype=np.float32)
+            yield box
+
+class FakeResult:
+    names = {0: "fire", 1: "smoke"}
+
+    def __init__(self, rows):
+        self.boxes = FakeBoxes(rows)
+
+class FakeModel:
+    """
+    Stands in for the YOLO model: a frame whose pixels are mostly red has "fire"
+    in its centre, anything else has no detections. Records each batch size.
+    """
+
+    names = FakeResult.names
+
+    def __init__(self):
+        self.batches = []
+        self.delay = 0.0
+        self._lock = threading.Lock()
+
+    def predict(self, images, conf=None, verbose=False):
+        if self.delay:
+            import time
+            time.sleep(self.delay)
+        with self._lock:
+            self.batches.append(len(images))
+        results = []
+        for array in images:
+            height, width = array.shape[:2]
+            b, g, r = (float(array[..., channel].mean()) for channel in range(3))
+            rows = [(width * 0.25, height * 0.25, width * 0.75, height * 0.75, 0.9, 0)] if r > 150 and r > b + 50 else []
+            results.append(FakeResult(rows))
+        return results
+
+class FakeSocket:
+    """Stands in for a WebSocket: records what is sent; while `gate` is cleared every send blocks, like a slow consumer."""
+
+    def __init__(self):
+        self.received = []
+        self.closed_with = None
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        await self.gate.wait()
+        self.received.append(json.loads(text))
+
+    async def close(self, code=1000, reason=""):
+        self.closed_with = code
+
+async def settle():
+    """Let the sender tasks run until they block again."""
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+def image_bytes(color=PLAIN_COLOR, size=(320, 240), format="JPEG") -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format)
+    return buffer.getvalue()
+
+async def post_in_chunks(app, path, files, chunk_size=64 * 1024, content_length=True):
+    """
+    POST a multipart upload straight to the ASGI app in chunk_size pieces, the
+    way a client streams it; content_length=False leaves out that header.
+
+    Returns the response status, its decoded body (a list for NDJSON) and how
+    many body bytes the app pulled from the client.
+    """
+    import httpx
+    request = httpx.Request("POST", f"http://testserver{path}", files=files)
+    body = request.read()
+    headers = [
+        (key.lower().encode(), value.encode()) for key, value in request.headers.items()
+        if content_length or key.lower() != "content-length"
+    ]
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "client": ("test", 1), "server": ("testserver", 80), "headers": headers,
+    }
+    consumed = 0
+    status = None
+    ndjson = False
+    response = bytearray()
+
+    async def receive():
+        nonlocal consumed
+        if consumed == len(body) and body:
+            await asyncio.Event().wait()  # Sent everything; the client stays connected
+        chunk = body[consumed:consumed + chunk_size]
+        consumed += len(chunk)
+        return {"type": "http.request", "body": chunk, "more_body": consumed < len(body)}
+
+    async def send(message):
+        nonlocal status, ndjson
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            ndjson = (b"content-type", b"application/x-ndjson") in message["headers"]
+        elif message["type"] == "http.response.body":
+            response.extend(message.get("body", b""))
+
+    await app(scope, receive, send)
+    if ndjson:
+        return status, [json.loads(line) for line in response.splitlines()], consumed
+    return status, json.loads(response or b"null"), consumed
+
+@pytest.fixture(scope="session")
+def fake_model():
+    return FakeModel()
+
+@pytest.fixture(scope="session")
+def client(fake_model):
+    """TestClient running the app lifespan once per session, with the fake model behind the inference engine."""
+    from fastapi.testclient import TestClient
+    from app import dependencies
+    from app.config import get_settings
+    from app.inference import InferenceEngine
+    from app.main import app
+
+    dependencies._engine_instance = InferenceEngine(
+        fake_model, get_settings(), renderer=dependencies.get_annotation_renderer()
+    )
+    with TestClient(app) as test_client:
+        yield test_client
+
+@pytest.fixture
+def app_client(client):
+    """The session client with no fire incident open."""
+    from app.dependencies import get_incident_manager
+    client.portal.call(_clear_incident, get_incident_manager())
+    yield client
+    client.portal.call(_clear_incident, get_incident_manager())
+
+async def _clear_incident(incidents):
+    await incidents.clear()
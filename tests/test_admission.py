@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.admission import AdmissionController
+from app.dependencies import get_admission_controller, get_settings
+from app.schemas import SensorData
+
+def reading(temperature=20.0, smoke=5.0):
+    return SensorData(temperature=temperature, humidity=40.0, smoke_level=smoke)
+
+def controller(queue_fill=0.0, write_latency_ms=0.0, **overrides):
+    settings = get_settings().model_copy(update={
+        "ADMISSION_QUEUE_HIGH": 0.5, "ADMISSION_TARGET_LATENCY_MS": 100.0, "ADMISSION_REJECT_PRESSURE": 4.0,
+        "ADMISSION_CHANGE_THRESHOLD": 0.05, "ADMISSION_MIN_KEEP_SECONDS": 3600.0, **overrides
+    })
+    return AdmissionController(settings, SimpleNamespace(queue_fill=queue_fill, write_latency_ms=write_latency_ms))
+
+def test_everything_is_stored_below_the_limits():
+    admission = controller(queue_fill=0.25, write_latency_ms=90.0)
+
+    assert [admission.admit(reading(), False, False) for _ in range(5)] == ["stored"] * 5
+    assert admission.stats()["pressure"] == 0.9
+
+def test_routine_readings_are_sampled_evenly_under_pressure():
+    admission = controller(write_latency_ms=250.0)  # pressure 2.5
+
+    outcomes = [admission.admit(reading(), False, False) for _ in range(11)]
+
+    # The first reading has nothing to compare with; then about 1 in 2.5 is kept
+    assert outcomes[0] == "stored"
+    assert outcomes[1:].count("stored") == 4
+    assert "stored" not in outcomes[1:3]
+
+def test_risky_changed_and_periodic_readings_are_always_stored():
+    admission = controller(queue_fill=1.5)  # pressure 3
+    admission.admit(reading(), False, False)
+
+    assert admission.admit(reading(temperature=90.0), True, False) == "stored"
+    assert admission.admit(reading(temperature=30.0), False, False) == "stored"  # moved > 5% from 90
+    assert admission.admit(reading(temperature=30.1), False, False) == "sampled"
+
+    periodic = controller(queue_fill=1.5, ADMISSION_MIN_KEEP_SECONDS=0.0)
+    assert [periodic.admit(reading(), False, False) for _ in range(3)] == ["stored"] * 3
+
+def test_routine_readings_are_rejected_only_outside_an_incident():
+    admission = controller(queue_fill=2.5)  # pressure 5
+
+    assert admission.admit(reading(), False, False) == "rejected"
+    assert admission.admit(reading(), False, True) != "rejected"
+    assert admission.admit(reading(temperature=90.0), True, False) == "stored"
+    # Batches are sampled, never turned away
+    assert admission.admit_batch([reading(), reading(temperature=90.0)], [False, True])[1] is True
+    assert admission.stats()["rejected"] == 1
+
+@pytest.fixture
+def overloaded(monkeypatch):
+    monkeypatch.setattr(get_admission_controller(), "pressure", lambda: 10.0)
+
+def test_rejected_reading_does_not_become_the_current_value(app_client, overloaded):
+    before = app_client.get("/sensors").json()
+
+    response = app_client.post("/sensors", json={"temperature": 21.5, "humidity": 12.345, "smoke_level": 3.0})
+
+    assert response.status_code == 503 and response.headers["Retry-After"] == "1"
+    assert app_client.get("/sensors").json() == before
@@ -0,0 +1,55 @@
+import os
+
+from PIL import Image
+
+from conftest import FIRE_COLOR, image_bytes
+from app.annotations import FRAMES_DIR, RESULTS_DIR, RESULTS_URL_PREFIX, AnnotationRenderer
+from app.config import get_settings
+from app.ingest import decode_frame
+from app.schemas import Box
+
+BOX = Box(x1=80, y1=60, x2=240, y2=180, confidence=0.9, class_id=0, class_name="fire")
+
+def renderer(mode, **overrides):
+    return AnnotationRenderer(get_settings().model_copy(update={"ANNOTATION_MODE": mode, **overrides}))
+
+def name_of(url):
+    assert url.startswith(RESULTS_URL_PREFIX)
+    return url[len(RESULTS_URL_PREFIX):]
+
+def test_background_render_is_waited_for_on_first_get():
+    r = renderer("background")
+    data = image_bytes()
+    url = r.submit("cam.jpg", decode_frame(data, 640), [BOX], data)
+
+    path = r.ensure(name_of(url), lambda: None)
+    r.shutdown()
+
+    assert path == os.path.join(RESULTS_DIR, name_of(url))
+    assert Image.open(path).size == (320, 240)
+
+def test_lazy_mode_keeps_the_upload_and_draws_on_first_access():
+    r = renderer("lazy")
+    data = image_bytes(FIRE_COLOR)
+    url = r.submit("lazy.jpg", decode_frame(data, 640), [BOX], data)
+    name = name_of(url)
+    r._executor.shutdown(wait=True)
+
+    assert not os.path.exists(os.path.join(RESULTS_DIR, name))
+    assert os.path.exists(os.path.join(FRAMES_DIR, os.path.splitext(name)[0]))
+
+    loads = []
+    path = r.ensure(name, lambda: loads.append(1) or [BOX])
+
+    assert os.path.exists(path) and loads == [1]
+    # Boxes are in original coordinates; the red outline lands on the box edge
+    assert Image.open(path).convert("RGB").getpixel((80, 120))[0] > 200
+
+def test_empty_results_skip_rendering_when_disabled():
+    r = renderer("sync", ANNOTATE_EMPTY=False)
+    data = image_bytes()
+
+    assert r.submit("empty.jpg", decode_frame(data, 640), [], data) is None
+
+def test_unknown_images_are_not_found(app_client):
+    assert app_client.get("/results/does-not-exist.jpg").status_code == 404
@@ -0,0 +1,80 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+import torch
+
+from conftest import WORKDIR, image_bytes
+from app import backends
+from app.backends import compare_models, load_model, model_artifact_path
+from app.config import get_settings
+
+class ScriptedModel:
+    """Returns fixed (x1, y1, x2, y2, conf, cls) rows per image file name."""
+
+    def __init__(self, rows_by_name):
+        self.rows_by_name = rows_by_name
+
+    def predict(self, path, conf=None, verbose=False):
+        rows = torch.tensor(self.rows_by_name.get(os.path.basename(path), []), dtype=torch.float32).reshape(-1, 6)
+        return [SimpleNamespace(boxes=SimpleNamespace(xyxy=rows[:, :4], conf=rows[:, 4], cls=rows[:, 5]))]
+
+@pytest.mark.parametrize("backend, int8, expected", [
+    ("torch", False, "models/best.pt"),
+    ("torch", True, "models/best.pt"),
+    ("onnx", False, "models/best.onnx"),
+    ("onnx", True, "models/best_int8.onnx"),
+    ("openvino", False, "models/best_openvino_model"),
+    ("openvino", True, "models/best_int8_openvino_model"),
+])
+def test_artifact_path_per_backend(backend, int8, expected):
+    assert model_artifact_path("models/best.pt", backend, int8) == expected
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        model_artifact_path("models/best.pt", "tensorrt")
+
+def test_load_model_picks_the_exported_artifact_and_falls_back_to_torch(monkeypatch, tmp_path):
+    loaded = []
+    monkeypatch.setattr(backends, "YOLO", lambda path, task=None: loaded.append(path))
+    weights = tmp_path / "best.pt"
+    weights.write_bytes(b"weights")
+    settings = get_settings().model_copy(update={"MODEL_PATH": str(weights), "MODEL_BACKEND": "onnx", "MODEL_INT8": True})
+
+    load_model(settings)
+    (tmp_path / "best_int8.onnx").write_bytes(b"onnx")
+    load_model(settings)
+
+    assert loaded == [str(weights), str(tmp_path / "best_int8.onnx")]
+
+def test_compare_models_matches_boxes_by_class_and_iou():
+    images_dir = os.path.join(WORKDIR, "compare")
+    os.makedirs(images_dir, exist_ok=True)
+    for name in ("a.jpg", "b.png"):
+        with open(os.path.join(images_dir, name), "wb") as f:
+            f.write(image_bytes())
+    with open(os.path.join(images_dir, "notes.txt"), "w") as f:
+        f.write("not an image")
+
+    reference = ScriptedModel({
+        "a.jpg": [(0, 0, 100, 100, 0.9, 0), (200, 200, 300, 300, 0.8, 1)],
+        "b.png": [(10, 10, 50, 50, 0.7, 0)],
+    })
+    candidate = ScriptedModel({
+        # Same box slightly shifted, and the second box with the wrong class
+        "a.jpg": [(2, 2, 100, 100, 0.85, 0), (200, 200, 300, 300, 0.8, 0)],
+        # Matched, plus a spurious box
+        "b.png": [(10, 10, 50, 50, 0.6, 0), (400, 400, 450, 450, 0.5, 1)],
+    })
+
+    report = compare_models(reference, candidate, images_dir, conf=0.1)
+
+    assert report["images"] == 2
+    assert (report["reference_boxes"], report["candidate_boxes"], report["matched"]) == (3, 4, 2)
+    assert report["recall"] == pytest.approx(2 / 3)
+    assert report["precision"] == pytest.approx(2 / 4)
+    assert report["mean_confidence_delta"] == pytest.approx((0.05 + 0.1) / 2)
+
+def test_compare_models_needs_images(tmp_path):
+    with pytest.raises(ValueError):
+        compare_models(ScriptedModel({}), ScriptedModel({}), str(tmp_path), conf=0.1)
@@ -0,0 +1,107 @@
+import random
+import types
+
+import pytest
+
+from conftest import image_bytes
+from app import cache as cache_module
+from app.cache import DetectionCache, Fingerprint, hash_bands
+from app.schemas import Box, DetectionResult
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = types.SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(cache_module, "time", types.SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+def fingerprint(digest, phash, size=(640, 480)):
+    return Fingerprint(digest=digest, phash=phash, width=size[0], height=size[1])
+
+def result(x1=100.0, name="cached.jpg"):
+    box = Box(x1=x1, y1=100, x2=x1 + 200, y2=300, confidence=0.9, class_id=0, class_name="fire")
+    return DetectionResult(filename=name, detections=[box], message="Found 1 objects.", annotated_image_url="/results/a.jpg")
+
+def test_exact_hit_is_renamed():
+    cache = DetectionCache("ns")
+    cache.put(fingerprint("a", 0xF0F0), result())
+
+    hit = cache.get(fingerprint("a", 0xF0F0), "new.jpg")
+
+    assert hit.filename == "new.jpg" and hit.detections == result().detections
+    assert cache.stats()["hits"] == 1
+
+def test_near_hit_within_max_distance():
+    cache = DetectionCache("ns", max_distance=4)
+    cache.put(fingerprint("a", 0xFFFF), result())
+
+    assert cache.get(fingerprint("b", 0xFFFF ^ 0b1011), "near.jpg") is not None
+    assert cache.get(fingerprint("c", 0xFFFF ^ 0b11111), "far.jpg") is None
+    assert cache.stats()["near_hits"] == 1
+
+def test_near_hit_boxes_are_scaled_to_the_new_frame():
+    cache = DetectionCache("ns")
+    cache.put(fingerprint("a", 0xFFFF, (640, 480)), result())
+
+    hit = cache.get(fingerprint("b", 0xFFFE, (1280, 960)), "big.jpg")
+
+    box = hit.detections[0]
+    assert (box.x1, box.y1, box.x2, box.y2) == (200, 200, 600, 600)
+
+def test_expired_candidate_does_not_hide_a_fresh_one(clock):
+    cache = DetectionCache("ns", ttl_seconds=10)
+    cache.put(fingerprint("old", 0xFF00), result(x1=1))
+    clock.now += 8
+    cache.put(fingerprint("fresh", 0xFF01), result(x1=2))
+    clock.now += 5  # "old" is expired now, "fresh" is not
+
+    hit = cache.get(fingerprint("query", 0xFF03), "q.jpg")
+
+    assert hit is not None and hit.detections[0].x1 == 2
+    assert cache.stats()["entries"] == 1
+
+def test_exact_only_lookups_ignore_near_duplicates():
+    cache = DetectionCache("ns")
+    cache.put(fingerprint("a", 0), result())
+
+    assert cache.get(fingerprint("b", 0), "uniform.jpg", near=False) is None
+    assert cache.get(fingerprint("a", 0), "same.jpg", near=False) is not None
+
+def test_band_index_follows_evictions():
+    cache = DetectionCache("ns", max_entries=3)
+    for i in range(10):
+        cache.put(fingerprint(str(i), random.getrandbits(64)), result())
+
+    indexed = set().union(*cache._bands.values())
+    assert indexed == set(cache._entries)
+    assert cache.stats()["evictions"] == 7
+
+def test_hashes_within_distance_share_a_band():
+    rng = random.Random(7)
+    for _ in range(500):
+        phash = rng.getrandbits(64)
+        other = phash
+        for bit in rng.sample(range(64), 4):
+            other ^= 1 << bit
+        assert any(a == b for a, b in zip(hash_bands(phash, 5), hash_bands(other, 5)))
+
+def test_exact_only_submissions_still_run_near_duplicates():
+    import asyncio
+    from conftest import FakeModel
+    from app.config import get_settings
+    from app.inference import InferenceEngine
+
+    model = FakeModel()
+    engine = InferenceEngine(model, get_settings(), cache=DetectionCache("ns"))
+    plain, slightly_different = image_bytes(), image_bytes((40, 90, 161))
+
+    async def run():
+        try:
+            for data, near in ((plain, True), (slightly_different, False), (plain, False)):
+                frame, fp = engine.prepare(data)
+                await engine.submit(frame, "f.jpg", fp, annotate=False, near_match=near)
+        finally:
+            engine.stop()
+
+    asyncio.run(run())
+    # The near-duplicate went to the model; the byte-identical repeat did not
+    assert sum(model.batches) == 2
@@ -0,0 +1,85 @@
+import asyncio
+import time
+
+from app.camera_stream import CameraStream
+from app.dependencies import get_settings
+from app.schemas import DetectionResult
+from app.websockets import ConnectionManager
+
+from conftest import FakeSocket, settle
+
+class FakeEngine:
+    """Records the frames it is given and when; while `gate` is cleared each submit blocks, like a busy model."""
+
+    model = None
+
+    def __init__(self):
+        self.frames = []
+        self.started = []
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    def prepare(self, data):
+        return data, None
+
+    async def submit(self, frame, filename, fingerprint, source=None, near_match=True):
+        self.frames.append(frame)
+        self.started.append(time.monotonic())
+        await self.gate.wait()
+        return DetectionResult(filename=filename, detections=[], message="No fire detected")
+
+async def open_stream(max_fps):
+    settings = get_settings().model_copy(update={"CAMERA_MAX_FPS": max_fps, "CAMERA_RECORD_EMPTY": False})
+    manager = ConnectionManager(settings)
+    socket = FakeSocket()
+    client = await manager.connect(socket, "camera")
+    engine = FakeEngine()
+    stream = CameraStream(client, "cam1", engine, settings)
+    stream.start()
+    return stream, engine, socket
+
+async def wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+    return predicate()
+
+def test_latest_frame_wins_while_inference_is_busy():
+    async def scenario():
+        stream, engine, socket = await open_stream(0)
+        engine.gate.clear()
+        stream.push(b"frame1")
+        assert await wait_until(lambda: engine.frames == [b"frame1"])
+
+        for n in range(2, 6):
+            stream.push(f"frame{n}".encode())
+        engine.gate.set()
+        assert await wait_until(lambda: len(socket.received) == 2)
+        await stream.stop()
+
+        # frame2-4 were replaced while frame1 ran
+        assert engine.frames == [b"frame1", b"frame5"]
+        assert (stream.received, stream.processed, stream.dropped) == (5, 2, 3)
+        assert [message["frames_dropped"] for message in socket.received] == [3, 3]
+        assert all(message["camera_id"] == "cam1" for message in socket.received)
+
+    asyncio.run(scenario())
+
+def test_frame_rate_cap_holds_and_skipped_frames_are_counted():
+    async def scenario():
+        stream, engine, socket = await open_stream(20)  # At most one frame every 50 ms
+        started = time.monotonic()
+        while time.monotonic() - started < 0.4:
+            stream.push(b"frame")
+            await asyncio.sleep(0.005)
+        await settle()
+        await stream.stop()
+
+        gaps = [later - earlier for earlier, later in zip(engine.started, engine.started[1:])]
+        assert 4 <= stream.processed <= 9
+        assert min(gaps) >= 0.045
+        # Every frame was processed or dropped, bar the one in hand at stop() and the one waiting
+        assert stream.received - stream.processed - stream.dropped in (0, 1, 2)
+        assert stream.dropped > stream.processed
+
+    asyncio.run(scenario())
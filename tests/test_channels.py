@@ -0,0 +1,116 @@
+import asyncio
+import json
+
+import pytest
+
+from app.channels import Subscription, parse_subscriptions
+from app.dependencies import get_settings
+from app.websockets import ConnectionManager
+
+from conftest import FakeSocket, settle
+
+def test_parse_subscriptions_list_and_object_forms():
+    subscriptions = parse_subscriptions(
+        {"channels": ["sensors", "detections"], "max_rate": 50, "mode": "summary"}, default_rate=1.0, max_rate=10.0
+    )
+    assert subscriptions == [Subscription("sensors", 10.0, "summary"), Subscription("detections", 10.0, "summary")]
+
+    subscriptions = parse_subscriptions(
+        {"channels": {"sensors": {"max_rate": 2, "deltas": False}, "status": {}}, "mode": "latest"}, default_rate=1.0, max_rate=10.0
+    )
+    assert subscriptions == [Subscription("sensors", 2.0, "latest", False), Subscription("status", 1.0, "latest")]
+
+@pytest.mark.parametrize("request_body, error", [
+    ({"channels": []}, "non-empty"),
+    ({"channels": ["weather"]}, "Unknown channel"),
+    ({"channels": {"sensors": 5}}, "must be an object"),
+    ({"channels": ["sensors"], "max_rate": "fast"}, "max_rate must be a number"),
+    ({"channels": ["sensors"], "max_rate": 0}, "max_rate must be positive"),
+    ({"channels": ["sensors"], "mode": "median"}, "mode must be one of"),
+])
+def test_parse_subscriptions_errors(request_body, error):
+    with pytest.raises(ValueError, match=error):
+        parse_subscriptions(request_body, default_rate=1.0, max_rate=10.0)
+
+def reading(temperature, humidity=40.0, smoke=5.0, fire_risk=False):
+    return {
+        "type": "sensor_reading",
+        "data": {"temperature": temperature, "humidity": humidity, "smoke_level": smoke},
+        "fire_risk": fire_risk,
+    }
+
+async def subscribed(**options):
+    manager = ConnectionManager(get_settings().model_copy(update={"WS_MAX_UPDATE_RATE": 10.0}))
+    socket = FakeSocket()
+    client = await manager.connect(socket, "dashboard")
+    assert manager.handle_control(client, json.dumps({"type": "subscribe", "channels": ["sensors"], **options}))
+    await settle()
+    assert socket.received.pop(0)["type"] == "subscriptions"
+    return manager, socket
+
+def updates(socket):
+    return [message for message in socket.received if message["type"] == "channel_update"]
+
+def test_updates_are_throttled_and_sent_as_deltas():
+    async def scenario():
+        manager, socket = await subscribed(max_rate=10)
+
+        for temperature in (20.0, 21.0, 22.0, 23.0):
+            manager.broadcast("dashboard", reading(temperature))
+        await settle()
+        # The first update goes out at once, the rest wait for the end of the 100ms window
+        assert [(u["kind"], u["data"]["temperature"]) for u in updates(socket)] == [("snapshot", 20.0)]
+
+        await asyncio.sleep(0.15)
+        await settle()
+        first, second = updates(socket)
+        assert second["kind"] == "delta" and second["data"] == {"temperature": 23.0}
+        assert second["seq"] == first["seq"] + 1
+        # Subscribed dashboards don't also get the raw messages
+        assert all(message["type"] == "channel_update" for message in socket.received)
+        assert manager.hub.stats()["groups"][0]["coalesced"] >= 1
+
+    asyncio.run(scenario())
+
+def test_fire_risk_and_alerts_skip_the_throttle():
+    async def scenario():
+        manager, socket = await subscribed(max_rate=1)
+        manager.broadcast("dashboard", reading(20.0))
+        manager.broadcast("dashboard", reading(80.0, fire_risk=True))
+        manager.broadcast("dashboard", {"type": "fire_confirmed", "message": "Fire!"})
+        await settle()
+
+        assert [u["data"].get("temperature") for u in updates(socket)] == [20.0, 80.0]
+        assert socket.received[-1]["type"] == "fire_confirmed"
+
+    asyncio.run(scenario())
+
+def test_summary_mode_reports_the_window():
+    async def scenario():
+        manager, socket = await subscribed(max_rate=10, mode="summary", deltas=False)
+        manager.broadcast("dashboard", reading(20.0))
+        for temperature in (30.0, 10.0, 26.0):
+            manager.broadcast("dashboard", reading(temperature))
+        await asyncio.sleep(0.15)
+        await settle()
+
+        summary = updates(socket)[-1]["data"]
+        assert summary["count"] == 3
+        assert summary["temperature"] == {"min": 10.0, "max": 30.0, "avg": 22.0}
+        assert summary["latest"]["temperature"] == 26.0
+
+    asyncio.run(scenario())
+
+def test_invalid_subscription_gets_an_error_reply():
+    async def scenario():
+        manager = ConnectionManager(get_settings())
+        socket = FakeSocket()
+        client = await manager.connect(socket, "dashboard")
+        assert manager.handle_control(client, json.dumps({"type": "subscribe", "channels": ["weather"]}))
+        assert not manager.handle_control(client, "ping")
+        await settle()
+
+        assert socket.received[0]["type"] == "subscription_error"
+        assert not client.subscriptions
+
+    asyncio.run(scenario())
@@ -0,0 +1,52 @@
+import uuid
+
+from conftest import image_bytes
+
+def poll(client, etag=None):
+    return client.get("/dashboard", headers={"If-None-Match": etag} if etag else {})
+
+def test_unchanged_dashboard_answers_304(app_client):
+    first = poll(app_client)
+    etag = first.headers["ETag"]
+
+    again = poll(app_client, etag)
+
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["ETag"] == etag
+    assert poll(app_client, f'"stale", {etag}').status_code == 304
+    assert poll(app_client, '"stale"').status_code == 200
+
+def test_accepted_reading_changes_the_etag_before_it_is_flushed(app_client):
+    etag = poll(app_client).headers["ETag"]
+
+    app_client.post("/sensors", json={"temperature": 21.5, "humidity": 44.0, "smoke_level": 3.0})
+
+    response = poll(app_client, etag)
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()["sensors"]["temperature"] == 21.5
+
+def test_detection_bumps_the_version_and_the_etag(app_client):
+    version = app_client.get("/state/version").json()["version"]
+    etag = poll(app_client).headers["ETag"]
+
+    name = f"{uuid.uuid4().hex}.jpg"
+    app_client.post("/predict", files={"file": (name, image_bytes(), "image/jpeg")})
+
+    assert app_client.get("/state/version").json()["version"] == version + 1
+    response = poll(app_client, etag)
+    assert response.status_code == 200
+    assert response.json()["last_photo_url"].endswith(".jpg")
+
+def test_threshold_change_moves_the_etag(app_client):
+    before = app_client.get("/thresholds").json()
+    etag = poll(app_client).headers["ETag"]
+    try:
+        app_client.post("/thresholds", json={"temperature_max": before["temperature_max"] + 1})
+
+        response = poll(app_client, etag)
+        assert response.status_code == 200
+        assert response.json()["thresholds"]["temperature_max"] == before["temperature_max"] + 1
+    finally:
+        app_client.post("/thresholds", json=before)
@@ -0,0 +1,69 @@
+import uuid
+
+from sqlalchemy import inspect
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.config import get_settings
+from app.database import SQLITE_PRAGMAS, async_engine, engine as db_engine
+from app.live_state import live_state, read_version
+from app.models import DetectionEvent
+from app.schemas import Box, DetectionResult
+from app.services import FireDetectionService
+
+# What SQLite reports back for each pragma value the app sets
+EXPECTED_PRAGMAS = {
+    "auto_vacuum": 2,  # INCREMENTAL, on a database created by the app
+    "journal_mode": "wal",
+    "synchronous": 1,
+    "busy_timeout": SQLITE_PRAGMAS["busy_timeout"],
+    "cache_size": SQLITE_PRAGMAS["cache_size"],
+    "mmap_size": SQLITE_PRAGMAS["mmap_size"],
+    "temp_store": 2,
+}
+
+def test_every_connection_gets_the_pragmas(client):
+    with db_engine.connect() as conn:
+        applied = {name: conn.exec_driver_sql(f"PRAGMA {name}").scalar() for name in EXPECTED_PRAGMAS}
+    assert applied == EXPECTED_PRAGMAS
+
+def test_async_connections_get_the_pragmas(client):
+    async def read():
+        async with async_engine.connect() as conn:
+            return {name: (await conn.exec_driver_sql(f"PRAGMA {name}")).scalar() for name in EXPECTED_PRAGMAS}
+
+    assert client.portal.call(read) == EXPECTED_PRAGMAS
+
+def test_time_ordered_tables_are_indexed(client):
+    inspector = inspect(db_engine)
+    for table, column in (
+        ("sensorreading", "timestamp"),
+        ("detectionevent", "timestamp"),
+        ("systemlog", "timestamp"),
+        ("thresholdsmodel", "updated_at"),
+    ):
+        assert [column] in [index["column_names"] for index in inspector.get_indexes(table)], table
+
+def test_async_event_write_commits_bumps_the_version_and_updates_live_state(client):
+    name = f"{uuid.uuid4().hex}.jpg"
+    result = DetectionResult(
+        filename=name,
+        detections=[Box(x1=1, y1=2, x2=3, y2=4, confidence=0.8, class_id=1, class_name="smoke")],
+        message="No fire detected",
+        annotated_image_url=f"/results/{name}"
+    )
+    with Session(db_engine) as session:
+        before = read_version(session)
+
+    async def record():
+        async with AsyncSession(async_engine) as session:
+            return await FireDetectionService(None, get_settings(), session).record_event_async(result)
+
+    client.portal.call(record)
+
+    with Session(db_engine) as session:
+        event = session.exec(select(DetectionEvent).where(DetectionEvent.filename == name)).one()
+        assert read_version(session) == before + 1
+    assert (event.object_count, event.has_fire, event.boxes[0]["class_name"]) == (1, False, "smoke")
+    assert live_state.version == before + 1
+    assert client.get("/media/latest").json()["latest_photo"] == f"/results/{name}"
@@ -0,0 +1,85 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta, timezone
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from app.dependencies import get_settings
+
+def seed(client, start):
+    """Seven readings in a window of their own; two share a timestamp so the id breaks the tie."""
+    offsets = [0, 10, 20, 20, 30, 40, 50]
+    readings = [
+        {"temperature": 20.0 + i, "humidity": 40.0, "smoke_level": 5.0, "timestamp": (start + timedelta(seconds=s)).isoformat()}
+        for i, s in enumerate(offsets)
+    ]
+    client.post("/sensors/batch", json=readings)
+    return {"from": start.isoformat(), "to": (start + timedelta(hours=1)).isoformat()}
+
+def test_keyset_pages_cover_the_window_once_newest_first(app_client):
+    window = seed(app_client, datetime(2003, 4, 5, 6, 0))
+
+    rows, cursor = [], None
+    while True:
+        params = {**window, "limit": 3, **({"cursor": cursor} if cursor else {})}
+        response = app_client.get("/history/sensors", params=params)
+        page = response.json()
+        assert len(page) <= 3
+        rows.extend(page)
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+
+    keys = [(row["timestamp"], row["id"]) for row in rows]
+    assert len(keys) == 7 and len(set(keys)) == 7
+    assert keys == sorted(keys, reverse=True)
+
+def utc_z(timestamp):
+    """A naive local time as the same instant in UTC with a Z suffix."""
+    return timestamp.astimezone(timezone.utc).replace(tzinfo=None).isoformat() + "Z"
+
+def test_timezone_aware_bounds_match_local_timestamps(app_client):
+    start = datetime(2003, 8, 9, 10, 0)
+    seed(app_client, start)
+    window = {"from": utc_z(start), "to": utc_z(start + timedelta(hours=1))}
+
+    rows = app_client.get("/history/sensors", params={**window, "limit": 10}).json()
+    exported = app_client.get("/export/sensors", params=window).text.splitlines()
+
+    assert len(rows) == 7 and len(exported) == 7
+    assert app_client.get("/history/sensors/aggregate", params=window).status_code == 200
+
+def test_recent_timezone_aware_from_is_served(app_client):
+    app_client.post("/sensors", json={"temperature": 20.0, "humidity": 40.0, "smoke_level": 5.0})
+
+    response = app_client.get("/history/sensors", params={"from": utc_z(datetime.now() - timedelta(minutes=1))})
+
+    assert response.status_code == 200
+    assert len(response.json()) >= 1
+
+def test_invalid_cursor_is_rejected(app_client):
+    assert app_client.get("/history/sensors", params={"cursor": "not-a-cursor"}).status_code == 400
+
+def test_exports_stream_in_batches_oldest_first(app_client, monkeypatch):
+    monkeypatch.setattr(get_settings(), "EXPORT_BATCH_SIZE", 2)
+    window = seed(app_client, datetime(2003, 6, 7, 8, 0))
+
+    lines = app_client.get("/export/sensors", params={**window, "format": "ndjson"}).text.splitlines()
+    ndjson = [json.loads(line) for line in lines]
+    assert len(ndjson) == 7
+    assert [(r["timestamp"], r["id"]) for r in ndjson] == sorted((r["timestamp"], r["id"]) for r in ndjson)
+
+    rows = list(csv.DictReader(io.StringIO(app_client.get("/export/sensors", params={**window, "format": "csv"}).text)))
+    assert [int(r["id"]) for r in rows] == [r["id"] for r in ndjson]
+
+    arrow = pa.ipc.open_stream(app_client.get("/export/sensors", params={**window, "format": "arrow"}).content).read_all()
+    assert arrow.column("id").to_pylist() == [r["id"] for r in ndjson]
+    assert arrow.schema.field("timestamp").type == pa.timestamp("us")
+
+    parquet = pq.read_table(io.BytesIO(app_client.get("/export/sensors", params={**window, "format": "parquet"}).content))
+    assert parquet.column("temperature").to_pylist() == [r["temperature"] for r in ndjson]
+
+def test_unknown_export_format(app_client):
+    assert app_client.get("/export/sensors", params={"format": "xml"}).status_code == 400
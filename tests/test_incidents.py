@@ -0,0 +1,152 @@
+import asyncio
+
+import pytest
+
+from app.dependencies import get_settings
+from app.incidents import IncidentManager
+from app.pubsub import MemoryBus
+from app.schemas import SensorData
+from app.thresholds import thresholds_cache
+
+def reading(temperature, smoke=5.0):
+    return SensorData(temperature=temperature, humidity=40.0, smoke_level=smoke)
+
+def levels():
+    """Readings over the threshold, between it and the clear level, and below the clear level."""
+    limit = thresholds_cache.current.temperature_max
+    return reading(limit + 10), reading(limit * 0.95), reading(limit * 0.8)
+
+def worker(clear_seconds=0.0):
+    """An incident manager with a bus of its own, like a worker whose bus messages haven't arrived yet."""
+    settings = get_settings().model_copy(update={"INCIDENT_CLEAR_MARGIN": 0.1, "INCIDENT_CLEAR_SECONDS": clear_seconds})
+    incidents = IncidentManager(settings, MemoryBus())
+    incidents.load()
+    return incidents
+
+@pytest.fixture
+def run(client):
+    """Runs a scenario and leaves no incident open for the tests after it."""
+    def run_scenario(scenario):
+        async def wrapped():
+            try:
+                await scenario()
+            finally:
+                await worker().clear()
+        asyncio.run(wrapped())
+    return run_scenario
+
+def test_hysteresis_around_the_clear_level(run):
+    async def scenario():
+        incidents = worker()
+        over, hovering, below = levels()
+
+        assert await incidents.observe(hovering, False) is None
+        assert await incidents.observe(over, True) == "opened"
+        assert await incidents.observe(hovering, False) is None
+        assert await incidents.observe(below, False) == "clearing"
+        assert await incidents.observe(hovering, False) == "resumed"
+        assert incidents.current["state"] == "alarm"
+        assert await incidents.observe(below, False) == "clearing"
+        assert await incidents.observe(below, False) == "cleared"
+        assert not incidents.active
+
+    run(scenario)
+
+def test_clearing_waits_for_the_clear_period(run):
+    async def scenario():
+        incidents = worker(clear_seconds=3600.0)
+        over, _, below = levels()
+        await incidents.observe(over, True)
+        await incidents.observe(below, False)
+
+        assert await incidents.observe(below, False) is None
+        assert incidents.current["state"] == "clearing"
+        await incidents.clear(by="operator", note="drill")
+        assert not incidents.active
+
+    run(scenario)
+
+def test_a_visually_confirmed_fire_needs_an_acknowledgement_to_clear(run):
+    async def scenario():
+        incidents = worker()
+        _, _, below = levels()
+
+        assert await incidents.confirm("/results/fire.png") is True
+        assert await incidents.confirm("/results/fire2.png") is False
+        await incidents.observe(below, False)
+        assert await incidents.observe(below, False) is None
+
+        incident = await incidents.acknowledge(by="operator")
+        assert incident["state"] == "clearing" and incident["previous"] == "acknowledged"
+        assert incident["acknowledged_by"] == "operator" and incident["image_url"] == "/results/fire.png"
+        assert await incidents.observe(below, False) == "cleared"
+
+    run(scenario)
+
+def test_two_workers_seeing_the_same_fire_open_one_incident(run):
+    async def scenario():
+        first, second = worker(), worker()
+        over, _, _ = levels()
+
+        outcomes = await asyncio.gather(first.observe(over, True), second.observe(over, True))
+
+        assert outcomes.count("opened") == 1 and outcomes.count(None) == 1
+        assert first.current["id"] == second.current["id"]
+        assert first.conflicts + second.conflicts == 1
+        # The loser carries on from the winner's incident
+        loser = first if outcomes[0] is None else second
+        assert (await loser.acknowledge(by="operator"))["state"] == "acknowledged"
+
+    run(scenario)
+
+def test_stale_worker_adopts_the_stored_incident(run):
+    async def scenario():
+        first, second = worker(), worker()
+        over, _, _ = levels()
+        await first.observe(over, True)
+        await first.clear()
+
+        # second never heard of that incident; its transition must not be based on a stale version
+        assert await second.observe(over, True) == "opened"
+        assert second.conflicts == 1
+        assert second.current["id"] != first.current.get("id")
+
+    run(scenario)
+
+def test_peak_is_tracked_without_a_transition(run):
+    async def scenario():
+        incidents = worker()
+        over, _, _ = levels()
+        await incidents.observe(over, True)
+        version = incidents.current["version"]
+
+        await incidents.observe(reading(over.temperature + 5, smoke=400.0), True)
+        await incidents.observe(reading(over.temperature + 1), True)
+
+        incident = incidents.current
+        assert incident["version"] == version
+        assert incident["peak"] == {"temperature": over.temperature + 5, "smoke_level": 400.0}
+
+    run(scenario)
+
+def test_an_open_incident_survives_a_restart(run):
+    async def scenario():
+        over, _, _ = levels()
+        before = worker()
+        await before.observe(over, True)
+
+        after = worker()
+        assert after.active and after.current["id"] == before.current["id"]
+
+    run(scenario)
+
+def test_incident_endpoints(app_client):
+    over, _, _ = levels()
+    opened = app_client.post("/sensors", json=over.model_dump()).json()
+    assert opened["incident"] == "alarm" and opened["camera_alert"]
+
+    acknowledged = app_client.post("/incident/acknowledge", json={"by": "operator", "note": "on it"}).json()
+    assert acknowledged["state"] == "acknowledged" and acknowledged["note"] == "on it"
+    assert app_client.get("/incident").json()["incident"]["id"] == acknowledged["id"]
+
+    assert app_client.post("/incident/clear").json()["state"] == "normal"
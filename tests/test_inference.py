@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+from conftest import FIRE_COLOR, FakeModel, image_bytes
+from app.config import get_settings
+from app.inference import InferenceEngine
+from app.ingest import decode_frame
+
+def make_engine(model, **overrides):
+    settings = get_settings().model_copy(update={"INFERENCE_MAX_WAIT_MS": 50.0, **overrides})
+    return InferenceEngine(model, settings)
+
+async def submit_all(engine, images):
+    frames = [decode_frame(data, 640) for data in images]
+    try:
+        return await asyncio.gather(*(engine.submit(frame, f"{i}.jpg", annotate=False) for i, frame in enumerate(frames)))
+    finally:
+        engine.stop()
+
+def test_concurrent_requests_share_one_forward_pass():
+    model = FakeModel()
+    results = asyncio.run(submit_all(make_engine(model), [image_bytes()] * 6))
+
+    assert model.batches == [6]
+    assert [r.filename for r in results] == [f"{i}.jpg" for i in range(6)]
+
+def test_batches_are_capped_at_max_batch_size():
+    model = FakeModel()
+    asyncio.run(submit_all(make_engine(model, INFERENCE_MAX_BATCH_SIZE=4), [image_bytes()] * 10))
+
+    assert model.batches == [4, 4, 2]
+
+def test_each_request_gets_its_own_result():
+    model = FakeModel()
+    images = [image_bytes(), image_bytes(FIRE_COLOR), image_bytes()]
+    results = asyncio.run(submit_all(make_engine(model), images))
+
+    assert [len(r.detections) for r in results] == [0, 1, 0]
+    # Boxes are mapped back to the original 320x240 upload
+    box = results[1].detections[0]
+    assert (box.x1, box.y1, box.x2, box.y2) == pytest.approx((80, 60, 240, 180))
+
+def test_model_errors_fail_every_request_of_the_batch():
+    model = FakeModel()
+    model.predict = lambda *args, **kwargs: (_ for _ in ()).throw(RuntimeError("boom"))
+
+    with pytest.raises(RuntimeError, match="boom"):
+        asyncio.run(submit_all(make_engine(model), [image_bytes()] * 3))
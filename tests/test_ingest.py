@@ -0,0 +1,98 @@
+import io
+import uuid
+
+import numpy as np
+from PIL import Image
+from PIL.JpegImagePlugin import JpegImageFile
+
+from conftest import FIRE_COLOR, PLAIN_COLOR, image_bytes, post_in_chunks
+from app.config import get_settings
+from app.ingest import EXIF_ORIENTATION, decode_frame
+from app.main import app
+from app.schemas import Box
+
+CHUNK = 16 * 1024
+
+def noisy_jpeg(size=(800, 600)) -> bytes:
+    """A JPEG that doesn't compress much, so its size is predictable."""
+    pixels = np.random.default_rng(0).integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, "JPEG", quality=95)
+    return buffer.getvalue()
+
+def rotated_jpeg() -> bytes:
+    """A 4000x3000 JPEG, red in its stored top-left quadrant, tagged EXIF orientation 6 (rotate 90° clockwise)."""
+    image = Image.new("RGB", (4000, 3000), PLAIN_COLOR)
+    image.paste(FIRE_COLOR, (0, 0, 2000, 1500))
+    exif = Image.Exif()
+    exif[EXIF_ORIENTATION] = 6
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", exif=exif)
+    return buffer.getvalue()
+
+def test_declared_oversized_upload_is_refused_before_reading(app_client, monkeypatch):
+    monkeypatch.setattr(get_settings(), "INGEST_MAX_UPLOAD_BYTES", 1000)
+    files = {"file": ("big.jpg", noisy_jpeg(), "image/jpeg")}
+
+    status, body, consumed = app_client.portal.call(post_in_chunks, app, "/predict", files, CHUNK)
+
+    assert status == 413
+    assert body["detail"] == "Upload exceeds 1000 bytes"
+    assert consumed == 0
+
+def test_upload_without_content_length_stops_at_the_limit(app_client, monkeypatch):
+    limit = 4 * CHUNK
+    monkeypatch.setattr(get_settings(), "INGEST_MAX_UPLOAD_BYTES", limit)
+    data = noisy_jpeg()
+    assert len(data) > 4 * limit
+    files = {"file": ("big.jpg", data, "image/jpeg")}
+
+    status, body, consumed = app_client.portal.call(post_in_chunks, app, "/predict", files, CHUNK, False)
+
+    assert status == 413
+    assert body["detail"] == f"Upload exceeds {limit} bytes"
+    assert limit < consumed <= limit + CHUNK
+
+def test_upload_under_the_limit_is_analysed(app_client):
+    name = f"{uuid.uuid4().hex}.jpg"
+    files = {"file": (name, image_bytes(FIRE_COLOR), "image/jpeg")}
+
+    status, body, _ = app_client.portal.call(post_in_chunks, app, "/predict", files, CHUNK, False)
+
+    assert status == 200
+    assert body["filename"] == name
+    assert [d["class_name"] for d in body["detections"]] == ["fire"]
+
+def test_large_rotated_jpeg_is_draft_decoded_and_turned_upright(monkeypatch):
+    drafts = []
+    draft = JpegImageFile.draft
+
+    def record_draft(self, mode, size):
+        drafts.append(size)
+        return draft(self, mode, size)
+
+    monkeypatch.setattr(JpegImageFile, "draft", record_draft)
+
+    frame = decode_frame(rotated_jpeg(), 640)
+
+    assert drafts == [(640, 480)]
+    # Reported size is the upright original; the array is upright and model-sized
+    assert (frame.width, frame.height) == (3000, 4000)
+    assert frame.array.shape == (640, 480, 3)
+    assert frame.array.flags["C_CONTIGUOUS"]
+    assert frame.scale == 3000 / 480
+
+    # The red quadrant is now on the top right; BGR, so red is channel 2
+    red = (frame.array[..., 2] > 150) & (frame.array[..., 0] < 100)
+    ys, xs = np.nonzero(red)
+    box = Box(x1=xs.min(), y1=ys.min(), x2=xs.max() + 1, y2=ys.max() + 1, confidence=0.9, class_id=0, class_name="fire")
+    (mapped,) = frame.to_original([box])
+    tolerance = 2 * frame.scale
+    assert abs(mapped.x1 - 1500) <= tolerance and abs(mapped.x2 - 3000) <= tolerance
+    assert abs(mapped.y1 - 0) <= tolerance and abs(mapped.y2 - 2000) <= tolerance
+
+def test_small_image_keeps_full_resolution():
+    frame = decode_frame(image_bytes(size=(320, 240)), 640)
+
+    assert frame.array.shape == (240, 320, 3)
+    assert frame.scale == 1
@@ -0,0 +1,187 @@
+import asyncio
+import email
+import smtplib
+from datetime import datetime, timedelta
+from email.header import decode_header, make_header
+
+import pytest
+from sqlmodel import Session, delete
+
+from app.database import engine as db_engine
+from app.dependencies import get_alert_outbox, get_settings
+from app.models import OutboxMessage
+from app.notifications import AlertOutbox
+
+class SMTPStub:
+    """Stands in for the mail server: records every email and can refuse or drop connections."""
+
+    def __init__(self):
+        self.sent = []
+        self.connections = []
+        self.refuse = False
+        self.drop_new = False  # New connections hang up on the first command
+
+    def __call__(self, host, port, timeout=None):
+        if self.refuse:
+            raise ConnectionRefusedError("Connection refused")
+        connection = _Connection(self, dropped=self.drop_new)
+        self.connections.append(connection)
+        return connection
+
+    def subjects(self):
+        return [str(make_header(decode_header(message["Subject"]))) for message in self.sent]
+
+    def body(self, index=-1):
+        return self.sent[index].get_payload()[0].get_payload(decode=True).decode()
+
+class _Connection:
+    def __init__(self, server, dropped=False):
+        self.server = server
+        self.dropped = dropped
+
+    def starttls(self):
+        pass
+
+    def login(self, username, password):
+        pass
+
+    def sendmail(self, sender, recipients, message):
+        if self.dropped:
+            raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+        self.server.sent.append(email.message_from_string(message))
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def smtp(monkeypatch):
+    stub = SMTPStub()
+    monkeypatch.setattr(smtplib, "SMTP", stub)
+    return stub
+
+@pytest.fixture
+def make_outbox(client):
+    """Builds outboxes over an empty outbox table, with the app's own worker paused meanwhile."""
+    app_outbox = get_alert_outbox()
+    client.portal.call(app_outbox.stop)
+    with Session(db_engine) as session:
+        session.exec(delete(OutboxMessage))
+        session.commit()
+
+    def make(**overrides):
+        settings = get_settings().model_copy(update={
+            "ALERT_MIN_INTERVAL": 0.0, "ALERT_DEDUP_SECONDS": 900.0, "ALERT_RETRY_BASE_SECONDS": 5.0,
+            "ALERT_RETRY_MAX_SECONDS": 600.0, "ALERT_MAX_ATTEMPTS": 8, **overrides
+        })
+        return AlertOutbox(settings)
+
+    yield make
+    client.portal.call(app_outbox.start)
+
+def enqueue(outbox, subject, incident_key=None):
+    return asyncio.run(outbox.enqueue(subject, f"Body of {subject}", incident_key))
+
+def message(message_id) -> OutboxMessage:
+    with Session(db_engine) as session:
+        return session.get(OutboxMessage, message_id)
+
+def make_due(message_id):
+    with Session(db_engine) as session:
+        row = session.get(OutboxMessage, message_id)
+        row.next_attempt_at = datetime.now() - timedelta(seconds=1)
+        session.commit()
+
+def test_repeats_within_the_dedup_window_are_folded_in(make_outbox, smtp):
+    outbox = make_outbox()
+
+    first = enqueue(outbox, "Fire", "incident-a")
+    repeat = enqueue(outbox, "Fire again", "incident-a")
+    other = enqueue(outbox, "Other fire", "incident-b")
+
+    assert first["status"] == "queued" and other["status"] == "queued"
+    assert repeat == {"id": first["id"], "status": "deduplicated"}
+    assert message(first["id"]).duplicates == 1
+
+    outbox.deliver()
+    assert len(smtp.sent) == 1
+    assert "(Repeated 1 more time since.)" in smtp.body()
+
+def test_alerts_between_sends_are_coalesced_into_one_digest(make_outbox, smtp):
+    outbox = make_outbox(ALERT_MIN_INTERVAL=60.0)
+
+    enqueue(outbox, "Alert 1")
+    assert outbox.deliver() == 60.0
+    enqueue(outbox, "Alert 2")
+    enqueue(outbox, "Alert 3")
+
+    # Still inside the interval: nothing goes out
+    assert outbox.deliver() > 0
+    assert smtp.subjects() == ["Alert 1"]
+
+    outbox._last_sent -= 60.0
+    outbox.deliver()
+
+    assert len(smtp.sent) == 2
+    assert smtp.subjects()[1].startswith("🔥 2 fire alerts")
+    assert "Alert 2" in smtp.body() and "Alert 3" in smtp.body()
+    assert outbox.stats()["sent"] == 3 and outbox.stats()["pending"] == 0
+
+def test_failed_sends_back_off_then_fail(make_outbox, smtp):
+    outbox = make_outbox(ALERT_RETRY_BASE_SECONDS=5.0, ALERT_RETRY_MAX_SECONDS=12.0, ALERT_MAX_ATTEMPTS=4)
+    smtp.refuse = True
+    queued = enqueue(outbox, "Unlucky", "incident-c")
+
+    delays = []
+    for attempt in range(1, 4):
+        before = datetime.now()
+        outbox.deliver()
+        row = message(queued["id"])
+        assert row.status == "pending" and row.attempts == attempt
+        assert "ConnectionRefusedError" in row.last_error
+        delays.append(round((row.next_attempt_at - before).total_seconds()))
+        # Not due yet: another pass leaves it alone
+        outbox.deliver()
+        assert message(queued["id"]).attempts == attempt
+        make_due(queued["id"])
+
+    assert delays == [5, 10, 12]
+    outbox.deliver()
+    row = message(queued["id"])
+    assert row.status == "failed" and row.attempts == 4
+    assert outbox.stats()["failed_sends"] == 4
+    # A failed message doesn't swallow later alerts of the same incident
+    assert enqueue(outbox, "Unlucky again", "incident-c")["status"] == "queued"
+
+def test_a_dropped_connection_is_reopened(make_outbox, smtp):
+    outbox = make_outbox()
+
+    enqueue(outbox, "First")
+    outbox.deliver()
+    assert outbox.client.connects == 1 and outbox.client.connected
+
+    # The server hung up while the connection sat idle in the pool
+    smtp.connections[0].dropped = True
+    enqueue(outbox, "Second")
+    outbox.deliver()
+
+    assert smtp.subjects() == ["First", "Second"]
+    assert outbox.client.connects == 2 and outbox.stats()["failed_sends"] == 0
+
+def test_a_fresh_connection_that_drops_is_an_error(make_outbox, smtp):
+    outbox = make_outbox()
+    smtp.drop_new = True
+
+    queued = enqueue(outbox, "Never arrives")
+    outbox.deliver()
+
+    row = message(queued["id"])
+    assert row.attempts == 1 and "SMTPServerDisconnected" in row.last_error
+    assert not outbox.client.connected
+
+def test_outbox_endpoint(app_client):
+    stats = app_client.get("/alerts/outbox").json()
+
+    assert {"pending", "sent", "failed", "smtp_connected"} <= stats.keys()
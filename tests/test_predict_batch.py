@@ -0,0 +1,126 @@
+import asyncio
+import json
+import time
+import uuid
+
+import httpx
+from sqlmodel import Session, select
+
+from conftest import FIRE_COLOR, image_bytes, post_in_chunks
+from app.config import get_settings
+from app.database import engine as db_engine
+from app.dependencies import get_incident_manager
+from app.live_state import read_version
+from app.main import app
+from app.models import DetectionEvent
+from test_ingest import CHUNK, noisy_jpeg
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return predicate()
+
+def events_for(names):
+    with Session(db_engine) as session:
+        return session.exec(select(DetectionEvent).where(DetectionEvent.filename.in_(names))).all()
+
+def upload(names, color):
+    return [("files", (name, image_bytes(color), "image/jpeg")) for name in names]
+
+async def post_then_disconnect(files):
+    """Drive the ASGI app directly and hang up right after the first NDJSON line."""
+    request = httpx.Request("POST", "http://testserver/predict/batch", files=files)
+    body = request.read()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": "/predict/batch", "raw_path": b"/predict/batch", "query_string": b"",
+        "root_path": "", "client": ("test", 1), "server": ("testserver", 80),
+        "headers": [(key.lower().encode(), value.encode()) for key, value in request.headers.items()],
+    }
+    gone = asyncio.Event()
+    requested = False
+    lines = []
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await gone.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            if gone.is_set():
+                raise OSError("client went away")
+            lines.append(message["body"])
+            gone.set()
+
+    try:
+        await app(scope, receive, send)
+    except OSError:
+        pass
+    return lines
+
+def test_results_stream_back_and_each_is_recorded(app_client):
+    names = [f"{uuid.uuid4().hex}.jpg" for _ in range(3)]
+    response = app_client.post("/predict/batch", files=upload(names, (40, 90, 160)))
+
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(line["index"] for line in lines) == [0, 1, 2]
+    assert {line["filename"] for line in lines} == set(names)
+    assert len(events_for(names)) == 3
+
+def test_batch_events_are_written_in_one_transaction(app_client):
+    names = [f"{uuid.uuid4().hex}.jpg" for _ in range(3)]
+    with Session(db_engine) as session:
+        before = read_version(session)
+
+    response = app_client.post("/predict/batch", files=upload(names, (40, 90, 160)))
+
+    assert response.status_code == 200
+    with Session(db_engine) as session:
+        assert read_version(session) == before + 1
+    assert len(events_for(names)) == 3
+
+def test_events_and_fire_alert_survive_a_client_disconnect(app_client):
+    names = [f"{uuid.uuid4().hex}.jpg" for _ in range(3)]
+
+    lines = app_client.portal.call(post_then_disconnect, upload(names, FIRE_COLOR))
+
+    assert len(lines) == 1
+    assert wait_for(lambda: len(events_for(names)) == 3)
+    assert all(event.has_fire for event in events_for(names))
+    incident = get_incident_manager().current
+    assert incident["state"] == "alarm" and incident["confirmed"]
+
+def test_oversized_file_in_batch_is_rejected_while_streaming(app_client, monkeypatch):
+    small = image_bytes((40, 90, 160))
+    big = noisy_jpeg()
+    limit = len(small) * 2
+    monkeypatch.setattr(get_settings(), "INGEST_MAX_UPLOAD_BYTES", limit)
+    files = [("files", ("a.jpg", small, "image/jpeg")), ("files", ("b.jpg", big, "image/jpeg")), ("files", ("c.jpg", big, "image/jpeg"))]
+    body_size = len(httpx.Request("POST", "http://testserver/", files=files).read())
+
+    status, body, consumed = app_client.portal.call(post_in_chunks, app, "/predict/batch", files, CHUNK)
+
+    assert status == 413
+    assert body["detail"] == f"A file in the upload exceeds {limit} bytes"
+    # Nothing read past the chunk that took b.jpg over the cap (headers add a few hundred bytes)
+    assert consumed <= len(small) + limit + CHUNK + 1024
+    assert consumed < body_size
+
+def test_batch_limit_applies_per_file(app_client, monkeypatch):
+    names = [f"{uuid.uuid4().hex}.jpg" for _ in range(3)]
+    files = upload(names, (40, 90, 160))
+    monkeypatch.setattr(get_settings(), "INGEST_MAX_UPLOAD_BYTES", max(len(part[1][1]) for part in files) + 10)
+
+    status, lines, _ = app_client.portal.call(post_in_chunks, app, "/predict/batch", files, CHUNK, False)
+
+    assert status == 200
+    assert sorted(line["index"] for line in lines) == [0, 1, 2]
+    assert wait_for(lambda: len(events_for(names)) == 3)
@@ -0,0 +1,70 @@
+import asyncio
+import os
+import tempfile
+
+from app.pubsub import MemoryBus, UnixSocketBus
+
+async def eventually(predicate, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "condition not reached"
+        await asyncio.sleep(0.02)
+
+def socket_path():
+    # AF_UNIX paths are limited to ~100 bytes, so not under pytest's tmp_path
+    return os.path.join(tempfile.mkdtemp(prefix="bus"), "bus.sock")
+
+def test_memory_bus_delivers_locally():
+    bus = MemoryBus()
+    received = []
+    bus.subscribe("alerts", received.append)
+
+    bus.publish("alerts", {"n": 1})
+    bus.set("incident", {"state": "alarm"})
+
+    assert received == [{"n": 1}] and bus.get("incident") == {"state": "alarm"}
+
+def test_state_and_broadcasts_survive_the_broker_going_away():
+    async def scenario():
+        path = socket_path()
+        buses = [UnixSocketBus(path) for _ in range(3)]
+        received = {id(bus): [] for bus in buses}
+        for bus in buses:
+            bus.subscribe("ws:dashboard", received[id(bus)].append)
+            await bus.start()
+
+        broker, *peers = buses
+        assert broker.role == "broker" and [peer.role for peer in peers] == ["peer", "peer"]
+
+        broker.set("incident", {"state": "alarm", "id": "a1"})
+        await eventually(lambda: all(peer.get("incident") == {"state": "alarm", "id": "a1"} for peer in peers))
+        peers[0].publish("ws:dashboard", {"n": 1})
+        await eventually(lambda: received[id(broker)] == [{"n": 1}] and received[id(peers[1])] == [{"n": 1}])
+
+        await broker.stop()
+        # One of the peers takes over; the other reconnects to it
+        await eventually(lambda: sorted(peer.role or "" for peer in peers) == ["broker", "peer"])
+        new_broker = next(peer for peer in peers if peer.role == "broker")
+        survivor = next(peer for peer in peers if peer.role == "peer")
+        await eventually(lambda: new_broker.stats()["peers"] == 1)
+        assert survivor.elections == 1
+
+        # State set before the failover is still there, and new writes and broadcasts flow both ways
+        assert survivor.get("incident") == {"state": "alarm", "id": "a1"}
+        survivor.set("incident", {"state": "acknowledged", "id": "a1"})
+        await eventually(lambda: new_broker.get("incident") == {"state": "acknowledged", "id": "a1"})
+        new_broker.publish("ws:dashboard", {"n": 2})
+        survivor.publish("ws:dashboard", {"n": 3})
+        await eventually(lambda: {"n": 2} in received[id(survivor)] and {"n": 3} in received[id(new_broker)])
+        assert {"n": 2} not in received[id(broker)]
+
+        # A worker joining later gets the current state in its snapshot
+        late = UnixSocketBus(path)
+        await late.start()
+        assert late.role == "peer" and late.get("incident") == {"state": "acknowledged", "id": "a1"}
+
+        for bus in (late, survivor, new_broker):
+            await bus.stop()
+        assert not os.path.exists(path)
+
+    asyncio.run(scenario())
@@ -0,0 +1,119 @@
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import pyarrow.parquet as pq
+from sqlmodel import Session, func, select
+
+from app.annotations import FRAMES_DIR, RESULTS_DIR
+from app.database import engine as db_engine
+from app.dependencies import get_settings
+from app.models import DetectionEvent, SensorReading, SystemLog
+from app.retention import ORPHAN_GRACE_SECONDS, RetentionManager
+
+def manager(tmp_path, **overrides):
+    """A retention manager with every policy off except the overrides."""
+    settings = get_settings().model_copy(update={
+        "RETENTION_ARCHIVE_DIR": str(tmp_path / "archive"),
+        "RETENTION_BATCH_SIZE": 2,
+        "RETENTION_SENSOR_DAYS": 0,
+        "RETENTION_DETECTION_DAYS": 0,
+        "RETENTION_LOG_DAYS": 0,
+        "RETENTION_RESULTS_DAYS": 0,
+        "RETENTION_AUDIO_DAYS": 0,
+        **overrides
+    })
+    return RetentionManager(settings)
+
+def old_file(path):
+    with open(path, "wb") as f:
+        f.write(b"x" * 100)
+    past = time.time() - ORPHAN_GRACE_SECONDS - 60
+    os.utime(path, (past, past))
+    return path
+
+def test_expired_rows_are_archived_then_deleted(client, tmp_path):
+    start = datetime(1990, 1, 1)
+    with Session(db_engine) as session:
+        for i in range(5):
+            session.add(SensorReading(temperature=20.0 + i, humidity=40.0, smoke_level=5.0, timestamp=start + timedelta(minutes=i)))
+        session.commit()
+    # Only readings before 1995 are past the age limit
+    days = (datetime.now() - datetime(1995, 1, 1)).days
+
+    report = manager(tmp_path, RETENTION_SENSOR_DAYS=days).run()
+
+    table = report["tables"]["sensorreading"]
+    assert table["archived"] == 5 and table["deleted"] == 5
+    archived = pq.read_table(table["archive"])
+    assert archived.column("temperature").to_pylist() == [20.0, 21.0, 22.0, 23.0, 24.0]
+    with Session(db_engine) as session:
+        assert session.exec(select(func.count()).select_from(SensorReading).where(SensorReading.timestamp < datetime(1995, 1, 1))).one() == 0
+    assert not [name for name in os.listdir(tmp_path / "archive") if name.endswith(".tmp")]
+
+def test_orphans_are_removed_but_referenced_media_is_kept(client, tmp_path):
+    legacy, current, orphan = (uuid.uuid4().hex for _ in range(3))
+    for name in (legacy, current, orphan):
+        old_file(os.path.join(RESULTS_DIR, f"{name}.png"))
+        old_file(os.path.join(FRAMES_DIR, name))
+    with Session(db_engine) as session:
+        session.add(DetectionEvent(filename="a.jpg", annotated_image_url=f"/static/results/{legacy}.png", object_count=0, has_fire=False))
+        session.add(DetectionEvent(filename="b.jpg", annotated_image_url=f"/results/{current}.png", object_count=0, has_fire=False))
+        session.commit()
+
+    report = manager(tmp_path).run()
+
+    assert report["orphans"]["files"] >= 2
+    for name in (legacy, current):
+        assert os.path.exists(os.path.join(RESULTS_DIR, f"{name}.png"))
+        assert os.path.exists(os.path.join(FRAMES_DIR, name))
+    assert not os.path.exists(os.path.join(RESULTS_DIR, f"{orphan}.png"))
+    assert not os.path.exists(os.path.join(FRAMES_DIR, orphan))
+
+def test_recent_unreferenced_media_is_left_alone(client, tmp_path):
+    path = os.path.join(RESULTS_DIR, f"{uuid.uuid4().hex}.png")
+    with open(path, "wb") as f:
+        f.write(b"x")
+
+    manager(tmp_path).run()
+
+    assert os.path.exists(path)
+
+def test_retention_endpoints(app_client):
+    report = app_client.post("/retention/run").json()
+
+    assert "bytes_reclaimed" in report
+    assert app_client.get("/retention").json()["finished_at"] == report["finished_at"]
+
+def test_pruned_readings_are_no_longer_served_from_memory(app_client, tmp_path):
+    for i in range(6):
+        app_client.post("/sensors", json={"temperature": 20.0 + i, "humidity": 40.0, "smoke_level": 5.0})
+    newest = [row["id"] for row in app_client.get("/history/sensors", params={"limit": 5}).json()]
+    assert len(newest) == 5
+    version = app_client.get("/state/version").json()["version"]
+    etag = app_client.get("/dashboard").headers["ETag"]
+
+    manager(tmp_path, RETENTION_SENSOR_MAX_ROWS=2).run()
+
+    rows = app_client.get("/history/sensors", params={"limit": 5}).json()
+    assert [row["id"] for row in rows] == newest[:2]
+    assert app_client.get("/state/version").json()["version"] > version
+    assert app_client.get("/dashboard", headers={"If-None-Match": etag}).status_code == 200
+
+def test_freed_pages_are_returned_without_a_full_vacuum(client, tmp_path, caplog):
+    with Session(db_engine) as session:
+        for i in range(300):
+            session.add(SystemLog(status="NORMAL", details="x" * 4000, timestamp=datetime(1991, 1, 1) + timedelta(seconds=i)))
+        session.commit()
+    days = (datetime.now() - datetime(1995, 1, 1)).days
+
+    with caplog.at_level("INFO", logger="app.retention"):
+        report = manager(tmp_path, RETENTION_LOG_DAYS=days).run()
+
+    assert report["tables"]["systemlog"]["deleted"] >= 300
+    assert report["db_bytes_reclaimed"] > 300 * 4000
+    assert "Converting" not in caplog.text
+    with db_engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 2
+        assert conn.exec_driver_sql("PRAGMA freelist_count").scalar() == 0
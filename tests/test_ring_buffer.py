@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta
+
+from app.ring_buffer import RecentRows, SeriesRing, from_micros, to_micros
+
+START = datetime(2026, 5, 1, 12, 0)
+
+def rows(first_id, count, start=START):
+    return [
+        {"id": first_id + i, "timestamp": start + timedelta(seconds=first_id + i), "temperature": float(first_id + i),
+         "humidity": 40.0, "smoke_level": 5.0}
+        for i in range(count)
+    ]
+
+def ids(result):
+    return [row["id"] for row in result]
+
+def ring(capacity=4):
+    return SeriesRing(("temperature", "humidity", "smoke_level"), capacity)
+
+def test_micros_round_trip():
+    moment = datetime(2026, 5, 1, 12, 0, 0, 123456)
+    assert from_micros(to_micros(moment)) == moment
+
+def test_unseeded_ring_never_answers():
+    buffer = ring()
+    buffer.append(rows(1, 2))
+    assert buffer.latest(1) is None and buffer.window(START, None, 10) is None
+
+def test_complete_ring_answers_until_it_wraps():
+    buffer = ring()
+    buffer.seed(rows(1, 2), complete=True)
+
+    assert ids(buffer.latest(10)) == [2, 1]
+    buffer.append(rows(3, 3))
+    # Row 1 was evicted: 4 rows are known, asking for more needs the DB
+    assert ids(buffer.latest(4)) == [5, 4, 3, 2]
+    assert buffer.latest(5) is None
+    assert buffer.latest(2)[0] == {
+        "id": 5, "temperature": 5.0, "humidity": 40.0, "smoke_level": 5.0, "timestamp": (START + timedelta(seconds=5)).isoformat()
+    }
+
+def test_window_across_the_wrap_point():
+    buffer = ring()
+    buffer.seed([], complete=True)
+    buffer.append(rows(1, 7))  # physical order is now rotated
+
+    assert ids(buffer.window(START + timedelta(seconds=5), START + timedelta(seconds=6), 10)) == [6, 5]
+    assert ids(buffer.window(START + timedelta(seconds=5), None, 1)) == [7]
+    # Reaches back past the evicted rows
+    assert buffer.window(START + timedelta(seconds=3), None, 10) is None
+
+def test_out_of_order_rows_move_the_boundary():
+    buffer = ring(capacity=10)
+    buffer.seed(rows(1, 5), complete=True)
+    buffer.append(rows(2, 1, start=START - timedelta(seconds=1)))  # a backfilled row older than the newest
+
+    assert not buffer.complete
+    assert buffer.latest(2) is not None
+    assert buffer.window(START, None, 10) is None
+
+def test_invalidate_trusts_only_new_rows():
+    buffer = ring(capacity=10)
+    buffer.seed(rows(1, 3), complete=True)
+    buffer.invalidate()
+
+    assert buffer.latest(1) is None
+    buffer.append(rows(4, 2))
+    assert ids(buffer.latest(2)) == [5, 4]
+    assert buffer.latest(3) is None
+
+def test_recent_rows():
+    recent = RecentRows(3)
+    assert recent.latest(1) is None
+    recent.seed([{"id": 1}], complete=True)
+    recent.append([{"id": 2}, {"id": 3}])
+
+    assert ids(recent.latest(5)) == [3, 2, 1]
+    recent.append([{"id": 4}])
+    assert ids(recent.latest(3)) == [4, 3, 2] and recent.latest(4) is None
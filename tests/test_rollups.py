@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlmodel import Session, select
+
+from app.database import engine as db_engine
+from app.dependencies import get_settings
+from app.models import SensorRollup
+from app.rollups import RollupCompactor, lttb, query_rollups, rebuild_rollups
+
+def post_readings(client, start, values):
+    readings = [
+        {"temperature": value, "humidity": 40.0, "smoke_level": 5.0, "timestamp": (start + timedelta(seconds=10 * i)).isoformat()}
+        for i, value in enumerate(values)
+    ]
+    assert client.post("/sensors/batch", json=readings).json()["stored"] == len(values)
+
+def test_lttb_keeps_endpoints_and_spikes():
+    x = np.arange(1000, dtype=float)
+    y = np.zeros(1000)
+    y[437] = 50.0
+
+    indices = lttb(x, y, 20)
+
+    assert len(indices) == 20 and indices[0] == 0 and indices[-1] == 999
+    assert list(indices) == sorted(indices) and 437 in indices
+    assert len(lttb(x, y, 2000)) == 1000
+
+def test_rollups_are_maintained_on_ingest(app_client):
+    start = datetime(2001, 3, 4, 10, 0)
+    # 12 readings 10s apart: two 1m buckets of 6
+    post_readings(app_client, start, [float(v) for v in range(12)])
+
+    body = app_client.get(
+        "/history/sensors/aggregate",
+        params={"bucket": "1m", "from": start.isoformat(), "to": (start + timedelta(hours=1)).isoformat()}
+    ).json()
+
+    assert [b["count"] for b in body] == [6, 6]
+    assert body[0]["temperature"] == {"min": 0.0, "max": 5.0, "avg": 2.5}
+    assert body[1]["temperature"] == {"min": 6.0, "max": 11.0, "avg": 8.5}
+    hourly = app_client.get(
+        "/history/sensors/aggregate", params={"bucket": "1h", "from": start.isoformat(), "to": (start + timedelta(hours=1)).isoformat()}
+    ).json()
+    assert hourly[0]["count"] == 12 and hourly[0]["temperature"]["max"] == 11.0
+
+def test_rebuild_matches_incremental_rollups(app_client):
+    start = datetime(2001, 5, 6, 8, 0)
+    end = start + timedelta(days=1)
+    post_readings(app_client, start, [20.0, 25.0, 21.0, 40.0, 22.0, 23.0, 30.0])
+
+    with Session(db_engine) as session:
+        incremental = {b: query_rollups(session, b, start, end, 100) for b in ("1m", "1h", "1d")}
+        for bucket in ("1m", "1h", "1d"):
+            rebuild_rollups(session, bucket, start, end)
+        session.commit()
+        rebuilt = {b: query_rollups(session, b, start, end, 100) for b in ("1m", "1h", "1d")}
+
+    assert rebuilt == incremental
+
+def test_aggregate_downsamples_to_points_and_validates(app_client):
+    start = datetime(2001, 7, 8, 0, 0)
+    readings = [
+        {"temperature": 20.0 + (30.0 if i == 17 else 0.0), "humidity": 40.0, "smoke_level": 5.0,
+         "timestamp": (start + timedelta(minutes=i)).isoformat()}
+        for i in range(60)
+    ]
+    app_client.post("/sensors/batch", json=readings)
+    params = {"bucket": "1m", "from": start.isoformat(), "to": (start + timedelta(hours=1)).isoformat()}
+
+    body = app_client.get("/history/sensors/aggregate", params={**params, "points": 10}).json()
+
+    assert len(body) == 10
+    assert max(b["temperature"]["max"] for b in body) == 50.0
+    assert app_client.get("/history/sensors/aggregate", params={**params, "bucket": "5m"}).status_code == 400
+    assert app_client.get("/history/sensors/aggregate", params={**params, "metric": "pressure"}).status_code == 400
+
+def test_compaction_drops_expired_fine_buckets_only(app_client):
+    start = datetime(2002, 1, 2, 3, 0)
+    post_readings(app_client, start, [20.0, 21.0])
+
+    settings = get_settings().model_copy(update={"ROLLUP_1M_RETENTION_DAYS": 7, "ROLLUP_1H_RETENTION_DAYS": 0})
+    assert RollupCompactor(settings).compact() >= 1
+
+    with Session(db_engine) as session:
+        buckets = session.exec(
+            select(SensorRollup.bucket).where(SensorRollup.bucket_start >= start, SensorRollup.bucket_start < start + timedelta(hours=1))
+        ).all()
+    assert sorted(buckets) == ["1h"]
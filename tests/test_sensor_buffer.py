@@ -0,0 +1,78 @@
+import asyncio
+import random
+from datetime import datetime
+
+from sqlmodel import Session, func, select
+
+from app.database import engine as db_engine
+from app.dependencies import get_settings
+from app.models import SensorReading
+from app.sensor_buffer import SensorWriteBuffer
+
+def marker():
+    return round(random.uniform(3000, 4000), 6)
+
+def stored(humidity):
+    with Session(db_engine) as session:
+        return session.exec(select(func.count()).select_from(SensorReading).where(SensorReading.humidity == humidity)).one()
+
+def rows(humidity, count):
+    now = datetime.now()
+    return [{"temperature": 20.0, "humidity": humidity, "smoke_level": 5.0, "timestamp": now} for _ in range(count)]
+
+def make_buffer(mode, **overrides):
+    settings = get_settings().model_copy(update={"SENSOR_DURABILITY": mode, **overrides})
+    return SensorWriteBuffer(settings)
+
+def test_group_commit_coalesces_concurrent_writes(client):
+    humidity = marker()
+    buffer = make_buffer("group", SENSOR_FLUSH_BATCH_SIZE=100, SENSOR_FLUSH_INTERVAL_MS=50)
+
+    async def scenario():
+        buffer.start()
+        await asyncio.gather(*(buffer.write(rows(humidity, 2)) for _ in range(10)))
+        # group mode only returns once the rows are committed
+        assert stored(humidity) == 20
+        await buffer.stop()
+
+    asyncio.run(scenario())
+    stats = buffer.stats()
+    assert stats["rows_written"] == 20 and stats["flushes"] == 1
+    assert stats["write_latency_ms"] > 0
+
+def test_async_mode_returns_before_commit_and_stop_flushes(client):
+    humidity = marker()
+    buffer = make_buffer("async", SENSOR_FLUSH_BATCH_SIZE=1000, SENSOR_FLUSH_INTERVAL_MS=60000)
+
+    async def scenario():
+        buffer.start()
+        await buffer.write(rows(humidity, 3))
+        assert stored(humidity) == 0
+        assert buffer.queue_fill > 0
+        await buffer.stop()
+
+    asyncio.run(scenario())
+    assert stored(humidity) == 3
+
+def test_sync_mode_commits_each_write(client):
+    humidity = marker()
+    buffer = make_buffer("sync")
+
+    async def scenario():
+        buffer.start()
+        await buffer.write(rows(humidity, 1))
+        assert stored(humidity) == 1
+        await buffer.write(rows(humidity, 1))
+
+    asyncio.run(scenario())
+    assert stored(humidity) == 2 and buffer.stats()["flushes"] == 2
+
+def test_batch_readings_without_timestamp_share_one_time(app_client):
+    humidity = round(random.uniform(1000, 2000), 6)
+    readings = [{"temperature": 20.0, "humidity": humidity, "smoke_level": 5.0} for _ in range(4)]
+    body = app_client.post("/sensors/batch", json=readings).json()
+
+    assert body["stored"] == 4
+    with Session(db_engine) as session:
+        times = session.exec(select(SensorReading.timestamp).where(SensorReading.humidity == humidity)).all()
+    assert len(set(times)) == 1
@@ -0,0 +1,58 @@
+import json
+import random
+
+from sqlmodel import Session, func, select
+
+from app.database import engine as db_engine
+from app.models import SensorReading
+
+def marker():
+    """A humidity value no other test uses, to find the rows a test wrote."""
+    return round(random.uniform(1000, 2000), 6)
+
+def stored(humidity):
+    with Session(db_engine) as session:
+        return session.exec(select(func.count()).select_from(SensorReading).where(SensorReading.humidity == humidity)).one()
+
+def reading(humidity, temperature=20.0, smoke=5.0, **extra):
+    return {"temperature": temperature, "humidity": humidity, "smoke_level": smoke, **extra}
+
+def test_batch_is_stored_with_each_readings_own_timestamp(app_client):
+    humidity = marker()
+    readings = [reading(humidity, timestamp=f"2026-01-01T00:00:0{i}") for i in range(5)]
+
+    body = app_client.post("/sensors/batch", json=readings).json()
+
+    assert body["accepted"] == 5 and body["stored"] == 5 and not body["fire_alert"]
+    with Session(db_engine) as session:
+        times = session.exec(select(SensorReading.timestamp).where(SensorReading.humidity == humidity)).all()
+    assert sorted(t.second for t in times) == [0, 1, 2, 3, 4]
+
+def test_empty_batch(app_client):
+    assert app_client.post("/sensors/batch", json=[]).json()["accepted"] == 0
+
+def test_stream_counts_and_skips_invalid_lines(app_client):
+    humidity = marker()
+    lines = [json.dumps(reading(humidity)) for _ in range(7)]
+    lines.insert(3, "{not json")
+    lines.insert(5, json.dumps({"temperature": 1}))
+    body = "\n".join(lines).encode()  # No trailing newline: the last line still counts
+
+    result = app_client.post("/sensors/stream", content=body).json()
+
+    assert result["accepted"] == 7 and result["rejected"] == 2
+    assert len(result["errors"]) == 2
+    assert stored(humidity) == 7
+
+def test_stream_returns_at_most_ten_errors(app_client):
+    body = "\n".join(["{not json"] * 12).encode()  # The last, unterminated line is invalid too
+
+    result = app_client.post("/sensors/stream", content=body).json()
+
+    assert result["accepted"] == 0 and result["rejected"] == 12
+    assert len(result["errors"]) == 10
+
+def test_risky_reading_in_a_batch_raises_the_alert(app_client):
+    body = app_client.post("/sensors/batch", json=[reading(marker()), reading(marker(), temperature=99.0)]).json()
+
+    assert body["fire_alert"] and body["email_alert"]["status"] in ("queued", "deduplicated")
@@ -0,0 +1,29 @@
+from app.schemas import SensorData
+from app.thresholds import DEFAULT_THRESHOLDS, ThresholdsCache, thresholds_cache
+
+def reading(temperature, smoke=5.0):
+    return SensorData(temperature=temperature, humidity=40.0, smoke_level=smoke)
+
+def test_defaults_without_a_stored_row_are_50_and_300():
+    cache = ThresholdsCache()
+
+    assert (cache.current.temperature_max, cache.current.gas_max) == (50.0, 300.0)
+    assert cache.check([reading(45.0), reading(55.0), reading(20.0, smoke=250.0), reading(20.0, smoke=310.0)]) == [
+        False, True, False, True
+    ]
+
+def test_api_reports_the_enforced_thresholds_and_updates_write_through(app_client):
+    before = thresholds_cache.current
+    if before == DEFAULT_THRESHOLDS:
+        assert app_client.get("/thresholds").json() == {"temperature_max": 50.0, "gas_max": 300.0}
+    try:
+        updated = app_client.post("/thresholds", json={"gas_max": 250.0}).json()
+
+        assert updated == {"temperature_max": before.temperature_max, "gas_max": 250.0}
+        assert thresholds_cache.current.gas_max == 250.0
+        # A worker loading from the DB sees the stored row
+        other = ThresholdsCache()
+        other.load()
+        assert other.current == thresholds_cache.current and other.version == thresholds_cache.version
+    finally:
+        app_client.post("/thresholds", json=before.model_dump())
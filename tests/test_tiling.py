@@ -0,0 +1,56 @@
+import io
+
+from PIL import Image
+
+from conftest import FIRE_COLOR, PLAIN_COLOR
+from app.config import get_settings
+from app.schemas import Box
+from app.tiling import merge_boxes, tile_grid
+
+def box(x1, y1, x2, y2, confidence=0.9, class_id=0):
+    return Box(x1=x1, y1=y1, x2=x2, y2=y2, confidence=confidence, class_id=class_id, class_name=("fire", "smoke")[class_id])
+
+def test_edge_tiles_sit_flush_with_the_image_and_overlap_their_neighbours():
+    tiles = tile_grid(1500, 700, 640, 0.25)
+
+    xs = sorted({(x1, x2) for x1, _, x2, _ in tiles})
+    ys = sorted({(y1, y2) for _, y1, _, y2 in tiles})
+    # Stride 480; the last column/row is moved back so it ends on the edge instead of being cut short
+    assert xs == [(0, 640), (480, 1120), (860, 1500)]
+    assert ys == [(0, 640), (60, 700)]
+    assert len(tiles) == 6
+    for (_, a_end), (b_start, _) in zip(xs, xs[1:]):
+        assert a_end - b_start >= 640 * 0.25
+
+def test_image_smaller_than_a_tile_is_one_tile():
+    assert tile_grid(300, 200, 640, 0.2) == [(0, 0, 300, 200)]
+
+def test_merge_suppresses_duplicates_within_a_class_only():
+    fire = box(100, 100, 200, 200, 0.9)
+    duplicate = box(105, 102, 205, 200, 0.6)
+    smoke_on_fire = box(100, 100, 200, 200, 0.5, class_id=1)
+    elsewhere = box(400, 400, 450, 450, 0.3)
+
+    merged = merge_boxes([duplicate, smoke_on_fire, fire, elsewhere], 0.5)
+
+    assert merged == [fire, smoke_on_fire, elsewhere]
+    assert merge_boxes([], 0.5) == []
+
+def test_tiled_predict_maps_tile_boxes_back_to_the_full_frame(app_client, monkeypatch):
+    for name, value in {"TILE_SIZE": 640, "TILE_OVERLAP": 0.0, "TILE_MIN_SIDE": 1280, "TILE_NMS_IOU": 0.5}.items():
+        monkeypatch.setattr(get_settings(), name, value)
+    # Fire fills only the bottom-right tile; the whole-image overview is mostly plain
+    image = Image.new("RGB", (1280, 1280), PLAIN_COLOR)
+    image.paste(FIRE_COLOR, (640, 640, 1280, 1280))
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+
+    response = app_client.post(
+        "/predict", params={"tiled": "true"}, files={"file": ("tiled.png", buffer.getvalue(), "image/png")}
+    )
+
+    assert response.status_code == 200
+    detections = response.json()["detections"]
+    assert len(detections) == 1
+    # FakeModel puts its box in the middle half of the tile: (160, 160, 480, 480) shifted by (640, 640)
+    assert [detections[0][key] for key in ("x1", "y1", "x2", "y2")] == [800, 800, 1120, 1120]
@@ -0,0 +1,53 @@
+import asyncio
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from conftest import WORKDIR, FakeModel
+from app.config import get_settings
+from app.inference import InferenceEngine
+from app.video import analyze_video
+
+def write_clip(name, colors, fps=10.0, size=(160, 120)):
+    path = os.path.join(WORKDIR, name)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, size)
+    for color in colors:
+        writer.write(np.full((size[1], size[0], 3), color[::-1], dtype=np.uint8))  # RGB -> BGR
+    writer.release()
+    return path
+
+def analyze(path, **overrides):
+    settings = get_settings().model_copy(update={
+        "VIDEO_SAMPLE_FPS": 10.0, "VIDEO_BATCH_SIZE": 8, "VIDEO_CONFIRM_K": 3, "VIDEO_CONFIRM_N": 5, **overrides
+    })
+    model = FakeModel()
+    engine = InferenceEngine(model, settings)
+
+    async def run():
+        try:
+            return await analyze_video(path, "clip.avi", engine, settings)
+        finally:
+            engine.stop()
+
+    analysis, _, _ = asyncio.run(run())
+    return analysis, model
+
+def test_early_exit_reports_every_frame_that_was_inferred():
+    path = write_clip("fire.avi", [(230, 40, 20)] * 40)
+
+    analysis, model = analyze(path)
+
+    assert analysis.fire_confirmed
+    assert analysis.confirmed_at_seconds == pytest.approx(0.2)
+    assert analysis.frames_sampled == sum(model.batches) == 8
+    assert analysis.frames_with_fire == 8
+
+def test_clip_without_fire_is_read_to_the_end():
+    path = write_clip("calm.avi", [(40, 90, 160)] * 20)
+
+    analysis, model = analyze(path)
+
+    assert not analysis.fire_confirmed
+    assert analysis.frames_sampled == sum(model.batches) == 20
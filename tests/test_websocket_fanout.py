@@ -0,0 +1,105 @@
+import asyncio
+
+from app.dependencies import get_settings
+from app.websockets import EVICTED_CLOSE_CODE, ConnectionManager
+
+from conftest import FakeSocket, settle
+
+def make_manager(**overrides):
+    settings = get_settings().model_copy(update={"WS_QUEUE_SIZE": 2, "WS_SEND_TIMEOUT": 5.0, **overrides})
+    return ConnectionManager(settings)
+
+def numbers(socket):
+    return [message["n"] for message in socket.received]
+
+def test_slow_client_drops_its_oldest_messages_without_holding_up_others():
+    async def scenario():
+        manager = make_manager(WS_SLOW_CONSUMER_POLICY="drop_oldest")
+        slow, fast = FakeSocket(), FakeSocket()
+        slow.gate.clear()
+        await manager.connect(slow, "dashboard")
+        await manager.connect(fast, "dashboard")
+
+        for n in range(6):
+            manager.broadcast("dashboard", {"type": "sensor_update", "n": n})
+            await settle()
+        assert numbers(fast) == list(range(6))
+
+        slow.gate.set()
+        await settle()
+        # 0 was already being sent; of the rest only the newest two were still queued
+        assert numbers(slow) == [0, 4, 5]
+        assert manager.stats()["dropped"] == 3
+
+    asyncio.run(scenario())
+
+def test_drop_newest_keeps_the_queue():
+    async def scenario():
+        manager = make_manager(WS_SLOW_CONSUMER_POLICY="drop_newest")
+        slow = FakeSocket()
+        slow.gate.clear()
+        await manager.connect(slow, "dashboard")
+        for n in range(6):
+            manager.broadcast("dashboard", {"type": "sensor_update", "n": n})
+            await settle()
+        slow.gate.set()
+        await settle()
+        assert numbers(slow) == [0, 1, 2]
+
+    asyncio.run(scenario())
+
+def test_critical_messages_are_never_dropped():
+    async def scenario():
+        manager = make_manager(WS_SLOW_CONSUMER_POLICY="drop_newest")
+        slow = FakeSocket()
+        slow.gate.clear()
+        await manager.connect(slow, "dashboard")
+        manager.broadcast("dashboard", {"type": "sensor_update", "n": 0})
+        await settle()
+        manager.broadcast("dashboard", {"type": "sensor_update", "n": 1})
+        manager.broadcast("dashboard", {"type": "sensor_update", "n": 2})
+
+        # Full queue: the alarm displaces a routine update even under drop_newest
+        assert manager.broadcast("dashboard", {"type": "fire_confirmed", "n": 3}) == 1
+        slow.gate.set()
+        await settle()
+        assert numbers(slow) == [0, 2, 3]
+
+    asyncio.run(scenario())
+
+def test_client_whose_queue_is_all_critical_is_evicted():
+    async def scenario():
+        manager = make_manager()
+        slow = FakeSocket()
+        slow.gate.clear()
+        await manager.connect(slow, "dashboard")
+        for n in range(4):
+            manager.broadcast("dashboard", {"type": "incident_update", "n": n})
+            await settle()
+
+        assert slow.closed_with == EVICTED_CLOSE_CODE
+        assert manager.stats()["connections"]["dashboard"] == 0 and manager.evicted == 1
+
+    asyncio.run(scenario())
+
+def test_evict_policy_and_send_timeout():
+    async def scenario():
+        manager = make_manager(WS_SLOW_CONSUMER_POLICY="evict")
+        slow = FakeSocket()
+        slow.gate.clear()
+        await manager.connect(slow, "dashboard")
+        for n in range(4):
+            manager.broadcast("dashboard", {"type": "sensor_update", "n": n})
+            await settle()
+        assert slow.closed_with == EVICTED_CLOSE_CODE
+
+        manager = make_manager(WS_SEND_TIMEOUT=0.05)
+        stalled = FakeSocket()
+        stalled.gate.clear()
+        await manager.connect(stalled, "camera")
+        manager.broadcast("camera", {"type": "search_image_alert", "n": 0})
+        await asyncio.sleep(0.2)
+        assert stalled.closed_with == EVICTED_CLOSE_CODE
+        assert manager.stats()["connections"]["camera"] == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,81 @@
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import torch
+
+from conftest import FIRE_COLOR, PLAIN_COLOR, FakeModel
+from app import dependencies
+from app.config import get_settings
+from app.workers import InferencePool
+
+class TensorModel(FakeModel):
+    """FakeModel whose results carry torch tensors, like ultralytics' Boxes."""
+
+    def predict(self, images, conf=None, verbose=False):
+        results = []
+        for result in super().predict(images, conf, verbose):
+            rows = torch.tensor(result.boxes.rows, dtype=torch.float32).reshape(-1, 6)
+            results.append(SimpleNamespace(boxes=SimpleNamespace(xyxy=rows[:, :4], conf=rows[:, 4], cls=rows[:, 5])))
+        return results
+
+# Worker model loaders; module-level so the spawned workers can unpickle them
+def load_tensor_model():
+    return TensorModel()
+
+def fail_to_load():
+    raise RuntimeError("no model")
+
+def frame(color, size):
+    width, height = size
+    return np.ascontiguousarray(np.full((height, width, 3), color[::-1], dtype=np.uint8))
+
+def test_frames_round_trip_through_shared_memory(monkeypatch):
+    created = []
+    to_shared = InferencePool._to_shared
+
+    def record(array):
+        block, spec = to_shared(array)
+        created.append(spec[0])
+        return block, spec
+
+    monkeypatch.setattr(InferencePool, "_to_shared", staticmethod(record))
+    pool = InferencePool(2, model_loader=load_tensor_model)
+    try:
+        assert pool.names == FakeModel.names
+        arrays = [frame(FIRE_COLOR, (200, 100)), frame(PLAIN_COLOR, (64, 48)), frame(FIRE_COLOR, (80, 40))]
+
+        outputs = pool.predict(arrays, 0.1)
+    finally:
+        pool.shutdown()
+
+    # One (n, 6) array per frame, in order, spread over both workers
+    assert [output.shape for output in outputs] == [(1, 6), (0, 6), (1, 6)]
+    assert outputs[0][0].tolist() == pytest.approx([50, 25, 150, 75, 0.9, 0])
+    assert outputs[2][0].tolist() == pytest.approx([20, 10, 60, 30, 0.9, 0])
+    # Every shared block was released
+    assert len(created) == 3
+    for name in created:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
+
+def test_pool_raises_when_workers_fail_to_start():
+    with pytest.raises(BrokenProcessPool):
+        InferencePool(1, model_loader=fail_to_load)
+
+def test_engine_falls_back_to_in_process_model(monkeypatch):
+    def broken_pool(workers):
+        raise RuntimeError("workers failed")
+
+    model = FakeModel()
+    monkeypatch.setattr("app.workers.InferencePool", broken_pool)
+    monkeypatch.setattr(dependencies, "_engine_instance", None)
+    monkeypatch.setattr(dependencies, "_model_instance", model)
+    monkeypatch.setattr(get_settings(), "INFERENCE_WORKERS", 2)
+
+    engine = dependencies.get_inference_engine()
+
+    assert engine.pool is None
+    assert engine.model is model